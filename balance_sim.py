@@ -0,0 +1,246 @@
+"""
+Theta Arc — offline boss balance simulator.
+
+Simulates many boss fights at once with NumPy, re-implementing the bot's
+combat math (base_damage, iv_factor, player_damage incl. Wilter stacks/phases
+and the Fleeb party bonus) and the reward split from the boss kill branch.
+Attacking instances are drawn from the instances in user.json, or rolled the
+way catches roll them.
+
+    python balance_sim.py --boss wilter --fights 20000 --attackers 5
+    python balance_sim.py --source catch --attack-rate 0.5 --seed 7
+
+Importable too:
+
+    import balance_sim as bs
+    tac, users, bosses = bs.load_data()
+    coeff = bs.instance_coefficients(tac, users)
+    res = bs.simulate_boss("wilter", bosses["wilter"], coeff, fights=10000)
+    print(bs.summarize(res))
+
+Requires numpy, which the bot itself doesn't need:
+
+    pip install -r requirements-tools.txt
+"""
+import json
+import time
+import argparse
+from typing import Optional, Dict, Any, List
+
+try:
+    import numpy as np
+except ImportError:
+    raise ImportError("balance_sim.py needs numpy: pip install -r requirements-tools.txt") from None
+
+TAC_FILE = "TAC.json"
+USER_FILE = "user.json"
+BOSS_FILE = "boss.json"
+
+STATS = ("attack", "speed", "health", "endurance")
+CATCH_MIN_LEVEL = 1
+CATCH_MAX_LEVEL = 10
+IV_MIN_PCT = 0.01
+IV_MAX_PCT = 1.00
+STARING_AURA = 0.90   # boss_aura_adjust("staring"): party power -10%
+
+# ================= Data =================
+def _read_json(path: str) -> Dict[str, Any]:
+    try:
+        with open(path, "r", encoding="utf-8") as f:
+            return json.load(f)
+    except (OSError, ValueError):
+        return {}
+
+def load_data(tac_file: str = TAC_FILE, user_file: str = USER_FILE, boss_file: str = BOSS_FILE):
+    return _read_json(tac_file), _read_json(user_file), _read_json(boss_file)
+
+def damage_coefficient(inst: Dict[str, Any], base: Dict[str, Any]) -> float:
+    """Deterministic part of main.base_damage: stat weight × IV factor × level factor / 50."""
+    ivs = inst.get("ivs", {})
+    nums = []
+    for k in STATS:
+        b = int(base.get(k, 1)); v = max(0, int(ivs.get(k, 0)))
+        nums.append(v / b if b else 1.0)
+    ivf = sum(nums) / len(nums)
+    stat_weight = ivs.get("attack", 0) * 0.55 + ivs.get("speed", 0) * 0.25 + ivs.get("endurance", 0) * 0.20
+    lvf = 1.0 + (inst.get("level", 1) / 64.0)
+    return stat_weight * ivf * lvf / 50.0
+
+def instance_coefficients(tac_data: Dict[str, Any], user_db: Dict[str, Any], source: str = "owned",
+                          n: int = 10000, rng: Optional[np.random.Generator] = None) -> np.ndarray:
+    """
+    Damage coefficients of the attacker pool.
+      owned -> every instance in user.json (the live distribution)
+      catch -> n fresh catches: uniform species, Lv 1–10, IVs 1–100% of base
+    """
+    if source == "owned":
+        out = []
+        for u in user_db.values():
+            for inst in u.get("inventory", []):
+                base = tac_data.get(inst.get("tac", ""), {}).get("stats", {})
+                out.append(damage_coefficient(inst, base))
+        if out:
+            return np.asarray(out, dtype=np.float64)
+        source = "catch"   # empty user.json: fall back to fresh catches
+    rng = rng or np.random.default_rng()
+    keys = list(tac_data.keys())
+    if not keys:
+        raise ValueError("TAC.json has no species")
+    base = np.array([[int(tac_data[k].get("stats", {}).get(s, 0)) for s in STATS] for k in keys], dtype=np.float64)
+    species = rng.integers(0, len(keys), size=n)
+    b = base[species]                                               # (n, 4)
+    ivs = np.rint(b * rng.uniform(IV_MIN_PCT, IV_MAX_PCT, size=b.shape))
+    ratio = np.where(b > 0, ivs / np.where(b > 0, b, 1), 1.0)
+    ivf = ratio.mean(axis=1)
+    stat_weight = ivs[:, 0] * 0.55 + ivs[:, 1] * 0.25 + ivs[:, 3] * 0.20
+    level = rng.integers(CATCH_MIN_LEVEL, CATCH_MAX_LEVEL + 1, size=n)
+    return stat_weight * ivf * (1.0 + level / 64.0) / 50.0
+
+# ================= Simulation =================
+def simulate_boss(boss_key: str, tier: Dict[str, Any], coeff: np.ndarray, *, fights: int = 10000,
+                  attackers: int = 5, max_attacks: int = 100000, staring_aura: bool = False,
+                  rng: Optional[np.random.Generator] = None) -> Dict[str, Any]:
+    """
+    Run `fights` independent fights in lock-step. Each step, every still-alive fight
+    takes one attack from a uniformly chosen attacker (each attacker owns one instance
+    drawn from `coeff`). Returns per-fight attack counts and per-attacker rewards.
+    """
+    rng = rng or np.random.default_rng()
+    key = boss_key.lower()
+    is_wilter = key == "wilter"
+    is_fleeb = key == "fleeb_raid"
+    hp_max = int(tier.get("hp", 50000))
+
+    F, N = int(fights), int(attackers)
+    inst = coeff[rng.integers(0, len(coeff), size=(F, N))]          # (F, N) damage coefficients
+    hp = np.full(F, hp_max, dtype=np.int64)
+    stacks = np.zeros((F, N), dtype=np.int64)
+    contrib = np.zeros((F, N), dtype=np.int64)
+    attacks = np.zeros(F, dtype=np.int64)
+    party_mult = min(1.0 + 0.04 * N, 1.20) if is_fleeb else 1.0
+    aura_mult = STARING_AURA if (staring_aura and key == "staring") else 1.0
+    heal = int(hp_max * 0.004)
+    alive = np.arange(F)
+
+    for _ in range(max_attacks):
+        if alive.size == 0:
+            break
+        who = rng.integers(0, N, size=alive.size)
+        raw = inst[alive, who] * rng.uniform(0.95, 1.08, size=alive.size) * party_mult * aura_mult
+        cur_hp = hp[alive]
+        if is_wilter:
+            st = stacks[alive, who]
+            dmg = np.floor(np.maximum(1.0, raw * (1.0 - np.minimum(0.60, st * 0.03))))
+            phase = np.where(cur_hp <= hp_max / 3, 2, np.where(cur_hp <= hp_max * 2 / 3, 1, 0))
+            dmg = np.where(phase == 1, np.floor(dmg * 1.05), np.where(phase == 2, np.floor(dmg * 1.10), dmg))
+            add = 1 + phase
+            special = rng.random(alive.size) < 0.15
+            add = add + 2 * special
+            cur_hp = np.where(special, np.minimum(hp_max, cur_hp + heal), cur_hp)
+            stacks[alive, who] = st + add
+        else:
+            dmg = np.floor(raw)
+        dmg = np.maximum(1, dmg).astype(np.int64)
+        hp[alive] = np.maximum(0, cur_hp - dmg)
+        np.add.at(contrib, (alive, who), dmg)
+        attacks[alive] += 1
+        alive = alive[hp[alive] > 0]
+
+    killed = hp <= 0
+    rewards = tier.get("rewards", {})
+    pot_keys = [k for k in ("gold_shards", "diamond_shards", "enchanted_shards") if rewards.get(k)]
+    total = np.maximum(1, contrib.sum(axis=1, keepdims=True))
+    share = contrib / total
+    per_player: Dict[str, np.ndarray] = {}
+    pot: Dict[str, np.ndarray] = {}
+    for k in pot_keys:
+        lo, hi = rewards[k]
+        pot[k] = rng.integers(int(lo), int(hi) + 1, size=F)
+        per_player[k] = np.rint(pot[k][:, None] * share)[killed & (contrib.sum(axis=1) > 0)].ravel()
+    cos = rewards.get("cosmetic_drop")
+    drops = None
+    if isinstance(cos, dict) and cos.get("item"):
+        drops = (rng.random((F, N)) < float(cos.get("chance", 0.0))) & (contrib > 0) & killed[:, None]
+
+    return {
+        "boss": boss_key, "hp": hp_max, "fights": F, "attackers": N,
+        "killed": killed, "attacks": attacks, "contrib": contrib,
+        "pot": pot, "per_player": per_player,
+        "cosmetic": (cos.get("item"), drops) if drops is not None else None,
+    }
+
+def _dist(a: np.ndarray) -> Dict[str, float]:
+    if a.size == 0:
+        return {"mean": 0.0, "p10": 0.0, "p50": 0.0, "p90": 0.0, "p99": 0.0}
+    p10, p50, p90, p99 = np.percentile(a, [10, 50, 90, 99])
+    return {"mean": float(a.mean()), "p10": float(p10), "p50": float(p50), "p90": float(p90), "p99": float(p99)}
+
+def summarize(res: Dict[str, Any], attack_rate: float = 1.0) -> Dict[str, Any]:
+    """attack_rate = attacks per second per attacker, used to turn attack counts into seconds."""
+    killed = res["killed"]
+    attacks = res["attacks"][killed]
+    out = {
+        "boss": res["boss"], "hp": res["hp"], "fights": res["fights"], "attackers": res["attackers"],
+        "kill_rate": float(killed.mean()) if killed.size else 0.0,
+        "attacks_to_kill": _dist(attacks),
+        "seconds_to_kill": _dist(attacks / max(1e-9, attack_rate * res["attackers"])),
+        "reward_per_player": {k: _dist(v) for k, v in res["per_player"].items()},
+        "total_attacks": int(res["attacks"].sum()),
+    }
+    if res["cosmetic"]:
+        item, drops = res["cosmetic"]
+        out["cosmetic"] = {"item": item, "drops_per_fight": float(drops.sum(axis=1)[killed].mean()) if killed.any() else 0.0}
+    return out
+
+def format_summary(s: Dict[str, Any]) -> str:
+    def row(label, d, fmt="{:,.0f}"):
+        return f"  {label:<24}" + "  ".join(f"{k} " + fmt.format(v) for k, v in d.items())
+    lines = [f"{s['boss']}  (HP {s['hp']:,}, {s['attackers']} attackers, {s['fights']:,} fights, "
+             f"kill rate {s['kill_rate'] * 100:.1f}%)",
+             row("attacks to kill", s["attacks_to_kill"]),
+             row("seconds to kill", s["seconds_to_kill"], "{:,.1f}")]
+    for k, d in s["reward_per_player"].items():
+        lines.append(row(f"{k}/player", d))
+    if "cosmetic" in s:
+        lines.append(f"  {s['cosmetic']['item']} drops/fight  {s['cosmetic']['drops_per_fight']:.2f}")
+    return "\n".join(lines)
+
+# ================= CLI =================
+def main(argv: Optional[List[str]] = None):
+    p = argparse.ArgumentParser(description="Monte Carlo boss balance simulator for Theta Arc",
+                                epilog="Needs numpy: pip install -r requirements-tools.txt")
+    p.add_argument("--boss", action="append", help="boss key from boss.json (repeatable; default: all)")
+    p.add_argument("--fights", type=int, default=10000)
+    p.add_argument("--attackers", type=int, default=5)
+    p.add_argument("--source", choices=("owned", "catch"), default="owned",
+                   help="attacker instances: owned (user.json) or fresh catches")
+    p.add_argument("--attack-rate", type=float, default=1.0, help="attacks per second per attacker")
+    p.add_argument("--max-attacks", type=int, default=100000)
+    p.add_argument("--staring-aura", action="store_true", help="apply the -10%% Staring aura to damage")
+    p.add_argument("--seed", type=int, default=None)
+    p.add_argument("--json", action="store_true", help="print summaries as JSON")
+    args = p.parse_args(argv)
+
+    tac, users, bosses = load_data()
+    rng = np.random.default_rng(args.seed)
+    coeff = instance_coefficients(tac, users, source=args.source, rng=rng)
+    keys = args.boss or list(bosses.keys())
+    results = []
+    for key in keys:
+        if key not in bosses:
+            print(f"unknown boss: {key}")
+            continue
+        t0 = time.perf_counter()
+        res = simulate_boss(key, bosses[key], coeff, fights=args.fights, attackers=args.attackers,
+                            max_attacks=args.max_attacks, staring_aura=args.staring_aura, rng=rng)
+        s = summarize(res, attack_rate=args.attack_rate)
+        s["elapsed_sec"] = time.perf_counter() - t0
+        results.append(s)
+        if not args.json:
+            print(format_summary(s))
+            print(f"  simulated {s['total_attacks']:,} attacks in {s['elapsed_sec']:.2f}s\n")
+    if args.json:
+        print(json.dumps(results, indent=2))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,184 @@
+"""
+Theta Arc — micro-benchmarks for bot hot paths.
+
+    python bench.py                 # all benchmarks
+    python bench.py attack -n 500000
+    python bench.py catalog
+
+Imports main.py and runs its startup() (no Discord connection is made), then
+times the functions the bot runs per message / per attack against the data
+files in the working dir.
+"""
+import time
+import random
+import argparse
+from typing import Callable, Dict, List, Optional, Tuple
+
+import main
+
+def _timeit(fn: Callable[[], None], n: int) -> float:
+    """Best of 3 runs, seconds per call."""
+    best = float("inf")
+    for _ in range(3):
+        t0 = time.perf_counter()
+        fn()
+        best = min(best, time.perf_counter() - t0)
+    return best / n
+
+def _owned() -> List[Tuple[str, Dict]]:
+    """(owner uid, instance) pairs."""
+    owned = [(uid, i) for uid, u in main.USER_DB.items() for i in u.get("inventory", [])]
+    if not owned:   # empty user.json: roll some catches
+        for k in range(64):
+            tac = random.choice(list(main.TAC_DATA))
+            ivs, iv_avg = main.roll_ivs_for_tac(tac)
+            owned.append(("0", {"id": k + 1, "tac": tac, "level": random.randint(1, 10), "gender": "♂️", "ivs": ivs, "iv_avg": iv_avg}))
+    return owned
+
+def _instances() -> List[Dict]:
+    return [i for _, i in _owned()]
+
+def _row(label: str, old: float, new: float) -> str:
+    return f"  {label:<28} before {old * 1e6:7.3f} µs   after {new * 1e6:7.3f} µs   x{old / new:5.2f}"
+
+# ================= attack =================
+def bench_attack(n: int) -> List[str]:
+    """Attack hot path with and without the per-instance combat profile cache."""
+    owned = _owned()
+    picks = [owned[i % len(owned)] for i in range(n)]
+    bosses = {
+        "plain": {"tier": "staring", "hp": 10**12, "hp_max": 10**12, "wilt": {}},
+        "wilter": {"tier": "wilter", "hp": 10**12, "hp_max": 10**12, "wilt": {}},
+    }
+    out = [f"attack ({n:,} hits over {len(owned)} instances)"]
+
+    def run_base():
+        for uid, inst in picks:
+            main.base_damage(uid, inst)
+
+    def run_player(boss):
+        def go():
+            for uid, inst in picks:
+                main.player_damage(inst, boss, int(uid))
+        return go
+
+    cases = [("base_damage", run_base)] + [(f"player_damage ({k})", run_player(b)) for k, b in bosses.items()]
+    cached = main.combat_profile
+    for label, fn in cases:
+        main.combat_profile = lambda uid, inst: main._compute_combat_profile(inst)   # the pre-cache behaviour
+        try:
+            old = _timeit(fn, n)
+        finally:
+            main.combat_profile = cached
+        main.COMBAT_PROFILES.clear()
+        new = _timeit(fn, n)
+        out.append(_row(label, old, new))
+    return out
+
+# ================= catalog =================
+# The pre-catalog implementations, kept here as the "before" side.
+def _legacy_sort_key(tac_key: str) -> tuple:
+    return (int(main.TAC_DATA.get(tac_key, {}).get("id", 1_000_000)), tac_key)
+
+def _legacy_instance_ivs(inst: Dict) -> str:
+    base = main.TAC_DATA.get(inst["tac"], {}).get("stats", {})
+    ivs = inst.get("ivs", {})
+    parts = []
+    for stat in ("attack", "speed", "health", "endurance"):
+        cur = ivs.get(stat, 0)
+        b = int(base.get(stat, 0) or 0)
+        parts.append(f"**{stat.upper()}** {cur}/{b}" if b > 0 else f"**{stat.upper()}** {cur}")
+    return "  •  ".join(parts)
+
+def _legacy_iv_bars(inst: Dict) -> str:
+    base = main.TAC_DATA.get(inst["tac"], {}).get("stats", {})
+    ivs = inst.get("ivs", {})
+    lines = []
+    for label, key in (("ATK", "attack"), ("SPD", "speed"), ("HP", "health"), ("END", "endurance")):
+        cur = int(ivs.get(key, 0)); b = int(base.get(key, 1))
+        pct = f"{(cur/b*100):.0f}%" if b else "—"
+        lines.append(f"{label} {main.iv_bar(cur, b, width=18)} {pct}")
+    return "```" + "\n".join(lines) + "```"
+
+def _legacy_iv_factor(inst: Dict) -> float:
+    base = main.TAC_DATA.get(inst["tac"], {}).get("stats", {})
+    ivs = inst.get("ivs", {})
+    nums = []
+    for k in ("attack", "speed", "health", "endurance"):
+        b = int(base.get(k, 1)); v = max(0, int(ivs.get(k, 0)))
+        nums.append(v / b if b else 1.0)
+    return sum(nums) / len(nums) if nums else 1.0
+
+def _legacy_profile(inst: Dict):
+    ivs = inst.get("ivs", {})
+    stat_weight = ivs.get("attack", 0) * 0.55 + ivs.get("speed", 0) * 0.25 + ivs.get("endurance", 0) * 0.20
+    lvf = 1.0 + (inst.get("level", 1) / 64.0)
+    base = main.TAC_DATA.get(inst["tac"], {}).get("stats", {})
+    hp = int(ivs.get("health", 0)) or int(base.get("health", 1))
+    return stat_weight * _legacy_iv_factor(inst) * lvf / 50.0, max(1, hp)
+
+def _legacy_egg_ok(a: str, b: str) -> bool:
+    ag = set(main.TAC_DATA.get(a, {}).get("egg_groups", []))
+    bg = set(main.TAC_DATA.get(b, {}).get("egg_groups", []))
+    return len(ag.intersection(bg)) > 0
+
+def bench_catalog(n: int) -> List[str]:
+    """Formatting and combat paths: nested TAC_DATA lookups vs the compiled catalog."""
+    insts = _instances()
+    picks = [insts[i % len(insts)] for i in range(n)]
+    pairs = [(a["tac"], b["tac"]) for a, b in zip(picks, reversed(picks))]
+    inv = insts * max(1, 2000 // len(insts))
+    out = [f"catalog ({n:,} calls over {len(insts)} instances, {len(main.CATALOG)} species)"]
+
+    def each(fn):
+        def go():
+            for inst in picks:
+                fn(inst)
+        return go
+
+    def sort_inv(key_fn):
+        def go():
+            for _ in range(max(1, n // len(inv))):
+                sorted(inv, key=lambda i: (key_fn(i["tac"]), -float(i.get("iv_avg", 100.0)), i["id"]))
+        return go
+
+    def eggs(fn):
+        def go():
+            for a, b in pairs:
+                fn(a, b)
+        return go
+
+    cases = [
+        ("inventory sort", sort_inv(_legacy_sort_key), sort_inv(main.tac_sort_key), max(1, n // len(inv)) * len(inv)),
+        ("format_instance_ivs", each(_legacy_instance_ivs), each(main.format_instance_ivs), n),
+        ("format_iv_bars", each(_legacy_iv_bars), each(main.format_iv_bars), n),
+        ("iv_factor", each(_legacy_iv_factor), each(main.iv_factor), n),
+        ("combat profile (uncached)", each(_legacy_profile), each(main._compute_combat_profile), n),
+        ("egg group check", eggs(_legacy_egg_ok), eggs(main.egg_compatible), n),
+    ]
+    for inst in insts:   # same answers before and after
+        assert _legacy_instance_ivs(inst) == main.format_instance_ivs(inst)
+        assert _legacy_iv_bars(inst) == main.format_iv_bars(inst)
+        assert _legacy_profile(inst) == main._compute_combat_profile(inst)
+    for label, old_fn, new_fn, calls in cases:
+        out.append(_row(label, _timeit(old_fn, calls), _timeit(new_fn, calls)))
+    return out
+
+BENCHES = {"attack": bench_attack, "catalog": bench_catalog}
+
+def main_cli(argv: Optional[List[str]] = None):
+    p = argparse.ArgumentParser(description="Theta Arc hot-path benchmarks")
+    p.add_argument("bench", nargs="*", help=f"benchmarks to run: {', '.join(BENCHES)} (default: all)")
+    p.add_argument("-n", type=int, default=200000, help="iterations per case")
+    p.add_argument("--seed", type=int, default=1)
+    args = p.parse_args(argv)
+    main.startup()
+    unknown = [b for b in args.bench if b not in BENCHES]
+    if unknown:
+        p.error(f"unknown benchmark(s): {', '.join(unknown)}")
+    random.seed(args.seed)
+    for name in args.bench or list(BENCHES):
+        print("\n".join(BENCHES[name](args.n)))
+
+if __name__ == "__main__":
+    main_cli()
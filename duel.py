@@ -0,0 +1,61 @@
+"""
+Theta Arc — PvP duel core.
+
+Pure dice math shared by the bot's friendly duels and tournaments. It has
+no imports from main.py and no side effects at import time, so the
+tournament process pool can load it in spawned workers without re-running
+the bot's startup (env, stores, ledger, timers).
+
+A duel profile is (damage coefficient, starting HP); main.duel_profile
+builds one from an owned instance.
+"""
+import random
+from typing import List, Optional, Tuple
+
+PVP_MAX_ROUNDS = 40
+PVP_CRIT_CHANCE = 0.10
+
+def pvp_duel(a: Tuple[float, int], b: Tuple[float, int], rng: random.Random = random,
+             log: Optional[List[str]] = None) -> str:
+    """Duel two profiles; returns 'A'|'B'|'DRAW'. Log lines are only built when log is given."""
+    coefA, hpA = a
+    coefB, hpB = b
+    uniform, roll = rng.uniform, rng.random
+    rounds = 0
+    while hpA > 0 and hpB > 0 and rounds < PVP_MAX_ROUNDS:
+        rounds += 1
+        a_turn = rounds & 1   # A starts
+        dmg = (coefA if a_turn else coefB) * uniform(0.95, 1.08)
+        crit = roll() < PVP_CRIT_CHANCE
+        if crit:
+            dmg *= 1.5
+        dmg = int(max(1, dmg))
+        if a_turn:
+            hpB = max(0, hpB - dmg)
+        else:
+            hpA = max(0, hpA - dmg)
+        if log is not None:
+            who, other, hp_left = ("A", "B", hpB) if a_turn else ("B", "A", hpA)
+            log.append(f"Round {rounds}: {who} deals **{dmg}**{' (crit!)' if crit else ''} → {other} HP {hp_left}")
+    if hpA == hpB:
+        return "DRAW"
+    return "A" if hpA > hpB else "B"
+
+def match_rng(seed: int, index: int) -> random.Random:
+    return random.Random(seed * 1_000_003 + index)
+
+def play_matches(profiles: List[Tuple[float, int]], matches: List[Tuple[int, int, int]],
+                 seed: int, decisive: bool = False) -> List[str]:
+    """
+    matches: (match_index, a, b) into profiles. Returns 'A'|'B'|'DRAW' per match;
+    decisive=True settles draws with a coin flip from the same match rng (brackets).
+    Runs in tournament worker processes.
+    """
+    out = []
+    for idx, a, b in matches:
+        rng = match_rng(seed, idx)
+        w = pvp_duel(profiles[a], profiles[b], rng)
+        if w == "DRAW" and decisive:
+            w = "A" if rng.random() < 0.5 else "B"
+        out.append(w)
+    return out
@@ -2,31 +2,239 @@ import os
 import re
 import json
 import time
+import heapq
+import bisect
+import hashlib
+import gzip
+import shutil
 import random
+import functools
+import weakref
+import signal
+import sqlite3
 import asyncio
-from typing import Optional, Dict, Any, List, Tuple, Callable
+import multiprocessing
+from contextlib import asynccontextmanager
+from concurrent.futures import ProcessPoolExecutor
+from collections import OrderedDict
+from collections.abc import MutableMapping, Mapping
+from types import MappingProxyType
+from typing import Optional, Dict, Any, List, Tuple, Callable, NamedTuple
 
 import discord
 from discord.ext import commands
 from discord import app_commands
 from dotenv import load_dotenv
 
+from duel import pvp_duel, play_matches
+
 # ================= Env & Bot =================
+PROCESS_START = time.monotonic()
 load_dotenv()
 TOKEN = os.getenv("DISCORD_TOKEN")
 
 intents = discord.Intents.default()
 intents.message_content = True
-intents.members = True
-
-bot = commands.Bot(command_prefix="%", intents=intents)
+intents.members = True   # still needed so Member converters can query by ID
+
+# THETA_LEAN_MEMBERS=1: don't cache or chunk every member at startup; members are
+# fetched on demand into MEMBER_LRU instead (see get_member).
+LEAN_MEMBERS = os.getenv("THETA_LEAN_MEMBERS", "").lower() in ("1", "true", "yes")
+BOT_OPTS: Dict[str, Any] = {}
+if LEAN_MEMBERS:
+    BOT_OPTS = {"member_cache_flags": discord.MemberCacheFlags.none(), "chunk_guilds_at_startup": False}
+
+# Opt-in sharding: THETA_SHARDED=1 runs an AutoShardedBot. SHARD_COUNT/SHARD_IDS pin the
+# shard layout (e.g. one process per shard group); otherwise Discord recommends a count.
+SHARDED = os.getenv("THETA_SHARDED", "").lower() in ("1", "true", "yes")
+SHARD_COUNT = int(os.getenv("SHARD_COUNT", "0") or 0)
+SHARD_IDS = [int(x) for x in os.getenv("SHARD_IDS", "").split(",") if x.strip()]
+SHARD_CONFIG_ERROR = ""
+if SHARD_IDS and not SHARD_COUNT:
+    SHARD_CONFIG_ERROR = "SHARD_IDS needs SHARD_COUNT (the total number of shards) as well."
+elif any(not 0 <= i < SHARD_COUNT for i in SHARD_IDS):
+    SHARD_CONFIG_ERROR = f"SHARD_IDS must be between 0 and SHARD_COUNT - 1 ({SHARD_COUNT - 1})."
+if SHARD_CONFIG_ERROR:
+    SHARD_IDS = []   # keeps the module importable; __main__ refuses to start
+
+class ThetaTree(app_commands.CommandTree):
+    async def interaction_check(self, interaction: discord.Interaction) -> bool:
+        sync_users()   # see records other processes wrote before the command runs
+        return True
+
+if SHARDED:
+    bot = commands.AutoShardedBot(command_prefix="%", intents=intents, tree_cls=ThetaTree,
+                                  shard_count=SHARD_COUNT or None, shard_ids=SHARD_IDS or None, **BOT_OPTS)
+else:
+    bot = commands.Bot(command_prefix="%", intents=intents, tree_cls=ThetaTree, **BOT_OPTS)
 bot.remove_command("help")
 tree = bot.tree
 
+# ================= Members (lazy LRU) =================
+MEMBER_CACHE_SIZE = 4096
+MEMBER_LRU: "OrderedDict[Tuple[int, int], discord.Member]" = OrderedDict()  # (guild_id, user_id) -> Member
+MEMBER_STATS = {"hits": 0, "fetches": 0}
+
+def remember_member(member: Any):
+    """Keep Members we get for free (message authors, interaction users) in the LRU."""
+    if not isinstance(member, discord.Member):
+        return
+    key = (member.guild.id, member.id)
+    MEMBER_LRU[key] = member
+    MEMBER_LRU.move_to_end(key)
+    while len(MEMBER_LRU) > MEMBER_CACHE_SIZE:
+        MEMBER_LRU.popitem(last=False)
+
+async def get_member(guild: discord.Guild, user_id: int) -> Optional[discord.Member]:
+    key = (guild.id, user_id)
+    m = MEMBER_LRU.get(key)
+    if m is not None:
+        MEMBER_LRU.move_to_end(key)
+        MEMBER_STATS["hits"] += 1
+        return m
+    m = guild.get_member(user_id)
+    if m is None:
+        try:
+            m = await guild.fetch_member(user_id)
+        except discord.HTTPException:
+            return None
+        MEMBER_STATS["fetches"] += 1
+    remember_member(m)
+    return m
+
+def rss_mb() -> float:
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE") / 1048576
+    except (OSError, ValueError, IndexError):
+        import resource
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024   # peak, KB on Linux
+
+READY_AFTER: Optional[float] = None   # seconds from process start to first on_ready
+
+# ================= Shard-partitioned runtime state =================
+STATE_SHARDS = SHARD_COUNT or 1
+SHARDED_STATE: Dict[str, "ShardedDict"] = {}   # name -> container (for metrics / repartition)
+
+def shard_of_guild(guild_id: int) -> int:
+    return (int(guild_id) >> 22) % STATE_SHARDS   # same formula Discord uses
+
+def channel_key(channel: discord.abc.Messageable) -> Tuple[int, int]:
+    """(guild_id, channel_id) key for per-channel state; DMs use guild 0."""
+    guild = getattr(channel, "guild", None)
+    return (guild.id if guild else 0, channel.id)
+
+def shard_of_channel(key: Tuple[int, ...]) -> int:
+    # Channel state lives with its guild (key[0]) so a shard's partition holds
+    # everything that shard's gateway events touch.
+    return shard_of_guild(key[0])
+
+class ShardedDict(MutableMapping):
+    """
+    dict-like container keeping one partition per shard, so per-guild/per-channel
+    state can be sized, inspected or handed off shard by shard.
+    """
+    def __init__(self, name: str, shard_fn: Callable[[Any], int], default_factory: Optional[Callable[[], Any]] = None):
+        self.name = name
+        self.shard_fn = shard_fn
+        self.default_factory = default_factory
+        self.parts: List[dict] = [{} for _ in range(STATE_SHARDS)]
+        SHARDED_STATE[name] = self
+
+    def _part(self, key) -> dict:
+        return self.parts[self.shard_fn(key)]
+
+    def __getitem__(self, key):
+        p = self._part(key)
+        try:
+            return p[key]
+        except KeyError:
+            if self.default_factory is None:
+                raise
+            v = p[key] = self.default_factory()
+            return v
+
+    def __setitem__(self, key, value):
+        self._part(key)[key] = value
+
+    def __delitem__(self, key):
+        del self._part(key)[key]
+
+    def __contains__(self, key):
+        return key in self._part(key)
+
+    def __iter__(self):
+        for p in self.parts:
+            yield from p
+
+    def __len__(self):
+        return sum(len(p) for p in self.parts)
+
+    def get(self, key, default=None):
+        return self._part(key).get(key, default)
+
+    def pop(self, key, *default):
+        return self._part(key).pop(key, *default)
+
+    def setdefault(self, key, default=None):
+        return self._part(key).setdefault(key, default)
+
+    def shard(self, shard_id: int) -> dict:
+        return self.parts[shard_id]
+
+    def repartition(self):
+        items = [kv for p in self.parts for kv in p.items()]
+        self.parts = [{} for _ in range(STATE_SHARDS)]
+        for k, v in items:
+            self._part(k)[k] = v
+
+def set_state_shards(n: int):
+    global STATE_SHARDS
+    n = max(1, int(n))
+    if n == STATE_SHARDS:
+        return
+    STATE_SHARDS = n
+    for sd in SHARDED_STATE.values():
+        sd.repartition()
+    print(f"[shards] Runtime state partitioned into {n} shard(s).")
+
+# per-shard event counters: shard_id -> [total, window_start, window_count, last_rate_per_min]
+SHARD_EVENTS: Dict[int, List[float]] = {}
+
+def note_shard_event(guild: Optional[discord.Guild]):
+    sid = guild.shard_id if guild is not None else 0
+    now = time.monotonic()
+    ev = SHARD_EVENTS.get(sid)
+    if ev is None:
+        ev = SHARD_EVENTS[sid] = [0, now, 0, 0.0]
+    ev[0] += 1
+    ev[2] += 1
+    if now - ev[1] >= 60:
+        ev[3] = ev[2] * 60.0 / (now - ev[1])
+        ev[1], ev[2] = now, 0
+
+def shard_metrics_lines() -> List[str]:
+    if SHARDED:
+        latencies = dict(bot.latencies)
+    else:
+        latencies = {0: bot.latency}
+    lines = []
+    for sid in sorted(set(latencies) | set(range(STATE_SHARDS))):
+        lat = latencies.get(sid)
+        lat_txt = f"{lat * 1000:.0f}ms" if lat is not None and lat == lat and lat != float("inf") else "—"
+        ev = SHARD_EVENTS.get(sid, [0, 0, 0, 0.0])
+        size = sum(len(sd.shard(sid)) for sd in SHARDED_STATE.values()) if sid < STATE_SHARDS else 0
+        lines.append(f"**Shard {sid}** — latency {lat_txt} • events {int(ev[0]):,} ({ev[3]:.1f}/min) • state entries {size:,}")
+    return lines
+
 # ================= Files =================
 USER_FILE = "user.json"
 TAC_FILE = "TAC.json"
 BOSS_FILE = "boss.json"
+SYNC_STATE_FILE = ".tree_sync.json"   # last synced command-tree hash per scope
+KV_FILE = "store_kv.json"             # pending rewards / open trades / market when running on user.json (+ .log)
+SNAPSHOT_FILE = ".runtime_snapshot.json" + (f".{'-'.join(map(str, SHARD_IDS))}" if SHARD_IDS else "")
+LEDGER_DIR = "ledger" + (f".{'-'.join(map(str, SHARD_IDS))}" if SHARD_IDS else "")   # economy history segments
 
 # ================= Constants =================
 CYCLE_CHARS = 64                 # Astral cycles per 64 chars typed
@@ -47,7 +255,7 @@ THETA_NEED = 3
 
 # CAPS SCREAM trigger (≥10 UPPERCASE characters, mostly uppercase)
 SCREAM_COOLDOWN_SEC = 30
-LAST_SCREAM: Dict[int, float] = {}  # channel_id -> ts
+LAST_SCREAM: Dict[Tuple[int, int], float] = ShardedDict("last_scream", shard_of_channel)  # channel_key -> ts
 
 # ================= Hard-coded special users =================
 SPECIAL_USERS = {
@@ -58,7 +266,7 @@ SPECIAL_USERS = {
 from collections import defaultdict
 
 # track repeated text per channel
-REPEAT_TRACK: dict[int, dict[str, list[float]]] = defaultdict(lambda: defaultdict(list))
+REPEAT_TRACK: dict[Tuple[int, int], dict[str, list[float]]] = ShardedDict("repeat_track", shard_of_channel, lambda: defaultdict(list))
 REPEAT_WINDOW = 30  # seconds to count repeats
 REPEAT_THRESHOLD = 10  # need 10 repeats
 
@@ -69,9 +277,9 @@ def gender_emoji(g: str) -> str:
 
 # === TAC sort key using TAC.json numeric IDs if present ===
 def tac_sort_key(tac_key: str) -> tuple:
-    td = TAC_DATA.get(tac_key, {})
+    sp = CATALOG.get(tac_key)
     # fallback to big number so TACs without id go after those with id
-    return (int(td.get("id", 1_000_000)), tac_key)
+    return sp.sort_key if sp else (1_000_000, tac_key)
 
 # === Page size for compact inventory ===
 INVENTORY_PAGE_SIZE = 15
@@ -108,17 +316,823 @@ def safe_read_json(path: str, default):
     except Exception:
         return default
 
-def safe_write_json(path: str, obj):
-    with open(path, "w", encoding="utf-8") as f:
-        json.dump(obj, f, indent=2)
+def safe_write_json(path: str, obj, **dump_kw):
+    """Write to a temp file and swap it in, so a crash mid-write never leaves a torn file."""
+    tmp = f"{path}.tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(obj, f, **(dump_kw or {"indent": 2}))
+    os.replace(tmp, path)
+
+# ================= User Store =================
+# THETA_STORE picks where the user economy (USER_DB, pending rewards, market, auctions) lives:
+#   unset           -> user.json, single process (default)
+#   sqlite:<path>   -> shared SQLite file in WAL mode; several bot processes, each
+#                      handling a shard range, can run against the same file.
+# Every user record carries a version; a plain save whose version went stale is
+# merged three-way onto the newer record (merge_user_record) instead of dropped,
+# and store.transaction() makes multi-user mutations atomic on either backend.
+STORE_URL = os.getenv("THETA_STORE", "")
+
+# uid -> bumped whenever a user's inventory changes other than by appending to it
+# (removals, resets, a record replaced or rolled back by the store). Appends show up
+# as a longer list; together that tells cached per-inventory indexes (inst_index)
+# whether they can extend, must rebuild, or are still current.
+INV_REWRITES: Dict[str, int] = {}
+
+def inventory_rewritten(uid: str):
+    INV_REWRITES[uid] = INV_REWRITES.get(uid, 0) + 1
+
+class StoreError(RuntimeError):
+    pass
+
+STORE_LOCK_TIMEOUT = 30.0     # seconds a transaction waits for the cross-process write lock
+STORE_STATS = {"merged": 0, "renumbered": 0, "busy": 0, "retries": 0}
+
+_MISSING = object()
+MERGE_ADDITIVE = {"currency", "items", "catches"}   # counters: both sides' deltas apply
+
+def _merge3(base: Any, ours: Any, theirs: Any, additive: bool = False) -> Any:
+    """Three-way merge of JSON values: our changes since `base` replayed on top of `theirs`.
+    Where both sides changed the same scalar, ours wins (counters under MERGE_ADDITIVE add up)."""
+    if ours == base:
+        return theirs
+    if theirs == base:
+        return ours
+    if additive and all(isinstance(v, (int, float)) and not isinstance(v, bool) for v in (base, ours, theirs)):
+        return theirs + (ours - base)
+    if isinstance(ours, dict) and isinstance(theirs, dict):
+        base = base if isinstance(base, dict) else {}
+        out = {}
+        for k in (*theirs, *(k for k in ours if k not in theirs)):
+            b, o, t = base.get(k, _MISSING), ours.get(k, _MISSING), theirs.get(k, _MISSING)
+            if o is _MISSING or t is _MISSING:
+                m = t if o is b or o == b else o      # only one side still has it
+            else:
+                if b is _MISSING:
+                    b = 0 if isinstance(o, (int, float)) else type(o)() if isinstance(o, (dict, list)) else None
+                m = _merge3(b, o, t, additive or k in MERGE_ADDITIVE)
+            if m is not _MISSING:
+                out[k] = m
+        return out
+    if isinstance(ours, list) and isinstance(theirs, list) and isinstance(base, list) and \
+            all(isinstance(x, dict) and "id" in x for lst in (base, ours, theirs) for x in lst):
+        return _merge_by_id(base, ours, theirs)
+    return ours
+
+def _merge_by_id(base: List[dict], ours: List[dict], theirs: List[dict]) -> List[dict]:
+    """Instance lists: keep their order, replay our removals/edits, append our additions.
+    An id both sides handed out independently keeps theirs; ours is marked for a new id."""
+    b = {x["id"]: x for x in base}
+    o = {x["id"]: x for x in ours}
+    out = []
+    for x in theirs:
+        i = x["id"]
+        if i in b and i not in o:
+            continue                       # we removed it
+        if i in b and i in o:
+            x = _merge3(b[i], o[i], x)
+        out.append(x)
+    t = {x["id"] for x in theirs}
+    for x in ours:
+        if x["id"] in b:
+            continue
+        out.append({**x, "id": None} if x["id"] in t else x)
+    return out
+
+def merge_user_record(base: Dict[str, Any], ours: Dict[str, Any], theirs: Dict[str, Any]) -> Dict[str, Any]:
+    merged = _merge3(base, ours, theirs)
+    inv = merged.get("inventory")
+    if not isinstance(inv, list):
+        return merged
+    # an id counter, not a balance: continue after everything either side handed out
+    nid = max([int(ours.get("next_instance_id", 1)), int(theirs.get("next_instance_id", 1)),
+               *(x["id"] + 1 for x in inv if isinstance(x, dict) and isinstance(x.get("id"), int))])
+    for x in inv:
+        if isinstance(x, dict) and "id" in x and x["id"] is None:
+            x["id"] = nid
+            nid += 1
+            STORE_STATS["renumbered"] += 1
+    merged["next_instance_id"] = nid
+    return merged
+
+# The JSON backend keeps kv rows as a snapshot (store_kv.json) plus an append-only
+# log of puts/deletes (store_kv.json.log), so a market write is one short line, not
+# a rewrite of every namespace. Once the log outgrows the snapshot (and
+# KV_LOG_COMPACT_MIN) it is rotated to .log.old and folded into a fresh snapshot
+# off the event loop; loading replays snapshot, .log.old, then .log.
+KV_LOG_COMPACT_MIN = 1 << 20
+KV_STATS = {"appends": 0, "compactions": 0}
+
+def _kv_json(value: Any) -> str:
+    return json.dumps(value, separators=(",", ":"))
+
+class JsonUserStore:
+    shared = False
+
+    def __init__(self, path: str, kv_path: str = KV_FILE):
+        self.path = path
+        self.kv_path = kv_path
+        self.kv: Optional[Dict[str, Dict[str, Any]]] = None
+        self.kv_text: Dict[str, Dict[str, str]] = {}   # same rows, serialized: what compaction writes
+        self.kv_log = None                               # append handle on kv_path + ".log"
+        self.kv_log_bytes = 0
+        self.kv_snap_bytes = 0
+        self.compacting: Optional[asyncio.Future] = None
+        self.kv_undo: Optional[Dict[Tuple[str, str], Any]] = None   # kv values before the open transaction
+        self.counters: Dict[str, int] = {}
+
+    def load_all(self) -> Dict[str, Dict[str, Any]]:
+        return safe_read_json(self.path, {})
+
+    def save(self, db: Dict[str, Dict[str, Any]]):
+        safe_write_json(self.path, db)
+
+    def pull(self, db: Dict[str, Dict[str, Any]]) -> int:
+        return 0
+
+    @asynccontextmanager
+    async def transaction(self, db: Dict[str, Dict[str, Any]], uids: List[str]):
+        """Same contract as SqliteUserStore.transaction: if the body raises, the users
+        and kv rows it touched are put back and nothing is written."""
+        before = {uid: json.dumps(db[uid]) if isinstance(db.get(uid), dict) else None for uid in uids}
+        self.kv_undo = {}
+        try:
+            yield
+        except BaseException:
+            for uid, data in before.items():
+                inventory_rewritten(uid)
+                if data is None:
+                    db.pop(uid, None)
+                elif isinstance(db.get(uid), dict):
+                    db[uid].clear()
+                    db[uid].update(json.loads(data))
+                else:
+                    db[uid] = json.loads(data)
+            for (ns, key), old in self.kv_undo.items():
+                self._kv_set(ns, key, old)
+            raise
+        finally:
+            undo, self.kv_undo = self.kv_undo, None
+        self.save(db)
+        for ns, key in undo:
+            self._kv_append(ns, key)
+
+    def _kv(self) -> Dict[str, Dict[str, Any]]:
+        if self.kv is None:
+            self.kv = safe_read_json(self.kv_path, {})
+            self.kv_snap_bytes = os.path.getsize(self.kv_path) if os.path.exists(self.kv_path) else 0
+            for path in (self.kv_path + ".log.old", self.kv_path + ".log"):
+                self._kv_replay(path)
+            self.kv_text = {ns: {k: _kv_json(v) for k, v in rows.items()} for ns, rows in self.kv.items()}
+            self.kv_log = open(self.kv_path + ".log", "a", encoding="utf-8")
+            self.kv_log_bytes = self.kv_log.tell()
+        return self.kv
+
+    def _kv_replay(self, path: str):
+        try:
+            with open(path, "r", encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        rec = json.loads(line)
+                    except ValueError:
+                        continue   # torn tail from a crash mid-append
+                    if len(rec) == 3:
+                        self.kv.setdefault(rec[0], {})[rec[1]] = rec[2]
+                    else:
+                        self.kv.get(rec[0], {}).pop(rec[1], None)
+        except OSError:
+            pass
+
+    def _kv_set(self, ns: str, key: str, value: Any):
+        self._kv()
+        if value is _MISSING:
+            self.kv.get(ns, {}).pop(key, None)
+            self.kv_text.get(ns, {}).pop(key, None)
+        else:
+            self.kv.setdefault(ns, {})[key] = value
+            self.kv_text.setdefault(ns, {})[key] = _kv_json(value)
+
+    def _kv_append(self, ns: str, key: str):
+        text = self.kv_text.get(ns, {}).get(key)
+        line = (f"[{_kv_json(ns)},{_kv_json(key)},{text}]" if text is not None else _kv_json([ns, key])) + "\n"
+        self.kv_log.write(line)
+        self.kv_log.flush()
+        self.kv_log_bytes += len(line)
+        KV_STATS["appends"] += 1
+        if self.kv_log_bytes > max(KV_LOG_COMPACT_MIN, self.kv_snap_bytes) and self.compacting is None:
+            self._kv_compact()
+
+    def _kv_compact(self):
+        log, old = self.kv_path + ".log", self.kv_path + ".log.old"
+        self.kv_log.close()
+        if os.path.exists(old):   # a previous compaction never finished: keep its entries ahead of ours
+            with open(old, "a", encoding="utf-8") as dst, open(log, "r", encoding="utf-8") as src:
+                shutil.copyfileobj(src, dst)
+            os.remove(log)
+        else:
+            os.replace(log, old)
+        self.kv_log = open(log, "a", encoding="utf-8")
+        self.kv_log_bytes = 0
+        rows = {ns: dict(r) for ns, r in self.kv_text.items()}   # shallow copy of immutable strings
+
+        def write() -> int:
+            text = "{" + ",".join(_kv_json(ns) + ":{" + ",".join(f"{_kv_json(k)}:{v}" for k, v in r.items()) + "}"
+                                  for ns, r in rows.items()) + "}"
+            tmp = self.kv_path + ".tmp"
+            with open(tmp, "w", encoding="utf-8") as f:
+                f.write(text)
+            os.replace(tmp, self.kv_path)
+            os.remove(old)
+            return len(text)
+
+        def done(n: int):
+            self.kv_snap_bytes = n
+            KV_STATS["compactions"] += 1
+
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            done(write())
+            return
+        self.compacting = loop.run_in_executor(None, write)
+
+        def finished(fut: asyncio.Future):
+            self.compacting = None
+            if fut.exception():
+                print(f"[store] kv compaction failed ({fut.exception()}); {old} is kept and replayed on load.")
+            else:
+                done(fut.result())
+        self.compacting.add_done_callback(finished)
+
+    def kv_all(self, ns: str) -> Dict[str, Any]:
+        return dict(self._kv().get(ns, {}))
+
+    def kv_put(self, ns: str, key: str, value: Any):
+        if self.kv_undo is not None:
+            self.kv_undo.setdefault((ns, key), self._kv().get(ns, {}).get(key, _MISSING))
+        self._kv_set(ns, key, value)
+        if self.kv_undo is None:
+            self._kv_append(ns, key)
+
+    def kv_delete(self, ns: str, key: str):
+        if key not in self._kv().get(ns, {}):
+            return
+        if self.kv_undo is not None:
+            self.kv_undo.setdefault((ns, key), self.kv[ns][key])
+        self._kv_set(ns, key, _MISSING)
+        if self.kv_undo is None:
+            self._kv_append(ns, key)
+
+    async def next_id(self, name: str, start: int = 1) -> int:
+        n = self.counters.get(name, start)
+        self.counters[name] = n + 1
+        return n
+
+    def close(self):
+        if self.kv_log is not None:
+            self.kv_log.close()
+
+class SqliteUserStore:
+    shared = True
+
+    def __init__(self, path: str):
+        self.path = path
+        self.conn = sqlite3.connect(path, timeout=STORE_LOCK_TIMEOUT, isolation_level=None)
+        self.conn.execute("PRAGMA journal_mode=WAL")
+        self.conn.execute("PRAGMA synchronous=NORMAL")
+        self.conn.executescript("""
+            CREATE TABLE IF NOT EXISTS users (
+                uid TEXT PRIMARY KEY, version INTEGER NOT NULL, rev INTEGER NOT NULL, data TEXT NOT NULL);
+            CREATE INDEX IF NOT EXISTS users_rev ON users (rev);
+            CREATE TABLE IF NOT EXISTS kv (
+                ns TEXT NOT NULL, key TEXT NOT NULL, value TEXT NOT NULL, PRIMARY KEY (ns, key));
+        """)
+        # From here on the event loop never sits in SQLite's busy handler: waiting for
+        # another process's write lock happens in _lock() between asyncio sleeps.
+        self.conn.execute("PRAGMA busy_timeout=0")
+        self.versions: Dict[str, int] = {}   # uid -> version we last read/wrote
+        self.written: Dict[str, str] = {}    # uid -> JSON we last read/wrote (dirty check and merge base)
+        self.rev = 0                         # highest row revision seen by pull()
+        self.data_version = None
+        self.kv_pending: Dict[Tuple[str, str], Optional[str]] = {}   # kv writes not yet committed (None = delete)
+        self.db: Optional[Dict[str, Dict[str, Any]]] = None          # USER_DB, for deferred saves
+        self.retry: Optional[asyncio.Task] = None
+        self.lock = asyncio.Lock()           # one open transaction per process
+        self.undo: Optional[Dict[str, Tuple[Optional[int], Optional[str]]]] = None   # uid -> (version, written) before this transaction
+
+    @staticmethod
+    def _dump(u: Dict[str, Any]) -> str:
+        return json.dumps(u, separators=(",", ":"))
+
+    def _data_version(self) -> int:
+        return self.conn.execute("PRAGMA data_version").fetchone()[0]
+
+    def _apply(self, db, uid: str, version: int, data: str):
+        fresh = json.loads(data)
+        inventory_rewritten(uid)
+        u = db.get(uid)
+        if isinstance(u, dict):
+            u.clear()
+            u.update(fresh)   # keep the dict identity other code may hold
+        else:
+            db[uid] = fresh
+        self.versions[uid] = version
+        self.written[uid] = data
+
+    def _reload(self, db, uid: str):
+        row = self.conn.execute("SELECT version, data FROM users WHERE uid = ?", (uid,)).fetchone()
+        if row:
+            self._apply(db, uid, row[0], row[1])
+        else:
+            db.pop(uid, None)
+            inventory_rewritten(uid)
+            self.versions.pop(uid, None)
+            self.written.pop(uid, None)
+
+    def _write(self, uid: str, data: str, rev: int) -> bool:
+        ver = self.versions.get(uid)
+        if ver is None:
+            cur = self.conn.execute(
+                "INSERT OR IGNORE INTO users (uid, version, rev, data) VALUES (?, 1, ?, ?)", (uid, rev, data))
+            ver = 0
+        else:
+            cur = self.conn.execute(
+                "UPDATE users SET data = ?, version = version + 1, rev = ? WHERE uid = ? AND version = ?",
+                (data, rev, uid, ver))
+        if cur.rowcount == 0:
+            return False
+        if self.undo is not None:
+            self.undo.setdefault(uid, (self.versions.get(uid), self.written.get(uid)))
+        self.versions[uid] = ver + 1
+        self.written[uid] = data
+        return True
+
+    def _rebase(self, db, uid: str, data: str, rev: int):
+        """Another process wrote this user since we read it: replay our changes on top of its record."""
+        row = self.conn.execute("SELECT version, data FROM users WHERE uid = ?", (uid,)).fetchone()
+        base = json.loads(self.written.get(uid) or "{}")
+        merged = self._dump(merge_user_record(base, json.loads(data), json.loads(row[1])) if row else json.loads(data))
+        if row:
+            self.versions[uid] = row[0]
+        else:
+            self.versions.pop(uid, None)
+        if self.undo is not None:   # rolled back: their row is the base our in-memory merge sits on
+            self.undo[uid] = (row[0], row[1]) if row else (None, None)
+        if not self._write(uid, merged, rev):   # can't happen while we hold the write lock
+            raise StoreError(f"user {uid} changed under the write lock")
+        if merged != data:
+            self._apply(db, uid, self.versions[uid], merged)
+        STORE_STATS["merged"] += 1
+        print(f"[store] User {uid} was changed by another process; merged both updates.")
+
+    def _try_begin(self) -> Optional[int]:
+        """Take the cross-process write lock if it's free; None if another process holds it."""
+        try:
+            self.conn.execute("BEGIN IMMEDIATE")
+        except sqlite3.OperationalError as e:
+            if "locked" not in str(e) and "busy" not in str(e):
+                raise
+            STORE_STATS["busy"] += 1
+            return None
+        self.undo = {}
+        return self.conn.execute("SELECT COALESCE(MAX(rev), 0) + 1 FROM users").fetchone()[0]
+
+    def _end(self, commit: bool):
+        """COMMIT, or ROLLBACK and forget the versions this transaction claimed to have written."""
+        undo, self.undo = self.undo or {}, None
+        if commit:
+            self.conn.execute("COMMIT")
+            return
+        self.conn.execute("ROLLBACK")
+        for uid, (ver, data) in undo.items():
+            if ver is None:
+                self.versions.pop(uid, None)
+                self.written.pop(uid, None)
+            else:
+                self.versions[uid], self.written[uid] = ver, data
+
+    async def _lock(self) -> int:
+        delay, deadline = 0.005, time.monotonic() + STORE_LOCK_TIMEOUT
+        while True:
+            rev = self._try_begin()
+            if rev is not None:
+                return rev
+            if time.monotonic() > deadline:
+                raise StoreError(f"{self.path} stayed locked for {STORE_LOCK_TIMEOUT:.0f}s")
+            await asyncio.sleep(delay)
+            delay = min(0.25, delay * 2)
+
+    def _lock_blocking(self) -> int:
+        """Startup/shutdown only (no event loop to yield to)."""
+        self.conn.execute(f"PRAGMA busy_timeout={int(STORE_LOCK_TIMEOUT * 1000)}")
+        try:
+            while True:
+                rev = self._try_begin()
+                if rev is not None:
+                    return rev
+        finally:
+            self.conn.execute("PRAGMA busy_timeout=0")
+
+    def load_all(self) -> Dict[str, Dict[str, Any]]:
+        if not self.conn.execute("SELECT 1 FROM users LIMIT 1").fetchone() and os.path.exists(USER_FILE):
+            legacy = safe_read_json(USER_FILE, {})
+            rev = self._lock_blocking()
+            for uid, u in legacy.items():
+                self._write(uid, self._dump(u), rev)
+            self._end(True)
+            print(f"[store] Imported {len(legacy)} user(s) from {USER_FILE} into {self.path}.")
+        db: Dict[str, Dict[str, Any]] = {}
+        for uid, ver, rev, data in self.conn.execute("SELECT uid, version, rev, data FROM users"):
+            self._apply(db, uid, ver, data)
+            self.rev = max(self.rev, rev)
+        self.data_version = self._data_version()
+        self.db = db
+        return db
+
+    def pull(self, db: Dict[str, Dict[str, Any]]) -> int:
+        """Pick up records other processes committed; a single PRAGMA when nothing changed."""
+        dv = self._data_version()
+        if dv == self.data_version:
+            return 0
+        self.data_version = dv
+        n = 0
+        rows = self.conn.execute("SELECT uid, version, rev, data FROM users WHERE rev > ?", (self.rev,)).fetchall()
+        for uid, ver, rev, data in rows:
+            self.rev = max(self.rev, rev)
+            if self.versions.get(uid) == ver:
+                continue
+            mine = self._dump(db[uid]) if isinstance(db.get(uid), dict) else None
+            if mine is not None and mine != self.written.get(uid):
+                continue   # unsaved local changes: the next save merges them with this row
+            self._apply(db, uid, ver, data)
+            n += 1
+        return n
+
+    def _flush(self, db: Dict[str, Dict[str, Any]], rev: int):
+        """Write dirty users and pending kv rows inside an open transaction."""
+        for uid, u in list(db.items()):
+            data = self._dump(u)
+            if self.written.get(uid) != data and not self._write(uid, data, rev):
+                self._rebase(db, uid, data, rev)
+        for (ns, key), value in self.kv_pending.items():
+            if value is None:
+                self.conn.execute("DELETE FROM kv WHERE ns = ? AND key = ?", (ns, key))
+            else:
+                self.conn.execute("INSERT OR REPLACE INTO kv (ns, key, value) VALUES (?, ?, ?)", (ns, key, value))
+
+    def _commit(self, db: Dict[str, Dict[str, Any]], rev: int):
+        try:
+            self._flush(db, rev)
+        except BaseException:
+            self._end(False)
+            raise
+        self._end(True)
+        self.kv_pending.clear()
+
+    def save(self, db: Dict[str, Dict[str, Any]]):
+        """Persist every changed user (and queued kv writes). Never blocks on another process:
+        if the write lock is taken, the save is retried from the event loop."""
+        self.db = db
+        if self.conn.in_transaction or (self.retry and not self.retry.done()):
+            return   # the open transaction / pending retry picks these changes up
+        rev = self._try_begin()
+        if rev is None:
+            self._save_later()
+            return
+        self._commit(db, rev)
+
+    def _save_later(self):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:   # no loop (startup/shutdown): just wait for the lock
+            self._commit(self.db, self._lock_blocking())
+            return
+        self.retry = loop.create_task(self._retry_save())
+
+    async def _retry_save(self):
+        while True:
+            STORE_STATS["retries"] += 1
+            try:
+                async with self.lock:
+                    self._commit(self.db, await self._lock())
+                return
+            except StoreError as e:
+                print(f"[store] Save still waiting: {e}; changes are kept in memory.")
+
+    def close(self):
+        if self.retry and not self.retry.done():
+            self.retry.cancel()
+        if self.db is not None and not self.conn.in_transaction:
+            self._commit(self.db, self._lock_blocking())
+        self.conn.close()
+
+    @asynccontextmanager
+    async def transaction(self, db: Dict[str, Dict[str, Any]], uids: List[str]):
+        """Atomic read-modify-write of several users, serialized across processes.
+        Raises StoreError if the write lock can't be had within STORE_LOCK_TIMEOUT."""
+        async with self.lock:
+            rev = await self._lock()
+            kv_before = dict(self.kv_pending)
+            before: Optional[Dict[str, Optional[str]]] = None
+            try:
+                for uid in uids:
+                    mine = self._dump(db[uid]) if isinstance(db.get(uid), dict) else None
+                    row = self.conn.execute("SELECT version, data FROM users WHERE uid = ?", (uid,)).fetchone()
+                    if row and row[0] != self.versions.get(uid):
+                        if mine is not None and mine != self.written.get(uid):
+                            self._rebase(db, uid, mine, rev)   # unsaved local changes + a newer row
+                        else:
+                            self._apply(db, uid, row[0], row[1])
+                before = {uid: self._dump(db[uid]) if isinstance(db.get(uid), dict) else None for uid in uids}
+                yield
+                self._flush(db, rev)
+            except BaseException:
+                self._end(False)
+                self.kv_pending = kv_before
+                for uid in uids:   # undo in-memory changes
+                    inventory_rewritten(uid)
+                    if before is None:
+                        self._reload(db, uid)
+                    elif before[uid] is None:
+                        db.pop(uid, None)
+                    else:
+                        u = db.setdefault(uid, {})
+                        u.clear()
+                        u.update(json.loads(before[uid]))
+                raise
+            self._end(True)
+            self.kv_pending.clear()
+
+    def kv_all(self, ns: str) -> Dict[str, Any]:
+        rows = self.conn.execute("SELECT key, value FROM kv WHERE ns = ?", (ns,))
+        out = {k: json.loads(v) for k, v in rows}
+        for (pns, key), value in self.kv_pending.items():
+            if pns == ns:
+                if value is None:
+                    out.pop(key, None)
+                else:
+                    out[key] = json.loads(value)
+        return out
+
+    def kv_put(self, ns: str, key: str, value: Any):
+        self.kv_pending[(ns, key)] = json.dumps(value, separators=(",", ":"))
+        if not self.conn.in_transaction:
+            self.save(self.db or {})
+
+    def kv_delete(self, ns: str, key: str):
+        self.kv_pending[(ns, key)] = None
+        if not self.conn.in_transaction:
+            self.save(self.db or {})
+
+    async def next_id(self, name: str, start: int = 1) -> int:
+        """Process-safe counter (trade ids etc.)."""
+        async with self.lock:
+            await self._lock()
+            try:
+                row = self.conn.execute("SELECT value FROM kv WHERE ns = 'counter' AND key = ?", (name,)).fetchone()
+                n = int(row[0]) if row else start
+                self.conn.execute("INSERT OR REPLACE INTO kv (ns, key, value) VALUES ('counter', ?, ?)", (name, str(n + 1)))
+            except BaseException:
+                self._end(False)
+                raise
+            self._end(True)
+        return n
+
+def open_store(url: str):
+    if url.startswith("sqlite:"):
+        return SqliteUserStore(url[len("sqlite:"):] or "theta.db")
+    return JsonUserStore(USER_FILE)
+
+STORE: Any = None   # opened by startup(); importing main never touches the store
 
 # Load datasets
 TAC_DATA: Dict[str, Dict[str, Any]] = safe_read_json(TAC_FILE, {})
-USER_DB: Dict[str, Dict[str, Any]] = safe_read_json(USER_FILE, {})
+USER_DB: Dict[str, Dict[str, Any]] = {}   # filled by startup()
 BOSS_TIERS: Dict[str, Dict[str, Any]] = safe_read_json(BOSS_FILE, {})
 
+# Anything derived from TAC_DATA/BOSS_TIERS registers here to be dropped when they change.
+CATALOG_VERSION = 0
+CATALOG_HOOKS: List[Callable[[], None]] = []
+
+def on_catalog_reload(fn: Callable[[], None]) -> Callable[[], None]:
+    CATALOG_HOOKS.append(fn)
+    return fn
+
+def catalog_changed():
+    global CATALOG_VERSION
+    CATALOG_VERSION += 1
+    for fn in CATALOG_HOOKS:
+        fn()
+
+# ---- Compiled TAC catalog ----
+# TAC.json compiled once into read-only per-species records, so hot paths index a
+# tuple instead of walking nested dicts and stringify nothing per call. Rebuilt by
+# the first catalog hook, so everything registered after it sees the new catalog.
+STAT_KEYS = ("attack", "speed", "health", "endurance")
+
+class TacSpecies(NamedTuple):
+    key: str
+    index: int                       # position in TAC.json, stable until the next reload
+    name: str
+    base: Tuple[int, int, int, int]  # base stats in STAT_KEYS order (missing = 0)
+    egg_mask: int                    # one bit per egg group, see EGG_GROUP_BITS
+    sort_key: Tuple[int, str]        # (TAC.json id, key); species without id sort last
+    stats_text: str                  # format_stats() of the base stats
+    egg_text: str
+    region: str
+    ivs_template: str                # format_instance_ivs() with the IV values left as {}
+    aliases: Tuple[str, ...]         # optional TAC.json "aliases", lower-cased
+    kind: str                        # TAC.json "type"
+    description: str
+    artist: str
+    image_file: str
+    value: Optional[Mapping[str, int]]   # shop price / sell value, None = not for sale
+    catch_reward: Mapping[str, int]
+
+NO_BASE = (0, 0, 0, 0)
+
+def ivs_template(base: Tuple[int, ...]) -> str:
+    return "  •  ".join(f"**{k.upper()}** {{}}/{b}" if b > 0 else f"**{k.upper()}** {{}}" for k, b in zip(STAT_KEYS, base))
+
+def format_stats(stats: dict) -> str:
+    return (
+        f"**ATTACK** {stats.get('attack','?')}  •  "
+        f"**SPEED** {stats.get('speed','?')}\n"
+        f"**HEALTH** {stats.get('health','?')}  •  "
+        f"**ENDURANCE** {stats.get('endurance','?')}"
+    )
+
+def compile_catalog(tac_data: Dict[str, Dict[str, Any]]) -> Tuple[Mapping[str, TacSpecies], Mapping[str, int]]:
+    bits: Dict[str, int] = {}
+    out: Dict[str, TacSpecies] = {}
+    for i, (key, td) in enumerate(tac_data.items()):
+        groups = list(td.get("egg_groups", []))
+        for g in groups:
+            bits.setdefault(g, 1 << len(bits))
+        stats = td.get("stats", {})
+        base = tuple(int(stats.get(k, 0) or 0) for k in STAT_KEYS)
+        aliases = td.get("aliases", ())
+        if isinstance(aliases, str):
+            aliases = (aliases,)
+        out[key] = TacSpecies(
+            key, i, td.get("name", key), base,
+            sum(bits[g] for g in set(groups)), (int(td.get("id", 1_000_000)), key),
+            format_stats(stats), ", ".join(groups), td.get("region", ""), ivs_template(base),
+            tuple(str(a).lower().strip() for a in aliases if str(a).strip()),
+            td.get("type", ""), td.get("description", ""), td.get("artist", "@lordhank2"), td.get("image_file", ""),
+            MappingProxyType(dict(td["value"])) if td.get("value") else None,
+            MappingProxyType(dict(td.get("catch_reward", {"gold_shards": 5}))))
+    return MappingProxyType(out), MappingProxyType(bits)
+
+CATALOG: Mapping[str, TacSpecies] = MappingProxyType({})
+EGG_GROUP_BITS: Mapping[str, int] = MappingProxyType({})
+
+@on_catalog_reload
+def _compile_catalog():
+    global CATALOG, EGG_GROUP_BITS
+    CATALOG, EGG_GROUP_BITS = compile_catalog(TAC_DATA)
+
+_compile_catalog()
+
+def tac_name(tac_key: str) -> str:
+    sp = CATALOG.get(tac_key)
+    return sp.name if sp else tac_key
+
+NO_IVS_TEMPLATE = ivs_template(NO_BASE)
+
+def species_base(tac_key: str) -> Tuple[int, int, int, int]:
+    sp = CATALOG.get(tac_key)
+    return sp.base if sp else NO_BASE
+
+def egg_compatible(tac_a: str, tac_b: str) -> bool:
+    a, b = CATALOG.get(tac_a), CATALOG.get(tac_b)
+    return bool(a and b and a.egg_mask & b.egg_mask)
+
 def save_user_db():
-    safe_write_json(USER_FILE, USER_DB)
+    STORE.save(USER_DB)
+
+def sync_users():
+    """Refresh user records changed by other bot processes (no-op for user.json)."""
+    STORE.pull(USER_DB)
+
+# ================= Art Asset Variants =================
+# Optimized copies of every image_file, cached on disk by content hash:
+#   full  -> lossless-recompressed PNG (spawns, describe, inspect, bosses)
+#   thumb -> downscaled PNG (profile cards)
+# Without Pillow the originals are sent as-is. A cache miss while the bot is running
+# (e.g. new art after a catalog reload) sends the original and builds the variants in
+# a worker thread, so Pillow never runs on the event loop.
+try:
+    from PIL import Image
+except ImportError:
+    Image = None
+
+ASSET_CACHE_DIR = ".asset_cache"
+ASSET_THUMB_SIZE = 256
+ASSET_VARIANTS: Dict[str, Dict[str, str]] = {}  # source path -> {variant: path}
+ASSET_BUILDS: Dict[str, asyncio.Task] = {}       # source path -> background build in flight
+
+def _file_digest(path: str) -> str:
+    h = hashlib.sha1()
+    with open(path, "rb") as f:
+        for block in iter(lambda: f.read(65536), b""):
+            h.update(block)
+    return h.hexdigest()[:16]
+
+def _write_png_variant(src: str, dst: str, thumb: bool):
+    tmp = dst + ".tmp"
+    with Image.open(src) as im:
+        if thumb:
+            im.thumbnail((ASSET_THUMB_SIZE, ASSET_THUMB_SIZE))
+        im.save(tmp, format="PNG", optimize=True)
+    os.replace(tmp, dst)
+
+def build_asset_variants(path: str) -> Dict[str, str]:
+    """Build (or reuse) the cached variants of one image and pick the smallest per variant."""
+    out = {"full": path, "thumb": path}
+    if Image is None or not path or not os.path.exists(path):
+        ASSET_VARIANTS[path] = out
+        return out
+    digest = _file_digest(path)
+    os.makedirs(ASSET_CACHE_DIR, exist_ok=True)
+    for variant in ("full", "thumb"):
+        dst = os.path.join(ASSET_CACHE_DIR, f"{digest}_{variant}.png")
+        try:
+            if not os.path.exists(dst):
+                _write_png_variant(path, dst, thumb=(variant == "thumb"))
+        except Exception as e:
+            print(f"[assets] Could not build {variant} variant of {path}: {e}")
+            continue
+        # a thumbnail may fall back to the optimized full image, never the other way round
+        best = out["full"] if variant == "thumb" else path
+        if os.path.getsize(dst) < os.path.getsize(best):
+            out[variant] = dst
+        else:
+            out[variant] = best
+    ASSET_VARIANTS[path] = out
+    return out
+
+def build_all_asset_variants() -> int:
+    paths = {d.get("image_file", "") for d in list(TAC_DATA.values()) + list(BOSS_TIERS.values())}
+    built = 0
+    for p in sorted(paths):
+        if p and os.path.exists(p):
+            build_asset_variants(p)
+            built += 1
+    return built
+
+def asset_path(path: str, variant: str = "full") -> str:
+    v = ASSET_VARIANTS.get(path)
+    if v is None:
+        try:
+            asyncio.get_running_loop()
+        except RuntimeError:   # startup / --build-assets: nothing to block
+            v = build_asset_variants(path)
+        else:
+            if path not in ASSET_BUILDS:
+                task = ASSET_BUILDS[path] = asyncio.create_task(asyncio.to_thread(build_asset_variants, path))
+                task.add_done_callback(lambda _t, p=path: ASSET_BUILDS.pop(p, None))
+            return path
+    chosen = v.get(variant, path)
+    return chosen if os.path.exists(chosen) else path
+
+def attach_image(embed: discord.Embed, img: str, variant: str = "full") -> Optional[discord.File]:
+    """Attach the smallest suitable variant of img to embed (keeps the original filename)."""
+    if not img or not os.path.exists(img):
+        return None
+    fn = os.path.basename(img)
+    file = discord.File(asset_path(img, variant), filename=fn)
+    embed.set_image(url=f"attachment://{fn}")
+    return file
+
+# ---- Embed templates ----
+# The catalog-only part of an embed (title, description, species/boss fields,
+# footer) is built once per (kind, key, catalog version) and kept as its to_dict();
+# each send makes a new Embed from that with Embed.from_dict and adds the dynamic
+# fields. from_dict keeps the nested dicts it is given, so clones get copies: every
+# nested value of an embed dict is a flat dict or a list of them, one level is enough.
+EMBED_TEMPLATES: Dict[tuple, Dict[str, Any]] = {}   # (kind, key, catalog version) -> Embed.to_dict()
+EMBED_STATS = {"hits": 0, "builds": 0}
+
+def embed_template(kind: str, key: str, build: Callable[[], discord.Embed]) -> Dict[str, Any]:
+    k = (kind, key, CATALOG_VERSION)
+    tpl = EMBED_TEMPLATES.get(k)
+    if tpl is None:
+        tpl = EMBED_TEMPLATES[k] = build().to_dict()
+        EMBED_STATS["builds"] += 1
+    else:
+        EMBED_STATS["hits"] += 1
+    return tpl
+
+def embed_from(tpl: Dict[str, Any], head: Tuple[Dict[str, Any], ...] = ()) -> discord.Embed:
+    """A fresh Embed from a template, with `head` fields placed before the template's own."""
+    data = {k: dict(v) if isinstance(v, dict) else v for k, v in tpl.items()}
+    data["fields"] = [*map(dict, head), *map(dict, tpl.get("fields", ()))]
+    return discord.Embed.from_dict(data)
+
+@on_catalog_reload
+def _clear_embed_templates():
+    EMBED_TEMPLATES.clear()
 
 # ================= User Schema Helpers =================
 def ensure_user(uid: str, name: Optional[str] = None, status: str = "") -> Dict[str, Any]:
@@ -200,21 +1214,18 @@ import re, time
 def is_alphanumeric_only(text: str) -> bool:
     return bool(re.fullmatch(r"[A-Za-z0-9]+", text.strip()))
 
-def bump_repeat(channel_id: int, content: str) -> bool:
+def bump_repeat(ck: Tuple[int, int], content: str) -> bool:
     now = time.time()
-    arr = REPEAT_TRACK[channel_id][content]
+    arr = REPEAT_TRACK[ck][content]
     arr = [t for t in arr if now - t <= REPEAT_WINDOW]  # prune old entries
     arr.append(now)
-    REPEAT_TRACK[channel_id][content] = arr
+    REPEAT_TRACK[ck][content] = arr
     return len(arr) >= REPEAT_THRESHOLD
 
 
 def roll_ivs_for_tac(tac_key: str) -> Tuple[Dict[str, int], float]:
-    td = TAC_DATA.get(tac_key, {})
-    base = td.get("stats", {})
     ivs, ratios = {}, []
-    for stat in ("attack", "speed", "health", "endurance"):
-        b = int(base.get(stat, 0))
+    for stat, b in zip(STAT_KEYS, species_base(tac_key)):
         if b <= 0:
             ivs[stat] = 0
             ratios.append(1.0)
@@ -282,6 +1293,8 @@ def remove_instance(uid: str, instance_id: int) -> Optional[Dict[str, Any]]:
     inv = u["inventory"]
     for i, inst in enumerate(inv):
         if inst["id"] == instance_id:
+            invalidate_combat_profile(uid, instance_id)
+            inventory_rewritten(uid)
             return inv.pop(i)
     return None
 
@@ -303,9 +1316,7 @@ def inventory_summary(uid: str) -> list[str]:
     inv.sort(key=lambda inst: (tac_sort_key(inst["tac"]), -float(inst.get("iv_avg", 100.0)), inst["id"]))
     lines = []
     for inst in inv:
-        tk = inst["tac"]
-        td = TAC_DATA.get(tk, {})
-        name = td.get("name", tk)
+        name = tac_name(inst["tac"])
         ivavg = float(inst.get("iv_avg", 100.0))
         iv_star = " ⭐" if abs(ivavg - 100.0) < 1e-6 else ""
         lines.append(
@@ -322,13 +1333,7 @@ def backfill_ivs_to_100():
         inv = u.get("inventory", [])
         for inst in inv:
             if "ivs" not in inst or "iv_avg" not in inst:
-                base = TAC_DATA.get(inst.get("tac", ""), {}).get("stats", {})
-                inst["ivs"] = {
-                    "attack": int(base.get("attack", 0)),
-                    "speed": int(base.get("speed", 0)),
-                    "health": int(base.get("health", 0)),
-                    "endurance": int(base.get("endurance", 0)),
-                }
+                inst["ivs"] = dict(zip(STAT_KEYS, species_base(inst.get("tac", ""))))
                 inst["iv_avg"] = 100.0
                 changed += 1
     if changed:
@@ -337,6 +1342,268 @@ def backfill_ivs_to_100():
 
 backfill_ivs_to_100()
 
+# ================= Economy ledger =================
+# Append-only history of everything that moves shards or TACs. One JSON line per
+# event: t=time, k=kind, d={uid: shard deltas}, n=new [uid, id, tac], r=removed
+# [uid, id, tac], m=moved [src, src_id, dst, dst_id, tac], u=other users, x=extras.
+# The active segment rolls over at LEDGER_SEGMENT_BYTES and is sealed in a worker
+# thread: gzipped as one member per LEDGER_BLOCK_BYTES of whole lines (still a plain
+# .gz file), next to a sidecar index with the block table, so startup reads the
+# sidecars plus the active segment only and a lookup inflates just its block.
+# In memory, each user and each "uid:instance_id" maps to the (segment, offset) of
+# the events touching it, so history/provenance lookups never scan the log.
+LEDGER_SEGMENT_BYTES = 4 * 1024 * 1024
+LEDGER_BLOCK_BYTES = 64 * 1024
+
+class Ledger:
+    def __init__(self, path: str):
+        self.path = path
+        self.by_user: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        self.by_inst: Dict[str, List[Tuple[int, int]]] = defaultdict(list)
+        self.seg_index: Dict[str, Dict[str, List[int]]] = {"u": {}, "i": {}}   # active segment, for its sidecar
+        self.blocks: Dict[int, List[Tuple[int, int]]] = {}   # sealed segment -> [(raw offset, gzip offset)] per block
+        self.sealing: Dict[int, asyncio.Future] = {}          # segments being compressed right now
+        self.seg = 1
+        self.fh = None
+        self.events = 0
+        os.makedirs(path, exist_ok=True)
+        self._load()
+
+    def _file(self, seg: int, ext: str) -> str:
+        return os.path.join(self.path, f"{seg:06d}.{ext}")
+
+    @staticmethod
+    def _keys(rec: Dict[str, Any]) -> Tuple[set, set]:
+        users = set(rec.get("d", {})) | set(rec.get("u", []))
+        insts = set()
+        for uid, iid, _ in rec.get("n", []) + rec.get("r", []):
+            users.add(uid); insts.add(f"{uid}:{iid}")
+        for src, sid, dst, did, _ in rec.get("m", []):
+            users.update((src, dst)); insts.update((f"{src}:{sid}", f"{dst}:{did}"))
+        return users, insts
+
+    def _index(self, seg: int, off: int, users, insts, active: bool):
+        for uid in users:
+            self.by_user[uid].append((seg, off))
+            if active: self.seg_index["u"].setdefault(uid, []).append(off)
+        for key in insts:
+            self.by_inst[key].append((seg, off))
+            if active: self.seg_index["i"].setdefault(key, []).append(off)
+        self.events += 1
+
+    def _scan(self, fh, seg: int, active: bool) -> int:
+        """Index every complete line of a segment; returns the offset after the last one."""
+        off = good = 0
+        for line in fh:
+            if not line.endswith(b"\n"):
+                break   # torn write from a crash
+            try:
+                self._index(seg, off, *self._keys(json.loads(line)), active)
+            except ValueError:
+                pass
+            off += len(line)
+            good = off
+        return good
+
+    def _load(self):
+        names = os.listdir(self.path)
+        sealed = sorted(int(f[:6]) for f in names if f.endswith(".jsonl.gz"))
+        open_segs = sorted(int(f[:6]) for f in names if f.endswith(".jsonl"))
+        for seg in sealed:
+            if seg in open_segs:   # crashed after compressing, before unlinking
+                os.remove(self._file(seg, "jsonl")); open_segs.remove(seg)
+            idx = safe_read_json(self._file(seg, "idx.json"), None)
+            if idx is None:
+                with gzip.open(self._file(seg, "jsonl.gz"), "rb") as fh:
+                    self._scan(fh, seg, False)
+                continue
+            for uid, offs in idx["u"].items():
+                self.by_user[uid].extend((seg, o) for o in offs)
+            for key, offs in idx["i"].items():
+                self.by_inst[key].extend((seg, o) for o in offs)
+            self.events += idx.get("n", 0)
+            if "b" in idx:   # segments sealed before blocks existed are one stream: read sequentially
+                self.blocks[seg] = [tuple(b) for b in idx["b"]]
+        last_sealed = max(sealed, default=0)
+        self.seg = open_segs[-1] if open_segs and open_segs[-1] > last_sealed else last_sealed + 1
+        for seg in open_segs:
+            with open(self._file(seg, "jsonl"), "rb") as fh:
+                good = self._scan(fh, seg, seg == self.seg)
+            if seg != self.seg:
+                self._sealed(seg, self._seal(seg))
+            elif good != os.path.getsize(self._file(seg, "jsonl")):
+                os.truncate(self._file(seg, "jsonl"), good)
+        for v in self.by_user.values(): v.sort()
+        for v in self.by_inst.values(): v.sort()
+
+    def _seal(self, seg: int, idx: Optional[Dict[str, Any]] = None) -> List[List[int]]:
+        """Compress a full segment block by block and write its sidecar; returns the block table.
+        Touches no shared state, so it can run in a worker thread."""
+        src = self._file(seg, "jsonl")
+        if idx is None:   # leftover segment from before a crash: rebuild its sidecar
+            idx = {"u": {}, "i": {}}
+            off = 0
+            with open(src, "rb") as fh:
+                for line in fh:
+                    try:
+                        users, insts = self._keys(json.loads(line))
+                    except ValueError:
+                        users, insts = (), ()
+                    for uid in users: idx["u"].setdefault(uid, []).append(off)
+                    for key in insts: idx["i"].setdefault(key, []).append(off)
+                    off += len(line)
+        idx["n"] = len({o for offs in idx["u"].values() for o in offs})
+        blocks: List[List[int]] = []
+        raw = packed = 0
+        with open(src, "rb") as fi, open(self._file(seg, "jsonl.gz.tmp"), "wb") as fo:
+            while True:
+                chunk = fi.read(LEDGER_BLOCK_BYTES)
+                if not chunk:
+                    break
+                chunk += fi.readline()   # a record never straddles two blocks
+                data = gzip.compress(chunk, mtime=0)
+                fo.write(data)
+                blocks.append([raw, packed])
+                raw += len(chunk); packed += len(data)
+        idx["b"] = blocks
+        safe_write_json(self._file(seg, "idx.json"), idx, separators=(",", ":"))
+        os.replace(self._file(seg, "jsonl.gz.tmp"), self._file(seg, "jsonl.gz"))
+        return blocks
+
+    def _sealed(self, seg: int, blocks: List[List[int]]):
+        """Switch reads of seg over to its .gz. Runs on the loop thread, so read() never
+        sees the raw file vanish under it."""
+        self.blocks[seg] = [tuple(b) for b in blocks]
+        os.remove(self._file(seg, "jsonl"))
+
+    def _seal_later(self, seg: int, idx: Dict[str, Any]):
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            self._sealed(seg, self._seal(seg, idx))
+            return
+        fut = self.sealing[seg] = loop.run_in_executor(None, self._seal, seg, idx)
+
+        def finished(f: asyncio.Future):
+            self.sealing.pop(seg, None)
+            if f.exception():
+                print(f"[ledger] sealing segment {seg} failed ({f.exception()}); it stays uncompressed until the next start.")
+            else:
+                self._sealed(seg, f.result())
+        fut.add_done_callback(finished)
+
+    def record(self, kind: str, **fields):
+        rec = {"t": int(time.time()), "k": kind}
+        rec.update((k, v) for k, v in fields.items() if v)
+        try:
+            if self.fh is None:
+                self.fh = open(self._file(self.seg, "jsonl"), "ab")
+            off = self.fh.tell()
+            self.fh.write(json.dumps(rec, separators=(",", ":"), ensure_ascii=False).encode() + b"\n")
+            self.fh.flush()
+            self._index(self.seg, off, *self._keys(rec), True)
+            if self.fh.tell() >= LEDGER_SEGMENT_BYTES:
+                self.fh.close(); self.fh = None
+                seg, idx = self.seg, self.seg_index
+                self.seg += 1
+                self.seg_index = {"u": {}, "i": {}}
+                self._seal_later(seg, idx)
+        except Exception as e:
+            print(f"[ledger] {kind}: {e}")
+
+    def read(self, positions: List[Tuple[int, int]]) -> List[Dict[str, Any]]:
+        """Records at the given positions, in the order given."""
+        out: Dict[Tuple[int, int], Dict[str, Any]] = {}
+        by_seg: Dict[int, List[int]] = defaultdict(list)
+        for seg, off in positions:
+            by_seg[seg].append(off)
+        for seg, offs in by_seg.items():
+            if seg == self.seg and self.fh is not None:
+                self.fh.flush()
+            try:
+                if os.path.exists(self._file(seg, "jsonl")):   # active, or still being sealed
+                    self._read_lines(open(self._file(seg, "jsonl"), "rb"), seg, offs, out)
+                elif seg in self.blocks:
+                    self._read_blocks(seg, offs, out)
+                else:
+                    self._read_lines(gzip.open(self._file(seg, "jsonl.gz"), "rb"), seg, offs, out)
+            except (OSError, ValueError) as e:
+                print(f"[ledger] read segment {seg}: {e}")
+        return [out[p] for p in positions if p in out]
+
+    @staticmethod
+    def _read_lines(fh, seg: int, offs: List[int], out: Dict[Tuple[int, int], Dict[str, Any]]):
+        with fh:
+            for off in sorted(offs):   # a single gzip stream only seeks forward cheaply
+                fh.seek(off)
+                out[(seg, off)] = json.loads(fh.readline())
+
+    def _read_blocks(self, seg: int, offs: List[int], out: Dict[Tuple[int, int], Dict[str, Any]]):
+        blocks = self.blocks[seg]
+        starts = [raw for raw, _ in blocks]
+        inflated: Dict[int, bytes] = {}
+        with open(self._file(seg, "jsonl.gz"), "rb") as fh:
+            for off in offs:
+                b = bisect.bisect_right(starts, off) - 1
+                if b not in inflated:
+                    fh.seek(blocks[b][1])
+                    size = blocks[b + 1][1] - blocks[b][1] if b + 1 < len(blocks) else -1
+                    inflated[b] = gzip.decompress(fh.read(size))
+                data, rel = inflated[b], off - blocks[b][0]
+                out[(seg, off)] = json.loads(data[rel:data.index(b"\n", rel) + 1])
+
+    def history(self, uid: str, offset: int = 0, limit: int = 10) -> Tuple[List[Dict[str, Any]], bool]:
+        """Newest-first page of a user's events, plus whether there are more."""
+        pos = self.by_user.get(uid, [])
+        end = len(pos) - offset
+        return self.read(pos[max(0, end - limit):max(0, end)][::-1]), end > limit
+
+    def provenance(self, uid: str, iid: int) -> List[Dict[str, Any]]:
+        """Oldest-first chain of owners for an instance, following trades back to its origin."""
+        chain: List[Dict[str, Any]] = []
+        key, before = f"{uid}:{iid}", (float("inf"), 0)
+        after = None
+        while key:
+            cands = [p for p in self.by_inst.get(key, []) if p < before]
+            if not cands:
+                break
+            recs = self.read(cands[::-1])
+            origin = next(((p, r) for p, r in zip(cands[::-1], recs)
+                           if any(f"{n[0]}:{n[1]}" == key for n in r.get("n", []))
+                           or any(f"{m[2]}:{m[3]}" == key for m in r.get("m", []))), None)
+            if after is None:   # what happened to it since it arrived (e.g. sold)
+                after = [r for p, r in zip(cands[::-1], recs) if not origin or p > origin[0]][::-1]
+            if not origin:
+                break
+            p, rec = origin
+            chain.append(rec)
+            mv = next((m for m in rec.get("m", []) if f"{m[2]}:{m[3]}" == key), None)
+            key, before = (f"{mv[0]}:{mv[1]}", p) if mv else (None, p)
+        return chain[::-1] + (after or [])
+
+    def close(self):
+        if self.fh is not None:
+            self.fh.close(); self.fh = None
+
+LEDGER: Optional[Ledger] = None   # opened by startup()
+
+def shard_delta(shards: Dict[str, int], sign: int = 1) -> Dict[str, int]:
+    return {k: sign * int(v) for k, v in shards.items() if v}
+
+def ledger_trade(kind: str, a_uid: str, b_uid: str, deal: Dict[str, Any], received: Dict[str, List[int]], **x):
+    """Record a settled apply_trade() with its instance renumbering."""
+    moves = [[a_uid, sid, b_uid, did, None] for sid, did in zip(deal["offer_ids"], received[b_uid])]
+    moves += [[b_uid, sid, a_uid, did, None] for sid, did in zip(deal["want_ids"], received[a_uid])]
+    for mv in moves:
+        mv[4] = (get_instance(mv[2], mv[3]) or {}).get("tac")
+    d: Dict[str, Dict[str, int]] = {a_uid: {}, b_uid: {}}
+    for src, dst, shards in ((a_uid, b_uid, deal["offer_shards"]), (b_uid, a_uid, deal["want_shards"])):
+        for k, v in shards.items():
+            if v:
+                d[src][k] = d[src].get(k, 0) - int(v)
+                d[dst][k] = d[dst].get(k, 0) + int(v)
+    LEDGER.record(kind, d={u: v for u, v in d.items() if v}, m=moves, u=[a_uid, b_uid], x=x)
+
 # ================= Astral =================
 def add_to_astral_rest(uid: str, instance_id: int):
     u = ensure_user(uid)
@@ -366,14 +1633,13 @@ def astral_list(uid: str) -> List[str]:
         inst = get_instance(uid, e["instance_id"])
         if not inst:
             continue
-        tk = inst["tac"]
-        nm = TAC_DATA.get(tk, {}).get("name", tk)
+        nm = tac_name(inst["tac"])
         if e["mode"] == "rest":
             lines.append(f"[REST] #{inst['id']} {nm} (Lv {inst['level']}, {inst['gender']}, IV {inst.get('iv_avg', 100.0):.1f}%)")
         else:
             br = e["breed"]
             partner = get_instance(uid, br["partner_instance_id"])
-            partner_nm = TAC_DATA.get(partner["tac"], {}).get("name", partner["tac"]) if partner else "(missing)"
+            partner_nm = tac_name(partner["tac"]) if partner else "(missing)"
             lines.append(f"[BREED] #{inst['id']} {nm} ↔ #{partner['id'] if partner else '?'} {partner_nm} "
                          f"({br['progress_cycles']}/{br['target_cycles']} cycles)")
     return lines
@@ -418,6 +1684,7 @@ def process_user_chars(uid: str, char_count: int):
 
         if e["mode"] == "rest":
             inst["level"] = min(REST_MAX_LEVEL, inst["level"] + cycles)
+            invalidate_combat_profile(uid, inst["id"])
         elif e["mode"] == "breed":
             br = e.get("breed", {})
             br["progress_cycles"] = br.get("progress_cycles", 0) + cycles
@@ -442,9 +1709,7 @@ def process_user_chars(uid: str, char_count: int):
                 pa = inst
                 pb = get_instance(uid, partner_id)
                 if pb:
-                    a_groups = set(TAC_DATA.get(pa["tac"], {}).get("egg_groups", []))
-                    b_groups = set(TAC_DATA.get(pb["tac"], {}).get("egg_groups", []))
-                    ok_groups = len(a_groups.intersection(b_groups)) > 0
+                    ok_groups = egg_compatible(pa["tac"], pb["tac"])
                     ok_gender = (pa["gender"] != pb["gender"])
                     if ok_groups and ok_gender:
                         baby_species = random.choice([pa["tac"], pb["tac"]])
@@ -488,16 +1753,177 @@ def recall_astral(uid: str) -> list[int]:
     return recalled_ids
 
 
+# ================= Outbound Send Queue =================
+# Ambient chatter (combat lines, catch/vanish notices) produced within
+# SEND_BATCH_WINDOW is merged into one message per channel. Priority sends
+# (anything answering a user directly) skip the window, and ambient flushes
+# wait for in-flight priority sends in the same channel.
+SEND_BATCH_WINDOW = 0.75
+SEND_STATS = {"queued": 0, "messages": 0, "merged": 0, "delayed": 0, "priority": 0}
+
+class ChannelDispatcher:
+    def __init__(self, channel: discord.abc.Messageable):
+        self.channel = channel
+        self.key = channel_key(channel)
+        self.lines: List[str] = []
+        self.task: Optional[asyncio.Task] = None
+        self.urgent = 0  # priority sends in flight
+        self.idle = asyncio.Event()  # set while no priority send is in flight
+        self.idle.set()
+
+    def post(self, text: str):
+        self.lines.append(text)
+        SEND_STATS["queued"] += 1
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._flush_later())
+
+    async def _flush_later(self):
+        # Lines posted while we sleep or send land in self.lines and post() sees this
+        # task still running, so keep going until a pass finds nothing new.
+        while self.lines:
+            await asyncio.sleep(SEND_BATCH_WINDOW)
+            if self.urgent:
+                SEND_STATS["delayed"] += len(self.lines)
+                await self.idle.wait()
+            lines, self.lines = self.lines, []
+            chunks = _chunk_text("\n".join(lines))
+            SEND_STATS["merged"] += max(0, len(lines) - len(chunks))
+            for c in chunks:
+                try:
+                    await self.channel.send(c)
+                    SEND_STATS["messages"] += 1
+                except Exception as e:
+                    print(f"[send] channel {getattr(self.channel, 'id', '?')}: {e}")
+        self._drop_if_idle()
+
+    def _drop_if_idle(self):
+        if (not self.lines and not self.urgent and (self.task is None or self.task.done() or self.task is asyncio.current_task())
+                and DISPATCHERS.get(self.key) is self):
+            DISPATCHERS.pop(self.key, None)
+
+DISPATCHERS: Dict[Tuple[int, int], ChannelDispatcher] = ShardedDict("dispatchers", shard_of_channel)  # channel_key -> dispatcher (dropped when idle)
+
+def dispatcher_for(channel: discord.abc.Messageable) -> ChannelDispatcher:
+    ck = channel_key(channel)
+    d = DISPATCHERS.get(ck)
+    if d is None:
+        d = DISPATCHERS[ck] = ChannelDispatcher(channel)
+    return d
+
+def queue_line(channel: discord.abc.Messageable, text: str):
+    """Queue an ambient line; it goes out merged with its neighbours after SEND_BATCH_WINDOW."""
+    dispatcher_for(channel).post(text)
+
+async def send_priority(channel: discord.abc.Messageable, *args, **kwargs) -> discord.Message:
+    """Send right away, holding back this channel's ambient flush until done."""
+    d = dispatcher_for(channel)
+    d.urgent += 1
+    d.idle.clear()
+    SEND_STATS["priority"] += 1
+    try:
+        return await channel.send(*args, **kwargs)
+    finally:
+        d.urgent -= 1
+        if not d.urgent:
+            d.idle.set()
+            d._drop_if_idle()
+
+# ================= Timers =================
+# Every deadline in the bot (spawn vanish, trade/PvP expiry, boss despawn, idle
+# parties) lives in one heap owned by one task. Keys are tuples like ("trade", 12);
+# scheduling a key again replaces its deadline, cancel is a dict pop. Stale heap
+# rows are skipped when they surface and compacted away if they pile up.
+class TimerService:
+    def __init__(self):
+        self.heap: List[Tuple[float, int, tuple]] = []               # (due, seq, key)
+        self.live: Dict[tuple, Tuple[float, int, Callable]] = {}      # key -> (due, seq, callback)
+        self.seq = 0
+        self.fired = 0
+        self.task: Optional[asyncio.Task] = None
+        self.wake: Optional[asyncio.Event] = None
+        self.running: set = set()   # coroutine callbacks in flight (the loop only keeps weak refs)
+
+    def schedule(self, key: tuple, delay: float, callback: Callable[[], Any]):
+        """Run callback (sync, or returning a coroutine) after delay seconds."""
+        self.seq += 1
+        due = time.monotonic() + max(0.0, delay)
+        self.live[key] = (due, self.seq, callback)
+        heapq.heappush(self.heap, (due, self.seq, key))
+        if len(self.heap) > 2 * len(self.live) + 256:
+            self.heap = [(d, q, k) for k, (d, q, _) in self.live.items()]
+            heapq.heapify(self.heap)
+        if self.task is None:
+            try:
+                asyncio.get_running_loop()
+            except RuntimeError:
+                return   # loaded before the loop exists; start() picks it up
+            self.start()
+        elif self.heap[0][1] == self.seq:
+            self.wake.set()   # new earliest deadline
+
+    def cancel(self, key: tuple) -> bool:
+        return self.live.pop(key, None) is not None
+
+    def remaining(self, key: tuple) -> Optional[float]:
+        e = self.live.get(key)
+        return max(0.0, e[0] - time.monotonic()) if e else None
+
+    def counts(self) -> Dict[str, int]:
+        out: Dict[str, int] = {}
+        for k in self.live:
+            out[k[0]] = out.get(k[0], 0) + 1
+        return out
+
+    def start(self):
+        if self.task is None or self.task.done():
+            self.wake = asyncio.Event()
+            self.task = asyncio.create_task(self._run())
+
+    async def _fire(self, key: tuple, coro):
+        try:
+            await coro
+        except Exception as e:
+            print(f"[timers] {key}: {e}")
+
+    async def _run(self):
+        while True:
+            while self.heap and self.live.get(self.heap[0][2], (0, None))[1] != self.heap[0][1]:
+                heapq.heappop(self.heap)   # cancelled or rescheduled
+            self.wake.clear()
+            if not self.heap:
+                await self.wake.wait()
+                continue
+            delay = self.heap[0][0] - time.monotonic()
+            if delay > 0:
+                try:
+                    await asyncio.wait_for(self.wake.wait(), timeout=delay)
+                except asyncio.TimeoutError:
+                    pass
+                continue
+            _, _, key = heapq.heappop(self.heap)
+            _, _, callback = self.live.pop(key)
+            self.fired += 1
+            try:
+                r = callback()
+                if asyncio.iscoroutine(r):
+                    t = asyncio.create_task(self._fire(key, r))
+                    self.running.add(t)
+                    t.add_done_callback(self.running.discard)
+            except Exception as e:
+                print(f"[timers] {key}: {e}")
+
+TIMERS = TimerService()
+
 # ================= Spawn & Catch (with IVs) =================
-SPAWNED_TAC: Dict[int, Dict[str, Any]] = {}
-THETA_TRACK: Dict[Tuple[int, int], List[float]] = {}
+SPAWNED_TAC: Dict[Tuple[int, int], Dict[str, Any]] = ShardedDict("spawned_tac", shard_of_channel)   # channel_key -> spawn
+THETA_TRACK: Dict[Tuple[int, int, int], List[float]] = ShardedDict("theta_track", shard_of_channel)  # (guild, channel, user) -> ts
 
 def count_theta_in(text: str) -> int:
     return text.lower().count("theta")
 
-def bump_theta(user_id: int, channel_id: int, hits: int) -> bool:
+def bump_theta(user_id: int, ck: Tuple[int, int], hits: int) -> bool:
     now = time.time()
-    key = (channel_id, user_id)
+    key = (*ck, user_id)
     arr = [t for t in THETA_TRACK.get(key, []) if now - t <= THETA_WINDOW_SEC]
     arr.extend([now] * hits)
     THETA_TRACK[key] = arr
@@ -516,27 +1942,11 @@ def is_caps_scream(text: str, *, min_len: int = 10, min_ratio: float = 0.9) -> b
     ok = sum(1 for c in nonspace if (c.isalpha() and c.isupper()) or c in "!?.-")
     return (ok / len(nonspace)) >= min_ratio
 
-def format_stats(stats: dict) -> str:
-    return (
-        f"**ATTACK** {stats.get('attack','?')}  •  "
-        f"**SPEED** {stats.get('speed','?')}\n"
-        f"**HEALTH** {stats.get('health','?')}  •  "
-        f"**ENDURANCE** {stats.get('endurance','?')}"
-    )
-
 def format_instance_ivs(inst: Dict[str, Any]) -> str:
-    tk = inst["tac"]
-    base = TAC_DATA.get(tk, {}).get("stats", {})
+    sp = CATALOG.get(inst["tac"])
     ivs = inst.get("ivs", {})
-    parts = []
-    for stat in ("attack", "speed", "health", "endurance"):
-        cur = ivs.get(stat, 0)
-        b = int(base.get(stat, 0) or 0)
-        if b > 0:
-            parts.append(f"**{stat.upper()}** {cur}/{b}")
-        else:
-            parts.append(f"**{stat.upper()}** {cur}")
-    return "  •  ".join(parts)
+    return (sp.ivs_template if sp else NO_IVS_TEMPLATE).format(
+        ivs.get("attack", 0), ivs.get("speed", 0), ivs.get("health", 0), ivs.get("endurance", 0))
 
 def iv_bar(current: int, base: int, width: int = 18) -> str:
     if base <= 0:
@@ -545,96 +1955,245 @@ def iv_bar(current: int, base: int, width: int = 18) -> str:
     filled = int(round(ratio * width))
     return "█" * filled + "░" * (width - filled)
 
+IV_BARS = [iv_bar(f, 18) for f in range(19)]   # every 18-wide bar, by filled cells
+
 def format_iv_bars(inst: Dict[str, Any]) -> str:
-    tk = inst["tac"]; base = TAC_DATA.get(tk, {}).get("stats", {})
     ivs = inst.get("ivs", {})
     lines = []
-    for label, key in (("ATK", "attack"), ("SPD", "speed"), ("HP", "health"), ("END", "endurance")):
-        cur = int(ivs.get(key, 0)); b = int(base.get(key, 1))
-        bar = iv_bar(cur, b, width=18)
-        pct = f"{(cur/b*100):.0f}%" if b else "—"
-        lines.append(f"{label} {bar} {pct}")
+    for label, key, b in zip(("ATK", "SPD", "HP", "END"), STAT_KEYS, species_base(inst["tac"])):
+        cur = int(ivs.get(key, 0))
+        if b > 0:
+            lines.append(f"{label} {IV_BARS[int(round(max(0.0, min(1.0, cur / b)) * 18))]} {cur / b * 100:.0f}%")
+        else:
+            lines.append(f"{label} {iv_bar(cur, b)} {f'{cur / b * 100:.0f}%' if b else '—'}")
     return "```" + "\n".join(lines) + "```"
 
 def user_can_summon(interaction: discord.Interaction) -> bool:
     return interaction.user.id in ALLOW_SUMMON_IDS
 
+SPAWN_TTL = 10.0   # seconds a spawn stays catchable
+
+def end_spawn(ck: Tuple[int, int]) -> Optional[Dict[str, Any]]:
+    """Close the channel's spawn (caught or vanished) and drop its timer and view."""
+    TIMERS.cancel(("spawn", ck))
+    sp = SPAWNED_TAC.pop(ck, None)
+    if sp and sp.get("view"):
+        sp["view"].stop()
+    return sp
+
+def expire_spawn(ck: Tuple[int, int], key: str):
+    sp = SPAWNED_TAC.get(ck)
+    if not sp or sp.get("key") != key:
+        return
+    end_spawn(ck)
+    ch = bot.get_channel(ck[1])
+    if ch and key in TAC_DATA:
+        queue_line(ch, f"💨 The {CATALOG[key].name} vanished back into the void...")
+
 class CatchView(discord.ui.View):
-    def __init__(self, channel_id: int, key: str, *, timeout: float = 10.0):
-        super().__init__(timeout=timeout)
-        self.channel_id = channel_id
+    def __init__(self, ck: Tuple[int, int], key: str):
+        super().__init__(timeout=None)   # expiry is the ("spawn", channel_key) timer
+        self.channel_key = ck
         self.key = key
         self.message: Optional[discord.Message] = None
         self.done = False
 
-    async def on_timeout(self):
-        if SPAWNED_TAC.get(self.channel_id, {}).get("key") == self.key and not self.done:
-            SPAWNED_TAC.pop(self.channel_id, None)
-            if self.message:
-                await self.message.channel.send(f"💨 The {TAC_DATA[self.key]['name']} vanished back into the void...")
-
     @discord.ui.button(label="Catch!", style=discord.ButtonStyle.success)
     async def catch_button(self, interaction: discord.Interaction, button: discord.ui.Button):
-        if SPAWNED_TAC.get(self.channel_id, {}).get("key") != self.key or self.done:
+        if SPAWNED_TAC.get(self.channel_key, {}).get("key") != self.key or self.done:
             return await interaction.response.send_message("Too late!", ephemeral=True)
+        sync_users()
         uid = str(interaction.user.id)
         level = random.randint(CATCH_MIN_LEVEL, CATCH_MAX_LEVEL)
         gender = random.choice(["M", "F"])
         instance_id = new_instance(uid, self.key, level, gender)
-        reward = TAC_DATA[self.key].get("catch_reward", {"gold_shards": 5})
+        reward = dict(CATALOG[self.key].catch_reward)
         add_currency(uid, reward)
         save_user_db()
+        LEDGER.record("catch", d={uid: shard_delta(reward)}, n=[[uid, instance_id, self.key]])
         self.done = True
         button.disabled = True
         await interaction.response.edit_message(view=self)
         rtxt = ", ".join([f"{v} {k}" for k, v in reward.items()])
         await interaction.followup.send(
-            f"🎉 {interaction.user.mention} caught **{TAC_DATA[self.key]['name']}** "
+            f"🎉 {interaction.user.mention} caught **{CATALOG[self.key].name}** "
             f"(#{instance_id}, Lv {level}, {gender_emoji(gender)}) (+{rtxt})"
         )
-        SPAWNED_TAC.pop(self.channel_id, None)
+        end_spawn(self.channel_key)
+
+# ---- Spawn sampler ----
+# Which species a trigger spawns comes from optional TAC.json fields:
+#   "spawn_weight": 2.5                      absolute weight (overrides rarity)
+#   "rarity": "rare"                         -> SPAWN_RARITY_WEIGHTS (evolved forms default to rare)
+#   "spawn_triggers": {"scream": 3, "gif": 0} per-trigger multiplier (1 if unlisted)
+# plus per-guild overrides set with %spawn_pool (allowed regions, per-species multipliers).
+# Each (trigger, guild override) is compiled once into a Vose alias table for O(1)
+# draws; tables are dropped when the catalog or that guild's override changes.
+SPAWN_TRIGGERS = ("theta", "scream", "gif")
+SPAWN_RARITY_WEIGHTS = {"common": 1.0, "uncommon": 0.5, "rare": 0.2, "epic": 0.08, "legendary": 0.03}
+SPAWN_TRIGGER_ONLY = {"scream": {"fleeb"}}   # triggers that only spawn these unless a species opts in
+SPAWN_POOLS: Dict[str, Dict[str, Any]] = {}   # guild_id -> {"regions": [...], "weights": {tac: x}}
+SPAWN_TABLES: Dict[Tuple[str, Optional[int]], Optional["AliasTable"]] = {}   # (trigger, guild_id) -> table
+
+class AliasTable:
+    """Walker/Vose alias method: O(n) build, O(1) weighted draw."""
+    __slots__ = ("keys", "weights", "prob", "alias")
+
+    def __init__(self, weights: Dict[str, float]):
+        self.keys = [k for k, w in weights.items() if w > 0]
+        self.weights = [float(weights[k]) for k in self.keys]
+        n, total = len(self.keys), sum(self.weights)
+        self.prob = [w * n / total for w in self.weights]
+        self.alias = list(range(n))
+        small = [i for i, p in enumerate(self.prob) if p < 1.0]
+        large = [i for i, p in enumerate(self.prob) if p >= 1.0]
+        while small and large:
+            lo, hi = small.pop(), large.pop()
+            self.alias[lo] = hi
+            self.prob[hi] -= 1.0 - self.prob[lo]
+            (small if self.prob[hi] < 1.0 else large).append(hi)
+        for i in small + large:   # float leftovers
+            self.prob[i] = 1.0
+
+    def draw(self, rng=random) -> str:
+        i = int(rng.random() * len(self.keys))
+        return self.keys[i] if rng.random() < self.prob[i] else self.keys[self.alias[i]]
+
+    def odds(self) -> List[Tuple[str, float]]:
+        total = sum(self.weights)
+        return sorted(((k, w / total) for k, w in zip(self.keys, self.weights)), key=lambda kv: -kv[1])
+
+def species_spawn_weight(key: str, td: Dict[str, Any], trigger: str, evolved: set) -> float:
+    w = td.get("spawn_weight")
+    if w is None:
+        rarity = str(td.get("rarity") or ("rare" if key in evolved else "common")).lower()
+        w = SPAWN_RARITY_WEIGHTS.get(rarity, 1.0)
+    trig = td.get("spawn_triggers") or {}
+    if trigger in trig:
+        w = float(w) * float(trig[trigger])
+    elif trigger in SPAWN_TRIGGER_ONLY and key not in SPAWN_TRIGGER_ONLY[trigger]:
+        return 0.0
+    return max(0.0, float(w))
+
+def build_spawn_table(trigger: str, gid: Optional[str]) -> Optional[AliasTable]:
+    pool = SPAWN_POOLS.get(gid, {}) if gid else {}
+    regions = {r.lower() for r in pool.get("regions", [])}
+    mult = pool.get("weights", {})
+    evolved = {td.get("evolves_to") for td in TAC_DATA.values() if td.get("evolves_to")}
+    weights = {}
+    for key, td in TAC_DATA.items():
+        if regions and str(td.get("region", "")).lower() not in regions:
+            continue
+        weights[key] = species_spawn_weight(key, td, trigger, evolved) * float(mult.get(key, 1.0))
+    return AliasTable(weights) if any(w > 0 for w in weights.values()) else None
 
-async def spawn_tac(channel: discord.abc.Messageable, key: Optional[str] = None):
-    ch_id = channel.id
-    if ch_id in SPAWNED_TAC:
+def spawn_table(trigger: str, guild_id: Optional[int] = None) -> Optional[AliasTable]:
+    k = (trigger, guild_id)
+    try:
+        return SPAWN_TABLES[k]
+    except KeyError:
+        pass
+    gid = str(guild_id) if guild_id is not None and str(guild_id) in SPAWN_POOLS else None
+    if guild_id is not None and gid is None:
+        t = spawn_table(trigger)   # no override: share the global table
+    else:
+        t = build_spawn_table(trigger, gid)
+        if t is None and trigger in SPAWN_TRIGGER_ONLY:   # e.g. no fleeb in this catalog/pool
+            t = spawn_table("any", guild_id)
+        if t is None and gid:   # override filtered everything out: use the global pool
+            t = spawn_table(trigger)
+    SPAWN_TABLES[k] = t
+    return t
+
+def pick_spawn(trigger: str, guild_id: Optional[int] = None) -> Optional[str]:
+    table = SPAWN_TABLES.get((trigger, guild_id)) or spawn_table(trigger, guild_id)
+    return table.draw() if table else None
+
+@on_catalog_reload
+def _clear_spawn_tables():
+    SPAWN_TABLES.clear()
+
+def set_spawn_pool(guild_id: int, pool: Optional[Dict[str, Any]]):
+    gid = str(guild_id)
+    if pool and (pool.get("regions") or pool.get("weights")):
+        SPAWN_POOLS[gid] = pool
+        STORE.kv_put("spawn_pool", gid, pool)
+    else:
+        SPAWN_POOLS.pop(gid, None)
+        STORE.kv_delete("spawn_pool", gid)
+    for k in [k for k in SPAWN_TABLES if k[1] == guild_id]:
+        SPAWN_TABLES.pop(k, None)
+
+async def spawn_tac(channel: discord.abc.Messageable, key: Optional[str] = None, trigger: str = "theta"):
+    ck = channel_key(channel)
+    if ck in SPAWNED_TAC:
         return
     if key is None:
-        if not TAC_DATA:
+        key = pick_spawn(trigger, ck[0] or None)
+        if key is None:
             return
-        key = random.choice(list(TAC_DATA.keys()))
-    tac = TAC_DATA.get(key)
+    tac = CATALOG.get(key)
     if not tac:
         return
-    SPAWNED_TAC[ch_id] = {"key": key}
-    embed = discord.Embed(
-        title=f"A wild {tac['name']} appeared!",
-        description="Click **Catch!** or send a GIF within **10 seconds** to catch it!",
-        color=discord.Color.red()
-    )
-    embed.add_field(name="Region", value=tac["region"], inline=True)
-    embed.add_field(name="Stats", value=format_stats(tac["stats"]), inline=False)
-    artist = tac.get("artist", "@lordhank2")  # default credit
-    embed.set_footer(text=f"Catch it quickly or it vanishes! | Art by {artist}")
-    file = None
-    img = tac.get("image_file", "")
-    if img and os.path.exists(img):
-        fn = os.path.basename(img)
-        file = discord.File(img, filename=fn)
-        embed.set_image(url=f"attachment://{fn}")
-    view = CatchView(ch_id, key, timeout=10.0)
+    SPAWNED_TAC[ck] = {"key": key, "expires_at": time.time() + SPAWN_TTL}
+
+    def build() -> discord.Embed:
+        embed = discord.Embed(
+            title=f"A wild {tac.name} appeared!",
+            description="Click **Catch!** or send a GIF within **10 seconds** to catch it!",
+            color=discord.Color.red()
+        )
+        embed.add_field(name="Region", value=tac.region, inline=True)
+        embed.add_field(name="Stats", value=tac.stats_text, inline=False)
+        embed.set_footer(text=f"Catch it quickly or it vanishes! | Art by {tac.artist}")
+        return embed
+    embed = embed_from(embed_template("spawn", key, build))
+    file = attach_image(embed, tac.image_file)
+    view = CatchView(ck, key)
+    sp = SPAWNED_TAC[ck]
+    sp["view"] = view   # before the send: a catch or expiry while it's in flight still stops it
     sent = await channel.send(embed=embed, file=file, view=view)
     view.message = sent
-    SPAWNED_TAC[ch_id]["message_id"] = sent.id
+    sp["message_id"] = sent.id
+    TIMERS.schedule(("spawn", ck), SPAWN_TTL, lambda: expire_spawn(ck, key))
 
 # ================= PvE BOSS (from boss.json) =================
-ATTACK_COOLDOWN = 0
 EMOJI_WINDOW_SEC = 8
 EMOJI_THRESHOLD = 12
 BOSS_DEFAULT_TIER = "wilter"   # default boss key
-
-GUILD_BOSSES: dict[int, dict] = {}
-EMOJI_BUCKETS: dict[int, list[float]] = {}
-PENDING_REWARDS: dict[int, dict[int, dict]] = {}
+BOSS_EDIT_INTERVAL = 2.0       # min seconds between boss embed edits per guild
+BOSS_DESPAWN_MIN = 0           # default minutes before an unkilled boss leaves (0 = never); boss.json "despawn_minutes" overrides
+
+GUILD_BOSSES: dict[int, dict] = ShardedDict("bosses", shard_of_guild)
+BOSS_MESSAGES: dict[int, discord.Message] = ShardedDict("boss_messages", shard_of_guild)   # guild_id -> boss embed Message
+BOSS_EDIT_LAST: dict[int, float] = ShardedDict("boss_edit_last", shard_of_guild)            # guild_id -> monotonic ts of last edit
+BOSS_EDIT_TASKS: dict[int, asyncio.Task] = ShardedDict("boss_edit_tasks", shard_of_guild)   # guild_id -> pending coalesced edit
+EMOJI_BUCKETS: dict[Tuple[int, int], list[float]] = ShardedDict("emoji_buckets", shard_of_channel)   # channel_key -> ts
+PENDING_REWARDS: dict[int, dict[int, dict]] = ShardedDict("pending_rewards", shard_of_guild)
+
+REWARD_KEYS = ("gold_shards", "diamond_shards", "enchanted_shards")
+
+def pack_reward(r: Dict[str, Any]) -> list:
+    """{"gold_shards": g, ..., "items": {...}} -> [g, d, e] or [g, d, e, {items}]"""
+    out: list = [int(r.get(k, 0)) for k in REWARD_KEYS]
+    if r.get("items"):
+        out.append(r["items"])
+    return out
+
+def unpack_reward(v) -> Dict[str, Any]:
+    if isinstance(v, dict):   # older uncompressed entries
+        return v
+    r: Dict[str, Any] = dict(zip(REWARD_KEYS, v[:3]))
+    if len(v) > 3:
+        r["items"] = v[3]
+    return r
+
+def persist_pending_rewards(guild_id: int):
+    gd = PENDING_REWARDS.get(guild_id)
+    if gd:
+        STORE.kv_put("pending_rewards", str(guild_id), {str(u): pack_reward(r) for u, r in gd.items()})
+    else:
+        STORE.kv_delete("pending_rewards", str(guild_id))
 
 def hp_bar(hp: int, hp_max: int, width: int = 24) -> str:
     if hp_max <= 0: return "░" * width
@@ -666,6 +2225,7 @@ async def spawn_boss(channel: discord.abc.Messageable, tier_key: str):
     hp = int(tier.get("hp", 50000))
     boss = {
         "tier": tier_key,
+        "tier_data": tier,   # this fight keeps its tier even if boss.json is reloaded
         "name": tier.get("name", tier_key),
         "hp": hp,
         "hp_max": hp,
@@ -677,62 +2237,175 @@ async def spawn_boss(channel: discord.abc.Messageable, tier_key: str):
         "raid": None
     }
     GUILD_BOSSES[guild_id] = boss
+    minutes = float(tier.get("despawn_minutes", BOSS_DESPAWN_MIN) or 0)
+    if minutes > 0:
+        boss["despawn_at"] = time.time() + minutes * 60
+        TIMERS.schedule(("boss", guild_id), minutes * 60, lambda: despawn_boss(guild_id, boss))
 
-    embed = discord.Embed(title=f"🧪 World Boss — {boss['name']}", color=discord.Color.dark_red())
-    embed.add_field(name="HP", value=f"{boss['hp']:,}/{boss['hp_max']:,}\n`{hp_bar(boss['hp'], boss['hp_max'])}`", inline=False)
-    desc = tier.get("description", "*A presence looms...*")
-    embed.add_field(name="Aura", value=desc, inline=False)
-    img = tier.get("image_file", "")
-    file = None
-    if img and os.path.exists(img):
-        fn = os.path.basename(img)
-        file = discord.File(img, filename=fn)
-        embed.set_image(url=f"attachment://{fn}")
+    def build() -> discord.Embed:
+        embed = discord.Embed(title=f"🧪 World Boss — {boss['name']}", color=discord.Color.dark_red())
+        embed.add_field(name="Aura", value=tier.get("description", "*A presence looms...*"), inline=False)
+        return embed
+    embed = embed_from(embed_template("boss_spawn", tier_key, build), (boss_hp_field(boss),))
+    file = attach_image(embed, tier.get("image_file", ""))
     m = await channel.send(embed=embed, file=file)
     boss["message_id"] = m.id
+    BOSS_MESSAGES[guild_id] = m
 
-async def update_boss_message(guild: discord.Guild):
-    boss = GUILD_BOSSES.get(guild.id)
-    if not boss: return
-    try:
-        ch = guild.get_channel(boss["channel_id"])
-        if not ch: return
-        msg = await ch.fetch_message(boss["message_id"])
-        tier = BOSS_TIERS.get(boss["tier"], {})
+def boss_tier(boss: Dict[str, Any]) -> Dict[str, Any]:
+    return boss.get("tier_data") or BOSS_TIERS.get(boss["tier"], {})
+
+def boss_hp_field(boss: Dict[str, Any]) -> Dict[str, Any]:
+    return {"name": "HP", "value": f"{boss['hp']:,}/{boss['hp_max']:,}\n`{hp_bar(boss['hp'], boss['hp_max'])}`", "inline": False}
+
+def build_boss_embed(boss: Dict[str, Any]) -> discord.Embed:
+    tier = boss_tier(boss)
+
+    def build() -> discord.Embed:
         embed = discord.Embed(title=f"🧪 World Boss — {boss['name']}", color=discord.Color.dark_red())
-        embed.add_field(name="HP", value=f"{boss['hp']:,}/{boss['hp_max']:,}\n`{hp_bar(boss['hp'], boss['hp_max'])}`", inline=False)
-        aura = tier.get("aura", "Its gaze lingers...")
-        embed.add_field(name="Aura", value=aura, inline=False)
-        if boss.get("raid"):
-            party = boss["raid"]
-            leader = party["leader"]
-            members = party["members"]
-            mtxt = ", ".join([f"<@{uid}>" for uid in [leader] + [m for m in members if m != leader]])
-            embed.add_field(name="Raid Party", value=mtxt or "(none)", inline=False)
-        contrib = sorted(boss["contributors"].items(), key=lambda kv: kv[1], reverse=True)[:3]
-        if contrib:
-            lines = [f"<@{uid}> — {dmg:,}" for uid, dmg in contrib]
-            embed.add_field(name="Top Damage", value="\n".join(lines), inline=False)
-        await msg.edit(embed=embed)
+        embed.add_field(name="Aura", value=tier.get("aura", "Its gaze lingers..."), inline=False)
+        return embed
+    if tier is BOSS_TIERS.get(boss["tier"]):
+        embed = embed_from(embed_template("boss", boss["tier"], build), (boss_hp_field(boss),))
+    else:   # a fight that outlived a catalog reload keeps its own tier
+        embed = build()
+        embed.insert_field_at(0, **boss_hp_field(boss))
+    if boss.get("raid"):
+        party = boss["raid"]
+        leader = party["leader"]
+        members = party["members"]
+        mtxt = ", ".join([f"<@{uid}>" for uid in [leader] + [m for m in members if m != leader]])
+        embed.add_field(name="Raid Party", value=mtxt or "(none)", inline=False)
+    contrib = heapq.nlargest(3, boss["contributors"].items(), key=lambda kv: kv[1])
+    if contrib:
+        lines = [f"<@{uid}> — {dmg:,}" for uid, dmg in contrib]
+        embed.add_field(name="Top Damage", value="\n".join(lines), inline=False)
+    return embed
+
+async def _boss_message(guild: discord.Guild, boss: Dict[str, Any]) -> Optional[discord.Message]:
+    """Cached boss Message; only falls back to a REST fetch on a cold cache (e.g. after restart)."""
+    msg = BOSS_MESSAGES.get(guild.id)
+    if msg and msg.id == boss["message_id"]:
+        return msg
+    ch = guild.get_channel(boss["channel_id"])
+    if not ch or not boss["message_id"]:
+        return None
+    msg = await ch.fetch_message(boss["message_id"])
+    BOSS_MESSAGES[guild.id] = msg
+    return msg
+
+async def _edit_boss_message(guild: discord.Guild, boss: Dict[str, Any]):
+    BOSS_EDIT_LAST[guild.id] = time.monotonic()
+    try:
+        msg = await _boss_message(guild, boss)
+        if msg:
+            await msg.edit(embed=build_boss_embed(boss))
     except Exception:
         pass
 
+async def _flush_boss_message_later(guild: discord.Guild, delay: float):
+    await asyncio.sleep(delay)
+    BOSS_EDIT_TASKS.pop(guild.id, None)
+    boss = GUILD_BOSSES.get(guild.id)
+    if boss:
+        await _edit_boss_message(guild, boss)
+
+async def update_boss_message(guild: discord.Guild, *, force: bool = False):
+    """
+    Coalesced boss embed edit: at most one edit per BOSS_EDIT_INTERVAL per guild,
+    always rendering the latest state. force=True edits right away (used on kill).
+    """
+    boss = GUILD_BOSSES.get(guild.id)
+    if not boss: return
+    if force:
+        pending = BOSS_EDIT_TASKS.pop(guild.id, None)
+        if pending:
+            pending.cancel()
+        return await _edit_boss_message(guild, boss)
+    if guild.id in BOSS_EDIT_TASKS:
+        return  # the pending edit will pick up this change
+    delay = BOSS_EDIT_LAST.get(guild.id, 0.0) + BOSS_EDIT_INTERVAL - time.monotonic()
+    if delay <= 0:
+        return await _edit_boss_message(guild, boss)
+    BOSS_EDIT_TASKS[guild.id] = asyncio.create_task(_flush_boss_message_later(guild, delay))
+
+def clear_boss_message(guild_id: int):
+    pending = BOSS_EDIT_TASKS.pop(guild_id, None)
+    if pending:
+        pending.cancel()
+    BOSS_MESSAGES.pop(guild_id, None)
+    BOSS_EDIT_LAST.pop(guild_id, None)
+
+def despawn_boss(guild_id: int, boss: Dict[str, Any]):
+    """Timer callback: the boss got bored and left. Nobody is rewarded."""
+    if GUILD_BOSSES.get(guild_id) is not boss or boss["hp"] <= 0:
+        return
+    GUILD_BOSSES.pop(guild_id, None)
+    raid = ACTIVE_RAID.get(guild_id)
+    if boss_is_fleeb_raid(boss) and raid:
+        ACTIVE_RAID.pop(guild_id, None)
+    clear_boss_message(guild_id)
+    ch = bot.get_channel(boss["channel_id"])
+    if ch:
+        queue_line(ch, f"💨 **{boss['name']}** lost interest and left. ({boss['hp']:,}/{boss['hp_max']:,} HP remaining)")
+
 def iv_factor(inst: Dict[str,Any]) -> float:
-    tk = inst["tac"]; base = TAC_DATA.get(tk, {}).get("stats", {})
-    ivs = inst.get("ivs", {})
-    nums = []
-    for k in ("attack","speed","health","endurance"):
-        b = int(base.get(k, 1)); v = max(0, int(ivs.get(k, 0)))
-        nums.append(v / b if b else 1.0)
-    return sum(nums)/len(nums) if nums else 1.0
+    g = inst.get("ivs", {}).get
+    a, s, h, e = species_base(inst["tac"])
+    return sum((max(0, int(g("attack", 0))) / a if a else 1.0, max(0, int(g("speed", 0))) / s if s else 1.0,
+                max(0, int(g("health", 0))) / h if h else 1.0, max(0, int(g("endurance", 0))) / e if e else 1.0)) / 4
 
-def base_damage(inst: Dict[str,Any]) -> float:
+def _compute_combat_profile(inst: Dict[str,Any]) -> Tuple[float, int]:
     ivf = iv_factor(inst)
     ivs = inst.get("ivs", {})
     stat_weight = ivs.get("attack",0)*0.55 + ivs.get("speed",0)*0.25 + ivs.get("endurance",0)*0.20
     lvf = 1.0 + (inst.get("level",1)/64.0)
-    rand = random.uniform(0.95, 1.08)
-    return (stat_weight * ivf * lvf / 50.0) * rand
+    # PvP HP is the IV health; if 0, fallback to base
+    hp = int(ivs.get("health", 0)) or species_base(inst["tac"])[2]
+    return stat_weight * ivf * lvf / 50.0, max(1, hp)
+
+# ---- Combat profile cache ----
+# (owner uid, instance id) -> (stamp, (coefficient, hp)). The stamp holds everything
+# the profile is computed from (species, level, IV values), so an instance changed
+# in place (level-up, evolution, reloaded from the store) misses instead of serving
+# a stale profile. Removal drops the entry; a catalog reload clears everything.
+COMBAT_PROFILES: Dict[Tuple[str, int], Tuple[tuple, Tuple[float, int]]] = {}
+COMBAT_PROFILE_MAX = 50000
+COMBAT_PROFILE_STATS = {"hits": 0, "misses": 0}
+
+def combat_profile_stamp(inst: Dict[str,Any]) -> tuple:
+    g = inst.get("ivs", {}).get
+    return (inst["tac"], inst.get("level", 1), g("attack"), g("speed"), g("health"), g("endurance"))
+
+def combat_profile(uid: str, inst: Dict[str,Any]) -> Tuple[float, int]:
+    """(damage coefficient, PvP HP) — the deterministic part of every hit, cached per instance."""
+    key = (uid, inst["id"])
+    stamp = combat_profile_stamp(inst)
+    hit = COMBAT_PROFILES.get(key)
+    if hit is not None and hit[0] == stamp:
+        COMBAT_PROFILE_STATS["hits"] += 1
+        return hit[1]
+    COMBAT_PROFILE_STATS["misses"] += 1
+    if len(COMBAT_PROFILES) >= COMBAT_PROFILE_MAX:
+        COMBAT_PROFILES.clear()
+    prof = _compute_combat_profile(inst)
+    COMBAT_PROFILES[key] = (stamp, prof)
+    return prof
+
+def invalidate_combat_profile(uid: str, instance_id: int):
+    """Call when an instance leaves its owner or changes level, IVs or species."""
+    COMBAT_PROFILES.pop((uid, instance_id), None)
+
+@on_catalog_reload
+def _clear_combat_profiles():
+    COMBAT_PROFILES.clear()
+
+def damage_coefficient(uid: str, inst: Dict[str,Any]) -> float:
+    """Deterministic part of base_damage (stat weight × IV factor × level factor)."""
+    return combat_profile(uid, inst)[0]
+
+def base_damage(uid: str, inst: Dict[str,Any]) -> float:
+    return combat_profile(uid, inst)[0] * random.uniform(0.95, 1.08)
 
 def emoji_count_in(text: str) -> int:
     custom = len(re.findall(r"<a?:\w+:\d+>", text))
@@ -741,34 +2414,117 @@ def emoji_count_in(text: str) -> int:
     return custom + uni
 
 # ================= Parties & Fleeb Raids =================
-PARTIES: Dict[int, Dict[int, Dict[str, Any]]] = {}  # guild_id -> {leader_id: {...}}
-ACTIVE_RAID: Dict[int, Dict[str, Any]] = {}  # guild_id -> {"leader": uid, "members": set(uids), "tier": "fleeb_raid"}
+# p["members"] is a dict used as an ordered set (uid -> None): O(1) membership, join order kept.
+# PARTY_OF indexes every member to their leader; only the helpers below touch either.
+PARTIES: Dict[int, Dict[int, Dict[str, Any]]] = ShardedDict("parties", shard_of_guild)  # guild_id -> {leader_id: {...}}
+PARTY_OF: Dict[int, Dict[int, int]] = ShardedDict("party_of", shard_of_guild)         # guild_id -> {user_id: leader_id}
+ACTIVE_RAID: Dict[int, Dict[str, Any]] = ShardedDict("active_raid", shard_of_guild)  # guild_id -> {"leader": uid, "tier": "fleeb_raid"}
 
 def get_party(guild_id: int, leader_id: int) -> Optional[Dict[str, Any]]:
     return PARTIES.get(guild_id, {}).get(leader_id)
 
+def party_of(guild_id: int, user_id: int) -> Optional[Dict[str, Any]]:
+    """The party user_id is in (as leader or member), if any."""
+    leader_id = PARTY_OF.get(guild_id, {}).get(user_id)
+    return get_party(guild_id, leader_id) if leader_id is not None else None
+
+PARTY_IDLE_SEC = 3600   # a party nobody touches for this long is disbanded
+
+def touch_party(guild_id: int, leader_id: int):
+    TIMERS.schedule(("party", guild_id, leader_id), PARTY_IDLE_SEC, lambda: expire_party(guild_id, leader_id))
+
+def expire_party(guild_id: int, leader_id: int):
+    raid = ACTIVE_RAID.get(guild_id)
+    if raid and raid["leader"] == leader_id and boss_active(guild_id):
+        return touch_party(guild_id, leader_id)   # mid-raid counts as active
+    disband_party(guild_id, leader_id)
+
 def ensure_party(guild_id: int, leader_id: int, max_members: int = 5) -> Dict[str, Any]:
     g = PARTIES.setdefault(guild_id, {})
     p = g.get(leader_id)
     if not p:
-        p = {"leader": leader_id, "members": [leader_id], "squads": {}, "max": max_members}
+        p = {"leader": leader_id, "members": {leader_id: None}, "squads": {}, "max": max_members}
         g[leader_id] = p
+        PARTY_OF.setdefault(guild_id, {})[leader_id] = leader_id
+        touch_party(guild_id, leader_id)
     return p
 
+def party_add_member(guild_id: int, p: Dict[str, Any], user_id: int):
+    p["members"][user_id] = None
+    PARTY_OF.setdefault(guild_id, {})[user_id] = p["leader"]
+    touch_party(guild_id, p["leader"])
+
+def party_remove_member(guild_id: int, p: Dict[str, Any], user_id: int):
+    p["members"].pop(user_id, None)
+    p["squads"].pop(user_id, None)
+    PARTY_OF.get(guild_id, {}).pop(user_id, None)
+
+def disband_party(guild_id: int, leader_id: int):
+    TIMERS.cancel(("party", guild_id, leader_id))
+    p = PARTIES.get(guild_id, {}).pop(leader_id, None)
+    if p:
+        idx = PARTY_OF.get(guild_id, {})
+        for m in p["members"]:
+            idx.pop(m, None)
+    raid = ACTIVE_RAID.get(guild_id)
+    if raid and raid["leader"] == leader_id:
+        ACTIVE_RAID.pop(guild_id, None)
+
 def user_in_any_party(guild_id: int, user_id: int) -> bool:
-    for p in PARTIES.get(guild_id, {}).values():
-        if user_id in p["members"]:
-            return True
-    return False
+    return user_id in PARTY_OF.get(guild_id, {})
 
 def party_bonus(mult_size: int) -> float:
     return min(1.0 + 0.04 * mult_size, 1.20)
 
+# ================= Slash Command Sync =================
+# on_ready fires again on every reconnect; only sync when the registered tree changed.
+DEV_GUILD_ID = int(os.getenv("DEV_GUILD_ID", "0") or 0)   # sync to one guild for fast iteration
+FORCE_SYNC = False    # --force-sync
+TREE_SYNCED = False   # already handled in this process
+
+def command_tree_hash(guild: Optional[discord.abc.Snowflake] = None) -> str:
+    """Stable hash over names, descriptions and parameter signatures of every registered slash command."""
+    payload = sorted((c.to_dict(tree) for c in tree.get_commands(guild=guild)), key=lambda d: d["name"])
+    raw = json.dumps(payload, sort_keys=True, separators=(",", ":"), ensure_ascii=False)
+    return hashlib.sha256(raw.encode("utf-8")).hexdigest()
+
+async def sync_command_tree():
+    global TREE_SYNCED
+    if TREE_SYNCED:
+        return
+    target = discord.Object(id=DEV_GUILD_ID) if DEV_GUILD_ID else None
+    if target:
+        tree.copy_global_to(guild=target)
+    scope = f"{bot.application_id}:{DEV_GUILD_ID or 'global'}"
+    digest = command_tree_hash(guild=target)
+    state = safe_read_json(SYNC_STATE_FILE, {})
+    if not FORCE_SYNC and state.get(scope) == digest:
+        print(f"[sync] Command tree unchanged ({scope}), skipping sync.")
+    else:
+        synced = await tree.sync(guild=target)
+        state[scope] = digest
+        safe_write_json(SYNC_STATE_FILE, state)
+        print(f"[sync] Synced {len(synced)} command(s) ({scope}).")
+    TREE_SYNCED = True
+
 # ================= Events =================
 @bot.event
 async def on_ready():
+    global READY_AFTER, SNAPSHOT_TASK, CATALOG_TASK
+    if READY_AFTER is None:
+        READY_AFTER = time.monotonic() - PROCESS_START
+        print(f"[startup] Ready after {READY_AFTER:.1f}s, RSS {rss_mb():.0f} MB "
+              f"({'lean' if LEAN_MEMBERS else 'full'} member cache).")
+    if SHARDED and bot.shard_count:
+        set_state_shards(bot.shard_count)
+    TIMERS.start()
+    await reattach_restored()
+    if SNAPSHOT_TASK is None:
+        SNAPSHOT_TASK = asyncio.create_task(snapshot_loop())
+    if CATALOG_TASK is None:
+        CATALOG_TASK = asyncio.create_task(catalog_watch_loop())
     try:
-        await bot.tree.sync()
+        await sync_command_tree()
     except Exception as e:
         print("Slash sync failed:", e)
     print(f"Logged in as {bot.user} (ID: {bot.user.id})")
@@ -778,14 +2534,18 @@ async def on_ready():
 async def on_message(message: discord.Message):
     if message.author.bot:
         return
+    note_shard_event(message.guild)
+    remember_member(message.author)
+    sync_users()
 
         # check spam for The Staring
+    ck = channel_key(message.channel)
     content = message.content.strip()
     if is_alphanumeric_only(content) and not message.attachments:
-        if bump_repeat(message.channel.id, content):
+        if bump_repeat(ck, content):
             await spawn_boss(message.channel, "staring")
             # reset to prevent immediate re-spawn
-            REPEAT_TRACK[message.channel.id][content] = []
+            REPEAT_TRACK[ck][content] = []
 
 
     # Feed Astral cycles
@@ -795,79 +2555,147 @@ async def on_message(message: discord.Message):
     # Theta chant -> spawn TAC
     hits = count_theta_in(message.content)
     if hits > 0 and message.guild:
-        now = time.time()
-        key = (message.channel.id, message.author.id)
-        if bump_theta(message.author.id, message.channel.id, hits):
-            if message.channel.id not in SPAWNED_TAC:
-                await spawn_tac(message.channel)
+        if bump_theta(message.author.id, ck, hits):
+            if ck not in SPAWNED_TAC:
+                await spawn_tac(message.channel, trigger="theta")
 
     # CAPS SCREAM trigger -> prefer Fleeb TAC
     if is_caps_scream(message.content):
         now = time.time()
-        last = LAST_SCREAM.get(message.channel.id, 0)
-        if now - last >= SCREAM_COOLDOWN_SEC and (message.channel.id not in SPAWNED_TAC):
-            LAST_SCREAM[message.channel.id] = now
-            key = "fleeb" if "fleeb" in TAC_DATA else None
-            await spawn_tac(message.channel, key=key)
-            await message.channel.send("⚠️ Your scream tore a rift and something hostile emerged!")
+        last = LAST_SCREAM.get(ck, 0)
+        if now - last >= SCREAM_COOLDOWN_SEC and (ck not in SPAWNED_TAC):
+            LAST_SCREAM[ck] = now
+            await spawn_tac(message.channel, trigger="scream")
+            queue_line(message.channel, "⚠️ Your scream tore a rift and something hostile emerged!")
 
     # Emoji spam -> spawn default boss if no raid
     if message.guild and not ACTIVE_RAID.get(message.guild.id):
-        ts = EMOJI_BUCKETS.get(message.channel.id, [])
+        ts = EMOJI_BUCKETS.get(ck, [])
         now = time.time()
         ts = [t for t in ts if now - t <= 8]
         count = emoji_count_in(message.content)
         if count:
             ts.extend([now] * count)
-            EMOJI_BUCKETS[message.channel.id] = ts
+            EMOJI_BUCKETS[ck] = ts
             if len(ts) >= 12 and not boss_active(message.guild.id):
-                EMOJI_BUCKETS[message.channel.id] = []
+                EMOJI_BUCKETS[ck] = []
                 await spawn_boss(message.channel, tier_key="wilter")
-                await message.channel.send(f"⚠️ The emoji surge agitated **{BOSS_TIERS.get('wilter',{}).get('name','the boss')}**!")
+                queue_line(message.channel, f"⚠️ The emoji surge agitated **{BOSS_TIERS.get('wilter',{}).get('name','the boss')}**!")
 
     # GIF spawn/catch
     lower = message.content.lower()
     is_gif = any(att.filename.lower().endswith(".gif") for att in message.attachments) \
              or "tenor.com" in lower or "giphy.com" in lower
 
-    if is_gif and (message.channel.id in SPAWNED_TAC):
-        key = SPAWNED_TAC[message.channel.id]["key"]
+    if is_gif and (ck in SPAWNED_TAC):
+        key = SPAWNED_TAC[ck]["key"]
         level = random.randint(CATCH_MIN_LEVEL, CATCH_MAX_LEVEL)
         gender = random.choice(["M", "F"])
         instance_id = new_instance(uid, key, level, gender)
-        reward = TAC_DATA[key].get("catch_reward", {"gold_shards": 5})
+        reward = dict(CATALOG[key].catch_reward)
         add_currency(uid, reward)
         save_user_db()
+        LEDGER.record("catch", d={uid: shard_delta(reward)}, n=[[uid, instance_id, key]])
         try:
-            msg_id = SPAWNED_TAC[message.channel.id].get("message_id")
-            if msg_id:
-                orig = await message.channel.fetch_message(msg_id)
-                if orig.components:
-                    view = CatchView(message.channel.id, key)
-                    for item in view.children:
-                        if isinstance(item, discord.ui.Button):
-                            item.disabled = True
-                    await orig.edit(view=view)
+            view = SPAWNED_TAC[ck].get("view")
+            if view and view.message and not view.done:
+                view.done = True
+                view.stop()
+                for item in view.children:
+                    if isinstance(item, discord.ui.Button):
+                        item.disabled = True
+                await view.message.edit(view=view)
         except Exception:
             pass
         rtxt = ", ".join([f"{v} {k}" for k, v in reward.items()])
-        await message.channel.send(
-            f"🎉 {message.author.mention} caught **{TAC_DATA[key]['name']}** "
+        queue_line(
+            message.channel,
+            f"🎉 {message.author.mention} caught **{CATALOG[key].name}** "
             f"(#{instance_id}, Lv {level}, {gender_emoji(gender)}) (+{rtxt})"
         )
-        SPAWNED_TAC.pop(message.channel.id, None)
+        end_spawn(ck)
         return
 
-    if is_gif and (message.channel.id not in SPAWNED_TAC):
-        await spawn_tac(message.channel)
+    if is_gif and (ck not in SPAWNED_TAC):
+        await spawn_tac(message.channel, trigger="gif")
 
     await bot.process_commands(message)
 
+@bot.event
+async def on_interaction(interaction: discord.Interaction):
+    note_shard_event(interaction.guild)
+    remember_member(interaction.user)
+
+# ================= Rate limits =================
+# Token buckets per command: scope -> (tokens refilled per second, burst size).
+# Commands without an entry are not limited.
+RATE_LIMITS: Dict[str, Dict[str, Tuple[float, float]]] = {
+    "attack":    {"user": (2.0, 5),  "guild": (25.0, 60), "global": (250.0, 500)},
+    "trade":     {"user": (0.2, 3),  "guild": (2.0, 10)},
+    "pvp":       {"user": (0.2, 3),  "guild": (2.0, 10)},
+    "inventory": {"user": (0.5, 4)},
+}
+RATE_SWEEP_SEC = 60
+RATE_BUCKETS: Dict[Tuple[str, str, int], List[float]] = {}   # (command, scope, id) -> [tokens, last_ts]
+RATE_THROTTLED: Dict[Tuple[str, str], int] = {}             # (command, scope) -> rejected calls
+_rate_last_sweep = 0.0
+
+def _sweep_rate_buckets(now: float):
+    """Drop buckets that have refilled completely; they are indistinguishable from new ones."""
+    global _rate_last_sweep
+    _rate_last_sweep = now
+    for key, b in list(RATE_BUCKETS.items()):
+        rate, burst = RATE_LIMITS[key[0]][key[1]]
+        if b[0] + (now - b[1]) * rate >= burst:
+            del RATE_BUCKETS[key]
+
+def rate_limited(command: str, user_id: int, guild_id: int) -> Optional[str]:
+    """Take one token from every bucket of command; returns the scope that ran dry, or None."""
+    limits = RATE_LIMITS.get(command)
+    if not limits:
+        return None
+    now = time.monotonic()
+    if now - _rate_last_sweep >= RATE_SWEEP_SEC:
+        _sweep_rate_buckets(now)
+    ids = {"user": user_id, "guild": guild_id, "global": 0}
+    buckets = []
+    for scope, (rate, burst) in limits.items():
+        key = (command, scope, ids[scope])
+        b = RATE_BUCKETS.get(key)
+        if b is None:
+            b = RATE_BUCKETS[key] = [float(burst), now]
+        else:
+            b[0] = min(float(burst), b[0] + (now - b[1]) * rate)
+            b[1] = now
+        if b[0] < 1.0:
+            RATE_THROTTLED[(command, scope)] = RATE_THROTTLED.get((command, scope), 0) + 1
+            return scope
+        buckets.append(b)
+    for b in buckets:
+        b[0] -= 1.0
+    return None
+
 # ================= Utilities =================
-def dual(prefix_name: str, slash_desc: str):
+def dual(prefix_name: str, slash_desc: str, autocomplete: Optional[Dict[str, Callable]] = None):
     def decorator(func: Callable):
-        bot.command(name=prefix_name)(func)
-        tree.command(name=prefix_name, description=slash_desc)(func)
+        callback = func
+        if prefix_name in RATE_LIMITS:
+            @functools.wraps(func)
+            async def throttled(ctx_or_inter, *args, **kwargs):
+                is_slash = isinstance(ctx_or_inter, discord.Interaction)
+                user = ctx_or_inter.user if is_slash else ctx_or_inter.author
+                guild = ctx_or_inter.guild
+                if rate_limited(prefix_name, user.id, guild.id if guild else 0):
+                    # prefix spam is dropped silently; slash needs some response
+                    if is_slash:
+                        await ctx_or_inter.response.send_message("⏳ Slow down a little.", ephemeral=True)
+                    return
+                return await func(ctx_or_inter, *args, **kwargs)
+            callback = throttled
+        bot.command(name=prefix_name)(callback)
+        slash = tree.command(name=prefix_name, description=slash_desc)(callback)
+        for param, handler in (autocomplete or {}).items():
+            slash.autocomplete(param)(handler)
         return func
     return decorator
 
@@ -882,6 +2710,169 @@ def astral_state_for(uid: str, inst_id: int) -> Optional[str]:
                 return f"Breeding ({br.get('progress_cycles',0)}/{br.get('target_cycles',16)} cycles)"
     return None
 
+# ================= Autocomplete =================
+# Slash autocomplete has to answer within Discord's 3 s deadline on every keystroke,
+# so nothing here scans a catalog or an inventory per request:
+#   • species: a prefix trie over names, keys, name words and TAC.json "aliases";
+#     every node keeps its best AUTOCOMPLETE_MAX completions, so a lookup is one
+#     walk down the typed prefix (rebuilt lazily after a catalog reload)
+#   • instances: a per-user index built on first use — ids sorted as strings for
+#     "#12…" prefixes, per-species lists by IV, and a cached top-25 for an empty
+#     box — reused until the inventory changes, with new catches folded in
+#     rather than re-sorted (see inst_index); only the returned choices get labels
+AUTOCOMPLETE_MAX = 25          # Discord's limit on choices per response
+INST_INDEX_MAX_USERS = 512
+
+class PrefixTrie:
+    __slots__ = ("root",)
+
+    def __init__(self, entries: List[Tuple[str, Any]], k: int = AUTOCOMPLETE_MAX):
+        """`entries` are (text, value) in rank order; each node keeps the first k distinct values below it."""
+        self.root: List[Any] = [{}, []]
+        for text, value in entries:
+            node = self.root
+            self._keep(node, value, k)
+            for ch in text:
+                node = node[0].setdefault(ch, [{}, []])
+                self._keep(node, value, k)
+
+    @staticmethod
+    def _keep(node: List[Any], value: Any, k: int):
+        top = node[1]
+        if len(top) < k and value not in top:
+            top.append(value)
+
+    def complete(self, prefix: str) -> List[Any]:
+        node = self.root
+        for ch in prefix:
+            node = node[0].get(ch)
+            if node is None:
+                return []
+        return node[1]
+
+TAC_TRIE: Optional[PrefixTrie] = None
+
+def tac_trie() -> PrefixTrie:
+    global TAC_TRIE
+    if TAC_TRIE is None:
+        entries = []
+        for sp in sorted(CATALOG.values(), key=lambda s: s.sort_key):
+            name = sp.name.lower()
+            for text in (sp.key, name, *name.split()[1:], *sp.aliases):
+                entries.append((text, sp.key))
+        TAC_TRIE = PrefixTrie(entries, k=max(AUTOCOMPLETE_MAX, len(CATALOG)))
+    return TAC_TRIE
+
+def tac_matches(query: str) -> List[str]:
+    """Species keys whose name, key or alias starts with `query`, in catalog order."""
+    q = query.lower().strip()
+    hits = tac_trie().complete(q)
+    if hits or not q:
+        return hits
+    # no prefix hit: fall back to a substring match (typos mid-word, "drake" for "ether drake")
+    return [sp.key for sp in sorted(CATALOG.values(), key=lambda s: s.sort_key)
+            if q in sp.key or q in sp.name.lower() or any(q in a for a in sp.aliases)]
+
+def tac_choice_label(tac_key: str) -> str:
+    name = tac_name(tac_key)
+    return name if name.lower() == tac_key else f"{name} ({tac_key})"
+
+def inst_rank(inst: Dict[str, Any]) -> Tuple[float, int]:
+    return (-float(inst.get("iv_avg", 100.0)), inst["id"])
+
+class InstanceIndex:
+    __slots__ = ("id_keys", "ids", "insts", "by_tac", "top")
+
+    def __init__(self, inv: List[Dict[str, Any]]):
+        self.insts = {int(i["id"]): i for i in inv}
+        self.id_keys = sorted(map(str, self.insts))
+        self.ids = list(map(int, self.id_keys))
+        self.by_tac: Dict[str, List[Tuple[Tuple[float, int], int]]] = {}
+        ranked = sorted((inst_rank(i), i["id"], i["tac"]) for i in self.insts.values())
+        for rank, iid, tac in ranked:
+            self.by_tac.setdefault(tac, []).append((rank, iid))
+        self.top = [iid for _, iid, _ in ranked[:AUTOCOMPLETE_MAX]]
+
+    def extend(self, new: List[Dict[str, Any]]):
+        """Fold freshly appended instances in without re-sorting the rest."""
+        for i in new:
+            iid = int(i["id"])
+            self.insts[iid] = i
+            k = bisect.bisect_left(self.id_keys, str(iid))
+            self.id_keys.insert(k, str(iid))
+            self.ids.insert(k, iid)
+            bisect.insort(self.by_tac.setdefault(i["tac"], []), (inst_rank(i), iid))
+        self.top = [iid for _, iid in heapq.nsmallest(
+            AUTOCOMPLETE_MAX, [(inst_rank(self.insts[j]), j) for j in self.top] + [(inst_rank(i), int(i["id"])) for i in new])]
+
+    def suggest(self, query: str) -> List[int]:
+        q = query.strip().lstrip("#").strip()
+        if not q:
+            return self.top
+        if q.isdigit():
+            lo = bisect.bisect_left(self.id_keys, q)
+            hi = min(len(self.id_keys), lo + AUTOCOMPLETE_MAX)
+            out = []
+            for j in range(lo, hi):
+                if not self.id_keys[j].startswith(q):
+                    break
+                out.append(self.ids[j])
+            return out
+        out = []
+        for tac in tac_matches(q):
+            out.extend(iid for _, iid in self.by_tac.get(tac, ())[:AUTOCOMPLETE_MAX - len(out)])
+            if len(out) >= AUTOCOMPLETE_MAX:
+                break
+        return out
+
+def inst_choice_label(inst: Dict[str, Any]) -> str:
+    return (f"#{inst['id']} {tac_name(inst['tac'])} {gender_emoji(inst.get('gender', ''))} "
+            f"Lv{inst.get('level', 1)} • IV {float(inst.get('iv_avg', 100.0)):.0f}%")
+
+INST_INDEXES: "OrderedDict[str, Tuple[tuple, InstanceIndex]]" = OrderedDict()
+
+def inst_index_stamp(uid: str, u: Dict[str, Any]) -> Tuple[int, int]:
+    # Sales, trades-out, resets and store reloads bump INV_REWRITES; catches, buys,
+    # hatches and trades-in only append. Nothing indexed (id, species, IVs) is edited
+    # in place; labels are rendered per response, so level-ups need no invalidation.
+    return (INV_REWRITES.get(uid, 0), len(u.get("inventory", [])))
+
+def inst_index(uid: str) -> InstanceIndex:
+    u = ensure_user(uid)
+    stamp = inst_index_stamp(uid, u)
+    hit = INST_INDEXES.get(uid)
+    if hit is not None:
+        INST_INDEXES.move_to_end(uid)
+        (rewrites, n), idx = hit
+        if hit[0] == stamp:
+            return idx
+        if rewrites == stamp[0] and stamp[1] > n:   # only appended to: fold the new tail in
+            idx.extend(u["inventory"][n:])
+            INST_INDEXES[uid] = (stamp, idx)
+            return idx
+    idx = InstanceIndex(u.get("inventory", []))
+    INST_INDEXES[uid] = (stamp, idx)
+    while len(INST_INDEXES) > INST_INDEX_MAX_USERS:
+        INST_INDEXES.popitem(last=False)
+    return idx
+
+@on_catalog_reload
+def _clear_autocomplete():
+    global TAC_TRIE
+    TAC_TRIE = None
+    INST_INDEXES.clear()
+
+async def ac_tac(inter: discord.Interaction, current: str) -> List[app_commands.Choice[str]]:
+    return [app_commands.Choice(name=tac_choice_label(k), value=k) for k in tac_matches(str(current or ""))[:AUTOCOMPLETE_MAX]]
+
+async def ac_boss_tier(inter: discord.Interaction, current: str) -> List[app_commands.Choice[str]]:
+    q = str(current or "").lower().strip()
+    return [app_commands.Choice(name=k, value=k) for k in BOSS_TIERS if k.startswith(q)][:AUTOCOMPLETE_MAX]
+
+async def ac_owned(inter: discord.Interaction, current: str) -> List[app_commands.Choice[int]]:
+    idx = inst_index(str(inter.user.id))
+    return [app_commands.Choice(name=inst_choice_label(idx.insts[i]), value=i) for i in idx.suggest(str(current or ""))]
+
 # ================= Commands: Help / List / Describe / Inventory / Inspect =================
 @dual("help", "Show Theta Arc commands")
 async def help_cmd(ctx_or_inter):
@@ -905,6 +2896,7 @@ async def help_cmd(ctx_or_inter):
         "__Catching & Spawns__\n"
         "• Post a **GIF**, say **theta** 3×/10s, **CAPS scream** (≥10 chars), or emoji-spam (spawns boss)\n"
         "• Click **Catch!** or post a GIF in 10s to capture (Lv 1–10, IV 80–100%, gender)\n"
+        "• `%spawn_pool` — This server's spawn odds (Manage Server: `regions <a, b|all>`, `weight <tac> <x>`, `reset`)\n"
         "\n"
         "__Astral (Lv cap 1024)__\n"
         "• `%astral_add <id> rest` / `/astral_add` — Rest to gain levels while you chat\n"
@@ -924,7 +2916,7 @@ async def help_cmd(ctx_or_inter):
         "• `%boss` / `/boss` — Show current boss\n"
         "• `%attack <id>` / `/attack <id>` — Attack boss\n"
         "• `%boss_status` / `/boss_status` — Debuffs/status\n"
-        "• `%boss_claim` / `/boss_claim` — Claim rewards\n"
+        "• `%boss_claim` / `/boss_claim` — Claim rewards • `%boss_autoclaim on|off` — Credit them automatically\n"
         "• `%summon_boss wilter` — Allow-list only (lordhank2 & legostarwarsd)\n"
         "\n"
         "__Parties & Raids__\n"
@@ -934,9 +2926,18 @@ async def help_cmd(ctx_or_inter):
         "__PvP (Friendly)__\n"
         "• `%pvp @user <the ID of your TAC that you are willing to take into battle>` — Send challenge\n"
         "• `%pvp_accept <challenge_id> <your_id>` • `%pvp_decline <challenge_id>`\n"
+        "• `%tournament open` • `%tournament join <id>` • `%tournament start [round_robin|bracket] [seed]` • `%tournament status`\n"
+        "\n"
+        "__Market__\n"
+        "• `%market_list <id> gold=..` • `%market_search tac=wilter iv=60-100 lvl=5-20 max=500 sort=iv page=2`\n"
+        "• `%market_buy <listing_id>` • `%market_cancel <listing_id>`\n"
+        "• `%auction_start <id> <min_gold> <30m|2h>` • `%auction_bid <auction_id> <gold>` • `%auction_list` • `%auction_cancel <auction_id>`\n"
+        "• `%history [@user] [page]` • `%provenance <id> [@user]`\n"
         "\n"
         "__Summon (TAC)__\n"
         "• `%summon <tac>` — Allow-list only (lordhank2 & legostarwarsd)\n"
+        "• `%metrics` — Runtime metrics, allow-list only\n"
+        "• `%reload_catalog` — Reload TAC.json & boss.json without a restart, allow-list only\n"
         "\n"
         "__Tips__\n"
         "• Gender shows as ♂️/♀️. IVs display with bars. Use `%inspect <id>` for details.\n"
@@ -962,31 +2963,28 @@ async def list_cmd(ctx_or_inter):
     else:
         await ctx_or_inter.send(msg)
 
-@dual("describe", "Describe a TAC (base stats)")
+@dual("describe", "Describe a TAC (base stats)", autocomplete={"tac": ac_tac})
 async def describe_cmd(ctx_or_inter, tac: str = ""):
     key = tac.lower().strip()
-    td = TAC_DATA.get(key)
-    if not td:
+    sp = CATALOG.get(key)
+    if not sp:
         txt = "❌ TAC not found."
         if isinstance(ctx_or_inter, discord.Interaction):
             return await ctx_or_inter.response.send_message(txt, ephemeral=True)
         return await ctx_or_inter.send(txt)
 
-    embed = discord.Embed(
-        title=td["name"], description=td["description"], color=discord.Color.blurple()
-    )
-    embed.add_field(name="Type", value=td["type"], inline=True)
-    embed.add_field(name="Region", value=td["region"], inline=True)
-    embed.add_field(name="Base Stats", value=format_stats(td["stats"]), inline=False)
-    embed.add_field(name="Egg Groups", value=", ".join(td["egg_groups"]), inline=True)
-    artist = td.get("artist", "@lordhank2")
-    embed.set_footer(text=f"Art by {artist}")
-    file = None
-    img = td.get("image_file", "")
-    if img and os.path.exists(img):
-        fn = os.path.basename(img)
-        file = discord.File(img, filename=fn)
-        embed.set_image(url=f"attachment://{fn}")
+    def build() -> discord.Embed:
+        embed = discord.Embed(
+            title=sp.name, description=sp.description, color=discord.Color.blurple()
+        )
+        embed.add_field(name="Type", value=sp.kind, inline=True)
+        embed.add_field(name="Region", value=sp.region, inline=True)
+        embed.add_field(name="Base Stats", value=sp.stats_text, inline=False)
+        embed.add_field(name="Egg Groups", value=sp.egg_text, inline=True)
+        embed.set_footer(text=f"Art by {sp.artist}")
+        return embed
+    embed = embed_from(embed_template("describe", key, build))
+    file = attach_image(embed, sp.image_file)
 
     if isinstance(ctx_or_inter, discord.Interaction):
         return await ctx_or_inter.response.send_message(embed=embed, file=file) if file else await ctx_or_inter.response.send_message(embed=embed)
@@ -1026,7 +3024,7 @@ async def inventory_cmd(ctx_or_inter, page: int = 1):
         await ctx_or_inter.send(msg)
 
 
-@dual("inspect", "Inspect an instance by ID (IVs, Astral state)")
+@dual("inspect", "Inspect an instance by ID (IVs, Astral state)", autocomplete={"id": ac_owned})
 async def inspect_cmd(ctx_or_inter, id: int = 0):
     uid = str(ctx_or_inter.user.id) if isinstance(ctx_or_inter, discord.Interaction) else str(ctx_or_inter.author.id)
     inst = get_instance(uid, int(id))
@@ -1036,11 +3034,13 @@ async def inspect_cmd(ctx_or_inter, id: int = 0):
             return await ctx_or_inter.response.send_message(txt, ephemeral=True)
         return await ctx_or_inter.send(txt)
 
-    tk = inst["tac"]; td = TAC_DATA.get(tk, {})
-    name = td.get("name", tk)
+    tk = inst["tac"]; sp = CATALOG.get(tk)
+    name = tac_name(tk)
     state = astral_state_for(uid, inst["id"])
 
-    embed = discord.Embed(title=f"{name}  •  #{inst['id']}", description=td.get("description", ""), color=discord.Color.gold())
+    embed = embed_from(embed_template("inspect", tk, lambda: discord.Embed(
+        description=sp.description if sp else "", color=discord.Color.gold()).set_footer(text=f"Art by {sp.artist if sp else '@lordhank2'}")))
+    embed.title = f"{name}  •  #{inst['id']}"
     embed.add_field(name="Level / Gender", value=f"Lv {inst['level']}  •  {gender_emoji(inst.get('gender'))}", inline=True)
     iv_avg_txt = f"{inst.get("iv_avg", 100.0):.2f}%"
     if abs(inst.get("iv_avg", 100.0) - 100.0) < 1e-6:
@@ -1051,13 +3051,7 @@ async def inspect_cmd(ctx_or_inter, id: int = 0):
     embed.add_field(name="IVs vs Base", value=format_instance_ivs(inst), inline=False)
     embed.add_field(name="IV Bars", value=format_iv_bars(inst), inline=False)
 
-    img = td.get("image_file", "")
-    file = None
-    if img and os.path.exists(img):
-        fn = os.path.basename(img)
-        file = discord.File(img, filename=fn)
-        embed.set_image(url=f"attachment://{fn}")
-    embed.set_footer(text=f"Art by {td.get('artist','@lordhank2')}")
+    file = attach_image(embed, sp.image_file if sp else "")
 
     if isinstance(ctx_or_inter, discord.Interaction):
         return await ctx_or_inter.response.send_message(embed=embed, file=file, ephemeral=True) if file else await ctx_or_inter.response.send_message(embed=embed, ephemeral=True)
@@ -1184,6 +3178,8 @@ async def clan_lb_cmd(ctx_or_inter):
 async def profile_cmd(ctx_or_inter, user: Optional[discord.Member] = None):
     # who are we showing
     target = user or (ctx_or_inter.user if isinstance(ctx_or_inter, discord.Interaction) else ctx_or_inter.author)
+    if ctx_or_inter.guild and not isinstance(target, discord.Member):
+        target = await get_member(ctx_or_inter.guild, target.id) or target
     uid = str(target.id)
 
     u = ensure_user(uid)
@@ -1242,18 +3238,15 @@ async def profile_cmd(ctx_or_inter, user: Optional[discord.Member] = None):
     top = stats["top"]
     if top:
         tk = top["tac"]
-        td = TAC_DATA.get(tk, {})
-        nm = td.get("name", tk)
+        sp = CATALOG.get(tk)
+        nm = tac_name(tk)
         ivavg = float(top.get("iv_avg", 100.0))
         g = gender_emoji(top.get("gender"))
         top_line = f"#{top['id']} {nm} {g} — Lv{top['level']}  •  IV {ivavg:.1f}%"
         embed.add_field(name="Top TAC", value=top_line, inline=False)
 
-        img = td.get("image_file", "")
-        if img and os.path.exists(img):
-            fn = os.path.basename(img)
-            file = discord.File(img, filename=fn)
-            embed.set_image(url=f"attachment://{fn}")
+        file = attach_image(embed, sp.image_file if sp else "", variant="thumb")
+        if file:
             # send with file
             if isinstance(ctx_or_inter, discord.Interaction):
                 return await ctx_or_inter.response.send_message(embed=embed, file=file, ephemeral=True)
@@ -1269,7 +3262,24 @@ async def profile_cmd(ctx_or_inter, user: Optional[discord.Member] = None):
 
 # ================= Trading (same as previous build, omitted for brevity comments only)
 PENDING_TRADES: Dict[int, Dict[str, Any]] = {}
-NEXT_TRADE_ID = 1
+TRADE_TTL = 60
+TRADE_LIVE_KEYS = ("message", "view")   # entry fields left out of the runtime snapshot
+
+def end_trade(trade_id: int) -> Optional[Dict[str, Any]]:
+    """Close an open trade (settled, declined or expired): drop its timer and view."""
+    TIMERS.cancel(("trade", trade_id))
+    trade = PENDING_TRADES.pop(trade_id, None)
+    if trade and trade.get("view"):
+        trade["view"].stop()
+    return trade
+
+async def expire_trade(trade_id: int):
+    trade = end_trade(trade_id)
+    if trade and trade.get("message"):
+        try:
+            await trade["message"].edit(content="⏳ Trade timed out.", view=None)
+        except Exception:
+            pass
 
 def parse_items(s: str) -> Tuple[List[int], Dict[str, int]]:
     ids: List[int] = []
@@ -1311,29 +3321,109 @@ def user_has_shards(uid: str, shards: Dict[str, int]) -> bool:
     cur = get_currency(uid)
     return all(cur.get(k, 0) >= shards.get(k, 0) for k in shards)
 
-def transfer_instances(src_uid: str, dst_uid: str, ids: List[int]):
-    for iid in ids:
-        inst = remove_instance(src_uid, iid)
-        if inst:
-            ensure_user(dst_uid)["inventory"].append(inst)
-
-def transfer_shards(src_uid: str, dst_uid: str, shards: Dict[str, int]):
-    subtract_currency(src_uid, shards)
-    add_currency(dst_uid, shards)
+# ---- Trade engine ----
+# execute_trade takes both users' locks in uid order (so two trades over the same
+# pair can't deadlock), validates and applies every leg against an undo journal,
+# and commits once through STORE.transaction. Any failing leg rolls all of them back.
+USER_LOCKS: "weakref.WeakValueDictionary[str, asyncio.Lock]" = weakref.WeakValueDictionary()
+
+class TradeError(Exception):
+    pass
+
+@asynccontextmanager
+async def user_locks(*uids: str):
+    """Hold the asyncio locks of several users, always acquired in sorted order."""
+    locks = []
+    for uid in sorted(set(uids)):
+        lock = USER_LOCKS.get(uid)
+        if lock is None:
+            lock = USER_LOCKS[uid] = asyncio.Lock()
+        locks.append(lock)
+    acquired = []
+    try:
+        for lock in locks:
+            await lock.acquire()
+            acquired.append(lock)
+        yield
+    finally:
+        for lock in reversed(acquired):
+            lock.release()
+
+def apply_trade(a_uid: str, b_uid: str, trade: Dict[str, Any]) -> Dict[str, List[int]]:
+    """
+    Move offer_* from A to B and want_* from B to A, all or nothing.
+    Received instances get fresh ids from the receiver. Returns {uid: [new ids]}.
+    """
+    if a_uid == b_uid:
+        raise TradeError("You can't trade with yourself.")
+    legs = ((a_uid, b_uid, trade["offer_ids"], trade["offer_shards"]),
+            (b_uid, a_uid, trade["want_ids"], trade["want_shards"]))
+    for src, _, ids, shards in legs:
+        if not user_has_instances(src, ids):
+            raise TradeError("Ownership changed; trade invalid.")
+        if any(astral_state_for(src, iid) for iid in ids):
+            raise TradeError("A traded TAC is in Astral; trade invalid.")
+        if any(auction_of(src, iid) for iid in ids):
+            raise TradeError("A traded TAC is up in auction; trade invalid.")
+        if not user_has_shards(src, shards):
+            raise TradeError("Shard balances changed; trade invalid.")
+
+    paid: List[Tuple[str, str, Dict[str, int]]] = []          # (src, dst, shards)
+    moved: List[Tuple[str, str, Dict[str, Any], int]] = []    # (src, dst, inst, id at src)
+    received: Dict[str, List[int]] = {a_uid: [], b_uid: []}
+    try:
+        for src, dst, ids, shards in legs:
+            if not subtract_currency(src, shards):
+                raise TradeError("Shard balances changed; trade invalid.")
+            add_currency(dst, shards)
+            paid.append((src, dst, shards))
+            for iid in ids:
+                inst = remove_instance(src, iid)
+                if inst is None:
+                    raise TradeError("Ownership changed; trade invalid.")
+                moved.append((src, dst, inst, iid))
+                du = ensure_user(dst)
+                inst["id"] = int(du["next_instance_id"]); du["next_instance_id"] = inst["id"] + 1
+                du["inventory"].append(inst)
+                received[dst].append(inst["id"])
+    except BaseException:
+        for src, dst, inst, iid in reversed(moved):
+            inventory_rewritten(src); inventory_rewritten(dst)
+            du = ensure_user(dst)
+            pos = next((i for i, x in enumerate(du["inventory"]) if x is inst), None)
+            if pos is not None:
+                du["inventory"].pop(pos)
+                du["next_instance_id"] = inst["id"]
+            inst["id"] = iid
+            ensure_user(src)["inventory"].append(inst)
+        for src, dst, shards in reversed(paid):
+            subtract_currency(dst, shards)
+            add_currency(src, shards)
+        raise
+    return received
+
+async def execute_trade(trade_id: int) -> Dict[str, List[int]]:
+    """Settle an open trade atomically and close it. Raises TradeError if it can't go through."""
+    trade = PENDING_TRADES.get(trade_id)
+    if not trade:
+        raise TradeError("Trade no longer exists.")
+    a_uid, b_uid = str(trade["author_id"]), str(trade["target_id"])
+    async with user_locks(a_uid, b_uid):
+        if PENDING_TRADES.get(trade_id) is not trade:
+            raise TradeError("Trade no longer exists.")   # settled or expired while we waited
+        async with STORE.transaction(USER_DB, [a_uid, b_uid]):
+            received = apply_trade(a_uid, b_uid, trade)
+        ledger_trade("trade", a_uid, b_uid, trade, received, trade=trade_id)
+        market_delist(a_uid, trade["offer_ids"])
+        market_delist(b_uid, trade["want_ids"])
+        end_trade(trade_id)
+    return received
 
 class TradeView(discord.ui.View):
     def __init__(self, trade_id: int):
-        super().__init__(timeout=60)
+        super().__init__(timeout=None)   # expiry is the ("trade", id) timer
         self.trade_id = trade_id
 
-    async def on_timeout(self):
-        trade = PENDING_TRADES.pop(self.trade_id, None)
-        if trade and trade.get("message"):
-            try:
-                await trade["message"].edit(content="⏳ Trade timed out.", view=None)
-            except Exception:
-                pass
-
     @discord.ui.button(label="Accept", style=discord.ButtonStyle.success)
     async def accept(self, interaction: discord.Interaction, button: discord.ui.Button):
         trade = PENDING_TRADES.get(self.trade_id)
@@ -1342,34 +3432,25 @@ class TradeView(discord.ui.View):
         if interaction.user.id != trade["target_id"]:
             return await interaction.response.send_message("Only the recipient can accept.", ephemeral=True)
 
-        a_uid = str(trade["author_id"])
-        b_uid = str(trade["target_id"])
-
-        if not user_has_instances(a_uid, trade["offer_ids"]) or not user_has_instances(b_uid, trade["want_ids"]):
-            return await interaction.response.send_message("Ownership changed; trade invalid.", ephemeral=True)
-        if not user_has_shards(a_uid, trade["offer_shards"]) or not user_has_shards(b_uid, trade["want_shards"]):
-            return await interaction.response.send_message("Shard balances changed; trade invalid.", ephemeral=True)
-
-        transfer_instances(a_uid, b_uid, trade["offer_ids"])
-        transfer_instances(b_uid, a_uid, trade["want_ids"])
-        transfer_shards(a_uid, b_uid, trade["offer_shards"])
-        transfer_shards(b_uid, a_uid, trade["want_shards"])
-        save_user_db()
-
-        PENDING_TRADES.pop(self.trade_id, None)
         try:
-            await trade["message"].edit(content="✅ Trade completed.", view=None)
+            received = await execute_trade(self.trade_id)
+        except TradeError as e:
+            return await interaction.response.send_message(str(e), ephemeral=True)
+        got = [f"<@{uid}> got " + ", ".join(f"#{i}" for i in ids) for uid, ids in received.items() if ids]
+        try:
+            await trade["message"].edit(content="✅ Trade completed." + (" " + "; ".join(got) + "." if got else ""), view=None)
         except Exception:
             pass
         await interaction.response.send_message("Trade accepted. ✅", ephemeral=True)
 
     @discord.ui.button(label="Decline", style=discord.ButtonStyle.danger)
     async def decline(self, interaction: discord.Interaction, button: discord.ui.Button):
-        trade = PENDING_TRADES.pop(self.trade_id, None)
+        trade = PENDING_TRADES.get(self.trade_id)
         if not trade:
             return await interaction.response.send_message("Trade no longer exists.", ephemeral=True)
         if interaction.user.id not in {trade["target_id"], trade["author_id"]}:
             return await interaction.response.send_message("You are not part of this trade.", ephemeral=True)
+        end_trade(self.trade_id)
         try:
             await trade["message"].edit(content="❌ Trade declined.", view=None)
         except Exception:
@@ -1388,13 +3469,12 @@ def pretty_ids(uid: str, ids: List[int]) -> str:
     for iid in ids:
         inst = get_instance(uid, iid)
         if inst:
-            nm = TAC_DATA.get(inst["tac"], {}).get("name", inst["tac"])
+            nm = tac_name(inst["tac"])
             names.append(f"#{iid} {nm}")
     return ", ".join(names) if names else "none"
 
 @dual("trade", "Offer a trade to a user (IDs and/or shards)")
 async def trade_cmd(ctx_or_inter, user: discord.Member = None, *, offer: str = "", want: str = ""):
-    global NEXT_TRADE_ID
     if isinstance(ctx_or_inter, discord.Interaction):
         author = ctx_or_inter.user
         channel = ctx_or_inter.channel
@@ -1404,7 +3484,7 @@ async def trade_cmd(ctx_or_inter, user: discord.Member = None, *, offer: str = "
         channel = ctx_or_inter.channel
         target = user
 
-    if not target or target.bot:
+    if not target or target.bot or target.id == author.id:
         msg = "❌ Pick a real user to trade with."
         if isinstance(ctx_or_inter, discord.Interaction):
             return await ctx_or_inter.response.send_message(msg, ephemeral=True)
@@ -1426,7 +3506,13 @@ async def trade_cmd(ctx_or_inter, user: discord.Member = None, *, offer: str = "
             return await ctx_or_inter.response.send_message(text, ephemeral=True)
         return await ctx_or_inter.send(text)
 
-    trade_id = NEXT_TRADE_ID; NEXT_TRADE_ID += 1
+    if any(auction_of(a_uid, i) for i in offer_ids) or any(auction_of(b_uid, i) for i in want_ids):
+        text = "❌ A TAC in this trade is up in auction."
+        if isinstance(ctx_or_inter, discord.Interaction):
+            return await ctx_or_inter.response.send_message(text, ephemeral=True)
+        return await ctx_or_inter.send(text)
+
+    trade_id = await STORE.next_id("trade")
     entry = {
         "trade_id": trade_id,
         "author_id": author.id,
@@ -1435,6 +3521,8 @@ async def trade_cmd(ctx_or_inter, user: discord.Member = None, *, offer: str = "
         "offer_shards": offer_shards,
         "want_ids": want_ids,
         "want_shards": want_shards,
+        "channel_id": channel.id,
+        "expires_at": time.time() + TRADE_TTL,
         "message": None
     }
     PENDING_TRADES[trade_id] = entry
@@ -1447,19 +3535,21 @@ async def trade_cmd(ctx_or_inter, user: discord.Member = None, *, offer: str = "
                     inline=False)
     want_text = (pretty_ids(b_uid, want_ids) + " | " + pretty_shards(want_shards)) if (want_ids or any(want_shards.values())) else "—"
     embed.add_field(name="They Want from You", value=want_text, inline=False)
-    embed.set_footer(text="Only the recipient can Accept. Expires in 60s.")
+    embed.set_footer(text=f"Only the recipient can Accept. Expires in {TRADE_TTL}s.")
 
     view = TradeView(trade_id)
+    entry["view"] = view
     if isinstance(ctx_or_inter, discord.Interaction):
         msg = await channel.send(content=target.mention, embed=embed, view=view)
-        entry["message"] = msg
+        entry["message"] = msg; entry["message_id"] = msg.id
         await ctx_or_inter.response.send_message("Trade sent.", ephemeral=True)
     else:
         msg = await channel.send(content=target.mention, embed=embed, view=view)
-        entry["message"] = msg
+        entry["message"] = msg; entry["message_id"] = msg.id
+    TIMERS.schedule(("trade", trade_id), TRADE_TTL, lambda: expire_trade(trade_id))
 
 # ================= Buy / Sell / Balance =================
-@dual("sell", "Sell one TAC instance for shards")
+@dual("sell", "Sell one TAC instance for shards", autocomplete={"id": ac_owned})
 async def sell_cmd(ctx_or_inter, id: int = 0):
     uid = str(ctx_or_inter.user.id) if isinstance(ctx_or_inter, discord.Interaction) else str(ctx_or_inter.author.id)
     inst = get_instance(uid, int(id))
@@ -1468,34 +3558,41 @@ async def sell_cmd(ctx_or_inter, id: int = 0):
         if isinstance(ctx_or_inter, discord.Interaction):
             return await ctx_or_inter.response.send_message(txt, ephemeral=True)
         return await ctx_or_inter.send(txt)
-    tac = TAC_DATA.get(inst["tac"], {})
-    val = tac.get("value")
+    sp = CATALOG.get(inst["tac"])
+    val = sp.value if sp else None
     if not val:
         txt = "❌ This TAC has no sell value."
         if isinstance(ctx_or_inter, discord.Interaction):
             return await ctx_or_inter.response.send_message(txt, ephemeral=True)
         return await ctx_or_inter.send(txt)
+    if auction_of(uid, inst["id"]):
+        txt = f"❌ That TAC is up in auction `#{auction_of(uid, inst['id'])}`."
+        if isinstance(ctx_or_inter, discord.Interaction):
+            return await ctx_or_inter.response.send_message(txt, ephemeral=True)
+        return await ctx_or_inter.send(txt)
     remove_instance(uid, inst["id"])
     add_currency(uid, val)
     save_user_db()
+    market_delist(uid, [inst["id"]])
+    LEDGER.record("sell", d={uid: shard_delta(val)}, r=[[uid, inst["id"], inst["tac"]]])
     pretty = ", ".join([f"{v} {k}" for k, v in val.items()])
-    out = f"💰 Sold #{inst['id']} {tac.get('name', inst['tac'])} for {pretty}."
+    out = f"💰 Sold #{inst['id']} {tac_name(inst['tac'])} for {pretty}."
     if isinstance(ctx_or_inter, discord.Interaction):
         await ctx_or_inter.response.send_message(out, ephemeral=True)
     else:
         await ctx_or_inter.send(out)
 
-@dual("buy", "Buy a TAC for shards")
+@dual("buy", "Buy a TAC for shards", autocomplete={"tac": ac_tac})
 async def buy_cmd(ctx_or_inter, tac: str = ""):
     key = tac.lower().strip()
-    td = TAC_DATA.get(key)
-    if not td or "value" not in td:
+    sp = CATALOG.get(key)
+    if not sp or not sp.value:
         txt = "❌ Invalid TAC or no cost set."
         if isinstance(ctx_or_inter, discord.Interaction):
             return await ctx_or_inter.response.send_message(txt, ephemeral=True)
         return await ctx_or_inter.send(txt)
     uid = str(ctx_or_inter.user.id) if isinstance(ctx_or_inter, discord.Interaction) else str(ctx_or_inter.author.id)
-    if not subtract_currency(uid, td["value"]):
+    if not subtract_currency(uid, sp.value):
         txt = "❌ Not enough shards."
         if isinstance(ctx_or_inter, discord.Interaction):
             return await ctx_or_inter.response.send_message(txt, ephemeral=True)
@@ -1504,8 +3601,9 @@ async def buy_cmd(ctx_or_inter, tac: str = ""):
     gender = random.choice(["M", "F"])
     iid = new_instance(uid, key, level, gender)
     save_user_db()
-    pretty = ", ".join([f"{v} {k}" for k, v in td["value"].items()])
-    out = f"✅ Bought **{td['name']}** for {pretty}. (#{iid}, Lv {level}, {gender}, IV {get_instance(uid, iid).get('iv_avg', 100.0):.1f}%)"
+    LEDGER.record("buy", d={uid: shard_delta(sp.value, -1)}, n=[[uid, iid, key]])
+    pretty = ", ".join([f"{v} {k}" for k, v in sp.value.items()])
+    out = f"✅ Bought **{sp.name}** for {pretty}. (#{iid}, Lv {level}, {gender}, IV {get_instance(uid, iid).get('iv_avg', 100.0):.1f}%)"
     if isinstance(ctx_or_inter, discord.Interaction):
         await ctx_or_inter.response.send_message(out, ephemeral=True)
     else:
@@ -1521,13 +3619,506 @@ async def balance_cmd(ctx_or_inter):
     else:
         await ctx_or_inter.send(out)
 
+# ================= Marketplace =================
+# Listings are indexed per species twice: by (price, -iv, id) and by (-iv, price, id).
+# A search walks only the matching species' list (or a lazy merge of all of them)
+# in the requested order and stops as soon as the price/IV bound is passed, so a
+# page costs roughly page size, not listing count. Purchases go through the trade
+# engine (user_locks + apply_trade) as a one-sided trade.
+MARKET_PAGE_SIZE = 10
+MARKET_MAX_PER_USER = 25
+MARKET: Dict[int, Dict[str, Any]] = {}                          # listing_id -> listing
+MARKET_INST: Dict[Tuple[str, int], int] = {}                    # (seller, instance id) -> listing_id
+MARKET_BY_PRICE: Dict[str, List[Tuple[int, float, int]]] = {}   # tac -> sorted (price, -iv, id)
+MARKET_BY_IV: Dict[str, List[Tuple[float, int, int]]] = {}      # tac -> sorted (-iv, price, id)
+
+def price_value(price: Dict[str, int]) -> int:
+    """Shard price in gold-equivalents (same weights as the networth leaderboard)."""
+    return int(price.get("gold_shards", 0)) + int(price.get("diamond_shards", 0)) * 20 + int(price.get("enchanted_shards", 0)) * 50
+
+def market_add(listing: Dict[str, Any], persist: bool = True):
+    lid = listing["id"]
+    MARKET[lid] = listing
+    MARKET_INST[(listing["seller"], listing["inst_id"])] = lid
+    bisect.insort(MARKET_BY_PRICE.setdefault(listing["tac"], []), (listing["value"], -listing["iv"], lid))
+    bisect.insort(MARKET_BY_IV.setdefault(listing["tac"], []), (-listing["iv"], listing["value"], lid))
+    if persist:
+        STORE.kv_put("market", str(lid), listing)
+
+def market_remove(lid: int) -> Optional[Dict[str, Any]]:
+    listing = MARKET.pop(lid, None)
+    if not listing:
+        return None
+    MARKET_INST.pop((listing["seller"], listing["inst_id"]), None)
+    for index, row in ((MARKET_BY_PRICE, (listing["value"], -listing["iv"], lid)),
+                       (MARKET_BY_IV, (-listing["iv"], listing["value"], lid))):
+        rows = index.get(listing["tac"], [])
+        i = bisect.bisect_left(rows, row)
+        if i < len(rows) and rows[i] == row:
+            rows.pop(i)
+        if not rows:
+            index.pop(listing["tac"], None)
+    STORE.kv_delete("market", str(lid))
+    return listing
+
+def market_delist(uid: str, inst_ids) -> int:
+    """Drop the listings of instances that just left `uid` (sold, traded away, reset)."""
+    n = 0
+    for iid in inst_ids:
+        lid = MARKET_INST.get((uid, iid))
+        if lid is not None and market_remove(lid):
+            n += 1
+    return n
+
+def market_search(tac: str = "", iv_min: float = 0.0, iv_max: float = 100.0, lv_min: int = 0, lv_max: int = 0,
+                  max_price: int = 0, sort: str = "price", offset: int = 0,
+                  limit: int = MARKET_PAGE_SIZE) -> Tuple[List[Dict[str, Any]], bool]:
+    """Return (listings for this page, whether there are more)."""
+    by_iv = sort == "iv"
+    index = MARKET_BY_IV if by_iv else MARKET_BY_PRICE
+    lists = [index.get(tac, [])] if tac else list(index.values())
+    if by_iv:   # jump straight to the first row at or below iv_max
+        lists = [map(lst.__getitem__, range(bisect.bisect_left(lst, (-iv_max, -1, -1)), len(lst))) for lst in lists]
+    rows = heapq.merge(*lists) if len(lists) > 1 else iter(lists[0] if lists else [])
+    out: List[Dict[str, Any]] = []
+    want = offset + limit + 1
+    n = 0
+    for row in rows:
+        price, neg_iv = (row[1], row[0]) if by_iv else (row[0], row[1])
+        if by_iv and -neg_iv < iv_min:
+            break
+        if not by_iv and max_price and price > max_price:
+            break
+        if -neg_iv > iv_max or -neg_iv < iv_min or (max_price and price > max_price):
+            continue
+        listing = MARKET[row[2]]
+        if listing["level"] < lv_min or (lv_max and listing["level"] > lv_max):
+            continue
+        n += 1
+        if n > offset:
+            out.append(listing)
+        if n >= want:
+            break
+    return out[:limit], len(out) > limit
+
+def parse_market_query(q: str) -> Dict[str, Any]:
+    """`tac=wilter iv=60-100 lvl=5-20 max=500 sort=iv page=2` (a bare word is the species; `iv=60` means 60+)."""
+    def span(v: str, lo, hi, cast):
+        a, _, b = v.partition("-")
+        return (cast(a) if a else lo), (cast(b) if b else hi)
+    out: Dict[str, Any] = {"tac": "", "iv_min": 0.0, "iv_max": 100.0, "lv_min": 0, "lv_max": 0,
+                           "max_price": 0, "sort": "price", "page": 1}
+    for tok in q.replace(",", " ").split():
+        k, eq, v = tok.partition("=")
+        k = k.lower()
+        try:
+            if not eq:
+                out["tac"] = k
+            elif k in ("tac", "species"):
+                out["tac"] = v.lower()
+            elif k == "iv":
+                out["iv_min"], out["iv_max"] = span(v, 0.0, 100.0, float)
+            elif k in ("lvl", "level", "lv"):
+                out["lv_min"], out["lv_max"] = span(v, 0, 0, int)
+            elif k in ("max", "price", "max_price"):
+                out["max_price"] = int(v)
+            elif k == "sort" and v.lower() in ("price", "iv"):
+                out["sort"] = v.lower()
+            elif k == "page":
+                out["page"] = max(1, int(v))
+        except ValueError:
+            pass
+    return out
+
+def listing_line(l: Dict[str, Any]) -> str:
+    nm = tac_name(l["tac"])
+    return (f"`#{l['id']}` **{nm}** Lv {l['level']} • IV {l['iv']:.1f}% • "
+            f"{pretty_shards(l['price'])} • <@{l['seller']}>")
+
+@dual("market_list", "List one of your TACs on the market", autocomplete={"id": ac_owned})
+async def market_list_cmd(ctx_or_inter, id: int = 0, *, price: str = ""):
+    is_slash = isinstance(ctx_or_inter, discord.Interaction)
+    user = ctx_or_inter.user if is_slash else ctx_or_inter.author
+    uid = str(user.id)
+
+    async def reply(txt: str, ephemeral: bool = True):
+        if is_slash: return await ctx_or_inter.response.send_message(txt, ephemeral=ephemeral)
+        return await ctx_or_inter.send(txt)
+
+    _, shards = parse_items(price)
+    shards = {k: v for k, v in shards.items() if v}
+    inst = get_instance(uid, int(id))
+    if not inst or not shards:
+        return await reply("Usage: `%market_list <id> gold=.. diamond=.. enchanted=..`")
+    if astral_state_for(uid, inst["id"]):
+        return await reply("❌ That TAC is in Astral.")
+    if (uid, inst["id"]) in MARKET_INST:
+        return await reply(f"Already listed as `#{MARKET_INST[(uid, inst['id'])]}`.")
+    if auction_of(uid, inst["id"]):
+        return await reply(f"❌ That TAC is up in auction `#{auction_of(uid, inst['id'])}`.")
+    if sum(1 for (s_uid, _) in MARKET_INST if s_uid == uid) >= MARKET_MAX_PER_USER:
+        return await reply(f"You can have at most {MARKET_MAX_PER_USER} listings.")
+    listing = {"id": await STORE.next_id("listing"), "seller": uid, "inst_id": inst["id"], "tac": inst["tac"],
+               "level": int(inst.get("level", 1)), "iv": float(inst.get("iv_avg", 100.0)),
+               "price": shards, "value": price_value(shards), "listed_at": int(time.time())}
+    market_add(listing)
+    await reply("🏷️ Listed " + listing_line(listing) + f"\nCancel with `%market_cancel {listing['id']}`.", ephemeral=False)
+
+@dual("market_search", "Search the market, e.g. tac=wilter iv=60-100 lvl=5-20 max=500 sort=iv page=2")
+async def market_search_cmd(ctx_or_inter, *, query: str = ""):
+    q = parse_market_query(query)
+    page = q.pop("page")
+    t0 = time.perf_counter()
+    rows, more = market_search(**q, offset=(page - 1) * MARKET_PAGE_SIZE)
+    ms = (time.perf_counter() - t0) * 1000
+    if rows:
+        out = "\n".join(listing_line(l) for l in rows)
+        out += f"\n-# page {page}{' • more: add page=' + str(page + 1) if more else ''} • {len(MARKET):,} listings • {ms:.1f} ms"
+    else:
+        out = "No listings match." + (f" ({len(MARKET):,} listings)" if MARKET else "")
+    if isinstance(ctx_or_inter, discord.Interaction): await ctx_or_inter.response.send_message(out, ephemeral=True)
+    else: await ctx_or_inter.send(out)
+
+@dual("market_buy", "Buy a market listing")
+async def market_buy_cmd(ctx_or_inter, listing_id: int = 0):
+    is_slash = isinstance(ctx_or_inter, discord.Interaction)
+    user = ctx_or_inter.user if is_slash else ctx_or_inter.author
+    buyer = str(user.id)
+
+    async def reply(txt: str, ephemeral: bool = True):
+        if is_slash: return await ctx_or_inter.response.send_message(txt, ephemeral=ephemeral)
+        return await ctx_or_inter.send(txt)
+
+    listing = MARKET.get(int(listing_id))
+    if not listing:
+        return await reply("❌ Listing not found.")
+    seller = listing["seller"]
+    if seller == buyer:
+        return await reply("That's your own listing. Use `%market_cancel`.")
+    async with user_locks(seller, buyer):
+        if MARKET.get(listing["id"]) is not listing:
+            return await reply("❌ Someone else bought it first.")
+        sale = {"offer_ids": [listing["inst_id"]], "offer_shards": {},
+                "want_ids": [], "want_shards": listing["price"]}
+        try:
+            async with STORE.transaction(USER_DB, [seller, buyer]):
+                received = apply_trade(seller, buyer, sale)
+        except TradeError as e:
+            if "Shard" in str(e) and user_has_instances(seller, [listing["inst_id"]]):
+                return await reply("❌ Not enough shards.")
+            market_remove(listing["id"])   # seller no longer has it (sold/traded/Astral)
+            return await reply("❌ That listing is no longer valid and was removed.")
+        market_remove(listing["id"])
+        ledger_trade("market", seller, buyer, sale, received, listing=listing["id"])
+    nm = tac_name(listing["tac"])
+    await reply(f"✅ {user.mention} bought **{nm}** (now your #{received[buyer][0]}) from <@{seller}> "
+                f"for {pretty_shards(listing['price'])}.", ephemeral=False)
+
+@dual("market_cancel", "Take one of your listings off the market")
+async def market_cancel_cmd(ctx_or_inter, listing_id: int = 0):
+    user = ctx_or_inter.user if isinstance(ctx_or_inter, discord.Interaction) else ctx_or_inter.author
+    listing = MARKET.get(int(listing_id))
+    if not listing or listing["seller"] != str(user.id):
+        txt = "❌ No such listing of yours."
+    else:
+        market_remove(listing["id"])
+        txt = f"Listing `#{listing['id']}` removed."
+    if isinstance(ctx_or_inter, discord.Interaction): await ctx_or_inter.response.send_message(txt, ephemeral=True)
+    else: await ctx_or_inter.send(txt)
+
+# ================= Auction House =================
+# Bids are in gold shards and escrowed the moment they're placed. Every auction's
+# end is an ("auction", id) entry on TIMERS, so idle auctions cost one heap row.
+# Outbid escrow goes into AUCTION_REFUNDS and is paid back in one batched write
+# every AUCTION_REFUND_BATCH_SEC. Auctions and unpaid refunds live in the store.
+AUCTION_MIN_SEC = 60
+AUCTION_MAX_SEC = 24 * 3600
+AUCTION_SNIPE_SEC = 30          # a bid in the last 30s pushes the end back to 30s
+AUCTION_MIN_RAISE = 0.05        # each bid beats the last by 5% (at least 1)
+AUCTION_REFUND_BATCH_SEC = 5
+AUCTIONS: Dict[int, Dict[str, Any]] = {}
+AUCTION_INST: Dict[Tuple[str, int], int] = {}    # (seller, instance id) -> auction_id
+AUCTION_REFUNDS: Dict[str, int] = {}   # uid -> gold waiting to be paid back
+
+def auction_of(uid: str, inst_id: int) -> Optional[int]:
+    """The auction an instance is up in. Until it settles the instance can't be sold,
+    traded, listed or sent to Astral."""
+    return AUCTION_INST.get((uid, int(inst_id)))
+
+def auction_add(a: Dict[str, Any], persist: bool = True):
+    AUCTIONS[a["id"]] = a
+    AUCTION_INST[(a["seller"], a["inst_id"])] = a["id"]
+    if persist:
+        STORE.kv_put("auctions", str(a["id"]), a)
+    schedule_auction(a)
+
+def auction_remove(aid: int) -> Optional[Dict[str, Any]]:
+    a = AUCTIONS.pop(aid, None)
+    if a:
+        AUCTION_INST.pop((a["seller"], a["inst_id"]), None)
+        TIMERS.cancel(("auction", aid))
+        STORE.kv_delete("auctions", str(aid))
+    return a
+
+def persist_auction(aid: int):
+    a = AUCTIONS.get(aid)
+    if a:
+        STORE.kv_put("auctions", str(aid), a)
+    else:
+        STORE.kv_delete("auctions", str(aid))
+
+def queue_refund(uid: str, gold: int):
+    if gold <= 0:
+        return
+    AUCTION_REFUNDS[uid] = AUCTION_REFUNDS.get(uid, 0) + gold
+    STORE.kv_put("auction_refunds", "pending", AUCTION_REFUNDS)
+    if TIMERS.remaining(("auction_refunds",)) is None:
+        TIMERS.schedule(("auction_refunds",), AUCTION_REFUND_BATCH_SEC, flush_refunds)
+
+async def flush_refunds():
+    if not AUCTION_REFUNDS:
+        return
+    batch = dict(AUCTION_REFUNDS)
+    async with STORE.transaction(USER_DB, list(batch)):
+        for uid, gold in batch.items():
+            add_currency(uid, {"gold_shards": gold})
+        AUCTION_REFUNDS.clear()
+        STORE.kv_delete("auction_refunds", "pending")
+    LEDGER.record("refund", d={uid: {"gold_shards": gold} for uid, gold in batch.items()})
+
+def auction_min_bid(a: Dict[str, Any]) -> int:
+    if not a.get("top_bidder"):
+        return a["min"]
+    return a["top"] + max(1, int(a["top"] * AUCTION_MIN_RAISE))
+
+def schedule_auction(a: Dict[str, Any]):
+    TIMERS.schedule(("auction", a["id"]), a["ends_at"] - time.time(), lambda aid=a["id"]: settle_auction(aid))
+
+async def settle_auction(aid: int):
+    a = AUCTIONS.get(aid)
+    if not a:
+        return
+    seller, bidder = a["seller"], a.get("top_bidder")
+    nm = tac_name(a["tac"])
+    async with user_locks(seller, *([bidder] if bidder else [])):
+        auction_remove(aid)
+        if not bidder:
+            outcome = f"🔨 Auction `#{aid}` ({nm}) ended with no bids."
+        else:
+            try:
+                async with STORE.transaction(USER_DB, [seller, bidder]):
+                    received = apply_trade(seller, bidder, {"offer_ids": [a["inst_id"]], "offer_shards": {},
+                                                            "want_ids": [], "want_shards": {}})
+                    add_currency(seller, {"gold_shards": a["top"]})   # release escrow to the seller
+                LEDGER.record("auction", d={seller: {"gold_shards": a["top"]}}, u=[bidder],
+                              m=[[seller, a["inst_id"], bidder, received[bidder][0], a["tac"]]], x={"auction": aid})
+                outcome = (f"🔨 Auction `#{aid}`: <@{bidder}> won **{nm}** (now their #{received[bidder][0]}) "
+                           f"from <@{seller}> for {a['top']:,} gold.")
+            except TradeError:
+                queue_refund(bidder, a["top"])
+                outcome = f"🔨 Auction `#{aid}` ({nm}) was voided: the seller no longer has it. <@{bidder}> is refunded."
+    ch = bot.get_channel(a["channel_id"])
+    if ch:
+        queue_line(ch, outcome)
+
+def parse_duration(s: str) -> int:
+    """`90s`, `15m`, `2h`; a bare number is minutes."""
+    m = re.fullmatch(r"(\d+)\s*([smh]?)", s.strip().lower())
+    if not m:
+        return 0
+    return int(m.group(1)) * {"s": 1, "m": 60, "h": 3600, "": 60}[m.group(2)]
+
+@dual("auction_start", "Auction one of your TACs: id, minimum gold, duration (e.g. 30m, 2h)", autocomplete={"id": ac_owned})
+async def auction_start_cmd(ctx_or_inter, id: int = 0, minimum: int = 0, duration: str = "1h"):
+    is_slash = isinstance(ctx_or_inter, discord.Interaction)
+    user = ctx_or_inter.user if is_slash else ctx_or_inter.author
+    uid = str(user.id)
+
+    async def reply(txt: str, ephemeral: bool = True):
+        if is_slash: return await ctx_or_inter.response.send_message(txt, ephemeral=ephemeral)
+        return await ctx_or_inter.send(txt)
+
+    inst = get_instance(uid, int(id))
+    secs = parse_duration(duration)
+    if not inst or minimum < 1 or not secs:
+        return await reply("Usage: `%auction_start <id> <min_gold> <duration: 30m / 2h>`")
+    if not AUCTION_MIN_SEC <= secs <= AUCTION_MAX_SEC:
+        return await reply("Duration must be between 1 minute and 24 hours.")
+    if astral_state_for(uid, inst["id"]):
+        return await reply("❌ That TAC is in Astral.")
+    if (uid, inst["id"]) in MARKET_INST or (uid, inst["id"]) in AUCTION_INST:
+        return await reply("❌ That TAC is already on the market or in an auction.")
+    aid = await STORE.next_id("auction")
+    a = {"id": aid, "seller": uid, "inst_id": inst["id"], "tac": inst["tac"], "level": int(inst.get("level", 1)),
+         "iv": float(inst.get("iv_avg", 100.0)), "min": int(minimum), "top": 0, "top_bidder": None, "bids": 0,
+         "ends_at": time.time() + secs, "channel_id": ctx_or_inter.channel.id}
+    auction_add(a)
+    nm = tac_name(a["tac"])
+    await reply(f"🔨 Auction `#{aid}`: **{nm}** Lv {a['level']} (IV {a['iv']:.1f}%) from {user.mention}, "
+                f"starting at {a['min']:,} gold, ends <t:{int(a['ends_at'])}:R>. Bid with `%auction_bid {aid} <gold>`.",
+                ephemeral=False)
+
+@dual("auction_bid", "Bid gold on an auction (escrowed until you're outbid)")
+async def auction_bid_cmd(ctx_or_inter, auction_id: int = 0, amount: int = 0):
+    is_slash = isinstance(ctx_or_inter, discord.Interaction)
+    user = ctx_or_inter.user if is_slash else ctx_or_inter.author
+    uid = str(user.id)
+
+    async def reply(txt: str, ephemeral: bool = True):
+        if is_slash: return await ctx_or_inter.response.send_message(txt, ephemeral=ephemeral)
+        return await ctx_or_inter.send(txt)
+
+    a = AUCTIONS.get(int(auction_id))
+    if not a or a["ends_at"] <= time.time():
+        return await reply("❌ No such running auction.")
+    if a["seller"] == uid:
+        return await reply("You can't bid on your own auction.")
+    need = auction_min_bid(a)
+    if amount < need:
+        return await reply(f"Minimum bid is {need:,} gold.")
+    async with user_locks(uid):
+        before = {k: a[k] for k in ("top_bidder", "top", "bids", "ends_at")}
+        prev_bidder, prev_top = a["top_bidder"], a["top"]
+        # raising your own bid only escrows the difference
+        charge = amount - prev_top if prev_bidder == uid else amount
+        err, refunds_before = None, None
+        try:
+            # escrow debit, the new top bid and the outbid refund commit together, or none do
+            async with STORE.transaction(USER_DB, [uid]):
+                if AUCTIONS.get(a["id"]) is not a or amount < auction_min_bid(a) or a["top"] != prev_top:
+                    err = "❌ Outbid while you were bidding, try again."
+                elif not subtract_currency(uid, {"gold_shards": charge}):
+                    err = "❌ Not enough gold."
+                else:
+                    a["top_bidder"], a["top"] = uid, amount
+                    a["bids"] += 1
+                    if a["ends_at"] - time.time() < AUCTION_SNIPE_SEC:
+                        a["ends_at"] = time.time() + AUCTION_SNIPE_SEC
+                    persist_auction(a["id"])
+                    if prev_bidder and prev_bidder != uid:
+                        refunds_before = dict(AUCTION_REFUNDS)
+                        queue_refund(prev_bidder, prev_top)
+        except BaseException:
+            a.update(before)
+            if refunds_before is not None:
+                AUCTION_REFUNDS.clear()
+                AUCTION_REFUNDS.update(refunds_before)
+            raise
+        if err:
+            return await reply(err)
+        LEDGER.record("bid", d={uid: {"gold_shards": -charge}}, x={"auction": a["id"]})
+        if a["ends_at"] != before["ends_at"]:
+            schedule_auction(a)
+    await reply(f"💰 {user.mention} bids **{amount:,}** gold on auction `#{a['id']}` "
+                f"(ends <t:{int(a['ends_at'])}:R>).", ephemeral=False)
+
+@dual("auction_list", "Running auctions, ending soonest first")
+async def auction_list_cmd(ctx_or_inter, page: int = 1):
+    page = max(1, int(page))
+    rows = heapq.nsmallest(page * MARKET_PAGE_SIZE, AUCTIONS.values(), key=lambda a: a["ends_at"])[(page - 1) * MARKET_PAGE_SIZE:]
+    if rows:
+        out = "\n".join(
+            f"`#{a['id']}` **{tac_name(a['tac'])}** Lv {a['level']} • IV {a['iv']:.1f}% • "
+            + (f"top {a['top']:,} gold ({a['bids']} bid{'s' if a['bids'] != 1 else ''})" if a["top_bidder"] else f"min {a['min']:,} gold")
+            + f" • ends <t:{int(a['ends_at'])}:R>"
+            for a in rows)
+        out += f"\n-# page {page} • {len(AUCTIONS):,} running"
+    else:
+        out = "No running auctions." if page == 1 else "No more auctions."
+    if isinstance(ctx_or_inter, discord.Interaction): await ctx_or_inter.response.send_message(out, ephemeral=True)
+    else: await ctx_or_inter.send(out)
+
+@dual("auction_cancel", "Cancel your auction (only before the first bid)")
+async def auction_cancel_cmd(ctx_or_inter, auction_id: int = 0):
+    user = ctx_or_inter.user if isinstance(ctx_or_inter, discord.Interaction) else ctx_or_inter.author
+    a = AUCTIONS.get(int(auction_id))
+    if not a or a["seller"] != str(user.id):
+        txt = "❌ No such auction of yours."
+    elif a["top_bidder"]:
+        txt = "❌ Someone already bid; the auction has to run out."
+    else:
+        auction_remove(a["id"])
+        txt = f"Auction `#{a['id']}` cancelled."
+    if isinstance(ctx_or_inter, discord.Interaction): await ctx_or_inter.response.send_message(txt, ephemeral=True)
+    else: await ctx_or_inter.send(txt)
+
+# ================= Economy history =================
+LEDGER_ICONS = {"catch": "🎣", "hatch": "🥚", "buy": "🛒", "sell": "💰", "trade": "🤝", "market": "🏪",
+                "auction": "🔨", "bid": "🔨", "refund": "🔨", "boss": "🐉", "boss_claim": "🐉", "reset": "♻️"}
+HISTORY_PAGE_SIZE = 10
+PROVENANCE_MAX_LINES = 20
+
+def _fmt_delta(d: Dict[str, int]) -> str:
+    return ", ".join(f"{v:+,} {k.split('_')[0]}" for k, v in d.items())
+
+def ledger_line(rec: Dict[str, Any], uid: Optional[str] = None) -> str:
+    """One history line, worded from `uid`'s side (or neutrally for provenance)."""
+    nm = lambda tk: tac_name(tk) if tk else "?"
+    parts = []
+    for u, iid, tk in rec.get("n", []):
+        if uid in (None, u): parts.append(f"+ {nm(tk)} #{iid}" + ("" if uid else f" for <@{u}>"))
+    for u, iid, tk in rec.get("r", []):
+        if uid in (None, u): parts.append(f"- {nm(tk)} #{iid}" + ("" if uid else f" by <@{u}>"))
+    for src, sid, dst, did, tk in rec.get("m", []):
+        if uid == src: parts.append(f"gave {nm(tk)} #{sid} to <@{dst}>")
+        elif uid == dst: parts.append(f"got {nm(tk)} #{did} from <@{src}>")
+        elif uid is None: parts.append(f"{nm(tk)} <@{src}> #{sid} → <@{dst}> #{did}")
+    d = rec.get("d", {})
+    if uid is not None and d.get(uid):
+        parts.append(_fmt_delta(d[uid]))
+    elif uid is None and len(d) <= 2:
+        parts += [f"<@{u}> {_fmt_delta(v)}" for u, v in d.items() if v]
+    for k, v in rec.get("x", {}).items():
+        parts.append(str(v) if k == "boss" else f"{k} #{v}")
+    return f"<t:{rec['t']}:R> {LEDGER_ICONS.get(rec['k'], '•')} {rec['k']}" + (" • " + " • ".join(parts) if parts else "")
+
+@dual("history", "Recent shard and TAC movements for you (or another user)")
+async def history_cmd(ctx_or_inter, user: discord.Member = None, page: int = 1):
+    is_slash = isinstance(ctx_or_inter, discord.Interaction)
+    me = ctx_or_inter.user if is_slash else ctx_or_inter.author
+    who = user or me
+    page = max(1, int(page))
+    recs, more = LEDGER.history(str(who.id), (page - 1) * HISTORY_PAGE_SIZE, HISTORY_PAGE_SIZE)
+    if recs:
+        out = f"📜 **History of {who.display_name}** (page {page})\n" + "\n".join(ledger_line(r, str(who.id)) for r in recs)
+        if more:
+            out += f"\n-# more: `%history {'@' + who.display_name + ' ' if user else ''}{page + 1}`"
+    else:
+        out = "No history yet." if page == 1 else "No more history."
+    for c in _chunk_text(out):
+        if is_slash:
+            if not ctx_or_inter.response.is_done(): await ctx_or_inter.response.send_message(c, ephemeral=True)
+            else: await ctx_or_inter.followup.send(c, ephemeral=True)
+        else:
+            await ctx_or_inter.send(c)
+
+@dual("provenance", "Trace an instance back through its owners to where it came from")
+async def provenance_cmd(ctx_or_inter, instance_id: int = 0, user: discord.Member = None):
+    is_slash = isinstance(ctx_or_inter, discord.Interaction)
+    who = user or (ctx_or_inter.user if is_slash else ctx_or_inter.author)
+    chain = LEDGER.provenance(str(who.id), int(instance_id))
+    if not chain:
+        out = f"No recorded history for <@{who.id}>'s #{int(instance_id)}."
+    else:
+        lines = [ledger_line(r) for r in chain]
+        skipped = len(lines) - PROVENANCE_MAX_LINES
+        if skipped > 0:
+            lines = lines[:1] + [f"… {skipped} more step(s) …"] + lines[-(PROVENANCE_MAX_LINES - 1):]
+        out = f"🧬 **Provenance of <@{who.id}>'s #{int(instance_id)}**\n" + "\n".join(lines)
+    for c in _chunk_text(out):
+        if is_slash:
+            if not ctx_or_inter.response.is_done(): await ctx_or_inter.response.send_message(c, ephemeral=True)
+            else: await ctx_or_inter.followup.send(c, ephemeral=True)
+        else:
+            await ctx_or_inter.send(c)
+
 # ================= Astral Commands =================
 @dual("astral_list", "List your Astral entries")
 async def astral_list_cmd(ctx_or_inter):
     uid = str(ctx_or_inter.user.id) if isinstance(ctx_or_inter, discord.Interaction) else str(ctx_or_inter.author.id)
     lines = astral_list(uid)
     babies = ensure_user(uid)["astral_offspring_pending"]
-    baby_lines = [f"{TAC_DATA.get(b['tac'],{}).get('name', b['tac'])} (Lv {b['level']}, {b['gender']})" for b in babies]
+    baby_lines = [f"{tac_name(b['tac'])} (Lv {b['level']}, {b['gender']})" for b in babies]
     out = "**Astral**\n" + ("\n".join(lines) if lines else "No entries.")
     if baby_lines:
         out += "\n\n**Offspring Ready:**\n" + "\n".join(baby_lines)
@@ -1536,7 +4127,7 @@ async def astral_list_cmd(ctx_or_inter):
     else:
         await ctx_or_inter.send(out)
 
-@dual("astral_add", "Place an instance into Astral (rest or breed)")
+@dual("astral_add", "Place an instance into Astral (rest or breed)", autocomplete={"id": ac_owned})
 async def astral_add_cmd(ctx_or_inter, id: int = 0, mode: str = "rest"):
     # who
     is_slash = isinstance(ctx_or_inter, discord.Interaction)
@@ -1555,6 +4146,10 @@ async def astral_add_cmd(ctx_or_inter, id: int = 0, mode: str = "rest"):
         txt = "❌ Mode must be 'rest' or 'breed'."
         return await (ctx_or_inter.response.send_message(txt, ephemeral=True) if is_slash else ctx_or_inter.send(txt))
 
+    if auction_of(uid, inst["id"]):
+        txt = f"❌ That TAC is up in auction `#{auction_of(uid, inst['id'])}`."
+        return await (ctx_or_inter.response.send_message(txt, ephemeral=True) if is_slash else ctx_or_inter.send(txt))
+
     # === COSMIC OVERFLOW RULE ===
     # If user already has 3 in Astral, trying to add a 4th spawns Ralgulfa,
     # recalls all Astral TACs to inventory, blocks the add.
@@ -1587,7 +4182,7 @@ async def astral_add_cmd(ctx_or_inter, id: int = 0, mode: str = "rest"):
     return await (ctx_or_inter.response.send_message(txt, ephemeral=True) if is_slash else ctx_or_inter.send(txt))
 
 
-@dual("astral_breed", "Begin breeding with two instances")
+@dual("astral_breed", "Begin breeding with two instances", autocomplete={"a": ac_owned, "b": ac_owned})
 async def astral_breed_cmd(ctx_or_inter, a: int = 0, b: int = 0):
     uid = str(ctx_or_inter.user.id) if isinstance(ctx_or_inter, discord.Interaction) else str(ctx_or_inter.author.id)
     A = get_instance(uid, int(a)); B = get_instance(uid, int(b))
@@ -1595,13 +4190,15 @@ async def astral_breed_cmd(ctx_or_inter, a: int = 0, b: int = 0):
         t = "❌ Instance(s) not found."
         if isinstance(ctx_or_inter, discord.Interaction): return await ctx_or_inter.response.send_message(t, ephemeral=True)
         return await ctx_or_inter.send(t)
+    if auction_of(uid, A["id"]) or auction_of(uid, B["id"]):
+        t = "❌ One or both are up in auction."
+        if isinstance(ctx_or_inter, discord.Interaction): return await ctx_or_inter.response.send_message(t, ephemeral=True)
+        return await ctx_or_inter.send(t)
     if A["gender"] == B["gender"]:
         t = "❌ Breeding requires opposite genders."
         if isinstance(ctx_or_inter, discord.Interaction): return await ctx_or_inter.response.send_message(t, ephemeral=True)
         return await ctx_or_inter.send(t)
-    ag = set(TAC_DATA.get(A["tac"], {}).get("egg_groups", []))
-    bg = set(TAC_DATA.get(B["tac"], {}).get("egg_groups", []))
-    if not ag.intersection(bg):
+    if not egg_compatible(A["tac"], B["tac"]):
         t = "❌ Egg groups are not compatible."
         if isinstance(ctx_or_inter, discord.Interaction): return await ctx_or_inter.response.send_message(t, ephemeral=True)
         return await ctx_or_inter.send(t)
@@ -1624,13 +4221,16 @@ async def astral_claim_cmd(ctx_or_inter):
             if not e.get("breed", {}).get("completed", False):
                 keep.append(e)
     u["astral"] = keep
-    babies = u["astral_offspring_pending"]; created = []
+    babies = u["astral_offspring_pending"]; created = []; hatched = []
     for b in babies:
         iid = new_instance(uid, b["tac"], b["level"], b["gender"])
-        created.append(f"{TAC_DATA.get(b['tac'],{}).get('name', b['tac'])} (#{iid}, Lv {b['level']}, {b['gender']}, IV {get_instance(uid, iid).get('iv_avg', 100.0):.1f}%)")
+        hatched.append([uid, iid, b["tac"]])
+        created.append(f"{tac_name(b['tac'])} (#{iid}, Lv {b['level']}, {b['gender']}, IV {get_instance(uid, iid).get('iv_avg', 100.0):.1f}%)")
     u["astral_offspring_pending"] = []
     u["astral"] = [e for e in u["astral"] if not (e["mode"] == "breed" and e.get("breed", {}).get("completed"))]
     save_user_db()
+    if hatched:
+        LEDGER.record("hatch", n=hatched)
     parts = []
     if removed: parts.append(f"Returned {removed} resting TAC(s) from Astral.")
     if created: parts.append("New offspring:\n- " + "\n- ".join(created))
@@ -1657,7 +4257,7 @@ def dmg_after_wilt(raw: float, stacks: int) -> int:
     return int(max(1, raw * (1.0 - red)))
 
 def player_damage(inst: Dict[str,Any], boss: Dict[str,Any], user_id: int, party_size: int = 1) -> Tuple[int, bool, int]:
-    raw = base_damage(inst)
+    raw = base_damage(str(user_id), inst)
     if boss_is_fleeb_raid(boss):
         raw *= min(1.0 + 0.04 * party_size, 1.20)
     if boss_is_wilter(boss):
@@ -1681,6 +4281,188 @@ def player_damage(inst: Dict[str,Any], boss: Dict[str,Any], user_id: int, party_
     else:
         return max(1, int(raw)), False, 0
 
+# ================= Combat engine (per-guild attack actor) =================
+# Attacks on a guild's boss are queued and resolved in ticks by one task per guild:
+# damage is applied in arrival order, a kill is settled exactly once, and each tick
+# posts one combined result instead of one message per attack.
+COMBAT_TICK_SEC = 0.25
+
+def auto_claim_enabled(uid: str) -> bool:
+    u = USER_DB.get(uid)
+    return bool(u and u.get("meta", {}).get("auto_claim"))
+
+def credit_reward(uid: str, reward: Dict[str, Any]):
+    add_currency(uid, {k: reward.get(k, 0) for k in REWARD_KEYS})
+    for ik, iv in reward.get("items", {}).items():
+        add_item(uid, ik, iv)
+
+async def settle_boss_rewards(guild_id: int, boss: Dict[str, Any]) -> Tuple[int, int]:
+    """
+    Split the boss reward pot by damage share in one pass. Auto-claim users are
+    credited directly, everyone else lands in PENDING_REWARDS; both go out in a
+    single store write. Returns (auto_credited, pending).
+    """
+    tier = boss_tier(boss)
+    cfg = tier.get("rewards", {})
+    contrib = boss["contributors"]
+    total = max(1, sum(contrib.values()))
+
+    def roll_range(k):
+        rng = cfg.get(k)
+        if not rng: return 0
+        lo, hi = rng
+        return random.randint(int(lo), int(hi))
+    pot = {k: roll_range(k) for k in REWARD_KEYS}
+    cos = cfg.get("cosmetic_drop")
+    item = str(cos.get("item", "")).strip() if isinstance(cos, dict) else ""
+    chance = float(cos.get("chance", 0.0)) if item else 0.0
+
+    auto: List[str] = []
+    gd = PENDING_REWARDS.setdefault(guild_id, {})
+    shares: Dict[int, Dict[str, Any]] = {}
+    for uid_int, dmg_done in contrib.items():
+        share = dmg_done / total
+        reward: Dict[str, Any] = {k: int(round(v * share)) for k, v in pot.items()}
+        if item and random.random() < chance:
+            reward["items"] = {item: 1}
+        shares[uid_int] = reward
+        if auto_claim_enabled(str(uid_int)):
+            auto.append(str(uid_int))
+
+    before = {u: {**gd[u], "items": dict(gd[u].get("items", {}))} if u in gd else None for u in shares}
+    try:
+        async with STORE.transaction(USER_DB, auto):
+            for uid_int, reward in shares.items():
+                if str(uid_int) in auto:
+                    credit_reward(str(uid_int), reward)
+                    continue
+                if not any(reward[k] for k in REWARD_KEYS) and not reward.get("items"):
+                    continue   # dust share: nothing worth keeping around
+                cur = gd.setdefault(uid_int, {})
+                for k in REWARD_KEYS:
+                    cur[k] = cur.get(k, 0) + reward[k]
+                for ik, iv in reward.get("items", {}).items():
+                    cur_items = cur.setdefault("items", {})
+                    cur_items[ik] = cur_items.get(ik, 0) + iv
+            persist_pending_rewards(guild_id)
+    except BaseException:
+        for u, r in before.items():   # the store rolled back; put the pending table back too
+            if r is None:
+                gd.pop(u, None)
+            else:
+                gd[u] = r
+        raise
+    if auto:
+        LEDGER.record("boss", d={uid: shard_delta({k: shares[int(uid)][k] for k in REWARD_KEYS}) for uid in auto},
+                      x={"boss": boss["tier"]})
+    return len(auto), len(shares) - len(auto)
+
+def attack_line(user_id: int, boss: Dict[str, Any], dmg: int, special: bool, stacks: int) -> str:
+    return (f"🗡️ <@{user_id}> dealt **{dmg:,}** to **{boss['name']}**"
+            + (", Wiltburst! it healed a bit" if special else "")
+            + (f" (your Wilt stacks: **{stacks}**)" if boss_is_wilter(boss) else "")
+            + ".")
+
+class CombatEngine:
+    def __init__(self, guild: discord.Guild):
+        self.guild = guild
+        self.queue: List[Tuple[int, Dict[str, Any], int, discord.abc.Messageable, asyncio.Future]] = []
+        self.task: Optional[asyncio.Task] = None
+        self.ticks = 0
+        self.resolved = 0
+
+    def submit(self, user_id: int, inst: Dict[str, Any], party_size: int,
+               channel: discord.abc.Messageable) -> asyncio.Future:
+        """Queue an attack intent; the future resolves to a result dict ({"error": ...} if the
+        tick failed), or None if the boss is gone."""
+        fut = asyncio.get_running_loop().create_future()
+        self.queue.append((user_id, inst, party_size, channel, fut))
+        if self.task is None or self.task.done():
+            self.task = asyncio.create_task(self._run())
+        return fut
+
+    async def _run(self):
+        while self.queue:
+            await asyncio.sleep(COMBAT_TICK_SEC)
+            batch, self.queue = self.queue, []
+            try:
+                await self._tick(batch)
+            except Exception as e:
+                print(f"[combat] guild {self.guild.id}: tick failed: {e}")
+                for *_, fut in batch:
+                    if not fut.done():
+                        fut.set_result({"error": str(e)})
+        if COMBAT_ENGINES.get(self.guild.id) is self and not boss_active(self.guild.id):
+            COMBAT_ENGINES.pop(self.guild.id, None)
+
+    async def _tick(self, batch):
+        gid = self.guild.id
+        boss = GUILD_BOSSES.get(gid)
+        self.ticks += 1
+        per_channel: Dict[int, Tuple[discord.abc.Messageable, List[str]]] = {}
+        killed = False
+        for user_id, inst, party_size, channel, fut in batch:
+            if not boss or boss["hp"] <= 0:
+                fut.set_result(None)
+                continue
+            dmg, special, stacks = player_damage(inst, boss, user_id, party_size=party_size)
+            boss["hp"] = max(0, boss["hp"] - dmg)
+            boss["contributors"][user_id] = boss["contributors"].get(user_id, 0) + dmg
+            boss["attacks"] += 1
+            self.resolved += 1
+            line = attack_line(user_id, boss, dmg, special, stacks)
+            per_channel.setdefault(channel.id, (channel, []))[1].append(line)
+            killed = boss["hp"] <= 0
+            fut.set_result({"dmg": dmg, "special": special, "stacks": stacks, "killed": killed, "line": line})
+
+        for channel, lines in per_channel.values():
+            queue_line(channel, "\n".join(lines))   # one combined post per channel per tick
+
+        if not boss:
+            return
+        if not killed:
+            await update_boss_message(self.guild)
+            return
+
+        # settle exactly once: everything below runs before the next tick can start
+        n_auto, n_pending = await settle_boss_rewards(gid, boss)
+        if boss_is_fleeb_raid(boss):
+            ACTIVE_RAID.pop(gid, None)
+        if GUILD_BOSSES.get(gid) is boss:
+            GUILD_BOSSES.pop(gid, None)
+            TIMERS.cancel(("boss", gid))
+        msg = BOSS_MESSAGES.get(gid)
+        clear_boss_message(gid)
+        ch = self.guild.get_channel(boss["channel_id"]) or next(iter(per_channel.values()))[0]
+        tops = heapq.nlargest(3, boss["contributors"].items(), key=lambda kv: kv[1])
+        lines = [f"<@{u}> — {d:,}" for u, d in tops] or ["(no contributors?)"]
+        if n_auto and n_pending:
+            rewards = f" Rewards auto-credited to {n_auto}; the rest claim via `/boss_claim` / `%boss_claim`."
+        elif n_auto:
+            rewards = f" Rewards auto-credited to {n_auto}."
+        elif n_pending:
+            rewards = " Claim rewards via `/boss_claim` / `%boss_claim`."
+        else:
+            rewards = ""
+        queue_line(ch, f"💥 **{boss['name']}** falls!{rewards}\nTop damage:\n" + "\n".join(lines))
+        # final forced edit showing the kill
+        try:
+            if not msg or msg.id != boss["message_id"]:
+                boss_ch = self.guild.get_channel(boss["channel_id"])
+                msg = await boss_ch.fetch_message(boss["message_id"]) if boss_ch and boss["message_id"] else None
+            if msg:
+                await msg.edit(embed=build_boss_embed(boss))
+        except Exception:
+            pass
+
+COMBAT_ENGINES: Dict[int, CombatEngine] = ShardedDict("combat_engines", shard_of_guild)
+
+def combat_engine(guild: discord.Guild) -> CombatEngine:
+    eng = COMBAT_ENGINES.get(guild.id)
+    if eng is None:
+        eng = COMBAT_ENGINES[guild.id] = CombatEngine(guild)
+    return eng
+
 @dual("boss", "Show current world boss")
 async def boss_cmd(ctx_or_inter):
     guild = ctx_or_inter.guild if isinstance(ctx_or_inter, discord.Interaction) else ctx_or_inter.guild
@@ -1692,7 +4474,7 @@ async def boss_cmd(ctx_or_inter):
     if isinstance(ctx_or_inter, discord.Interaction):
         await ctx_or_inter.response.send_message("Updated.", ephemeral=True)
 
-@dual("summon_boss", "Summon a boss from boss.json (allow-list only)")
+@dual("summon_boss", "Summon a boss from boss.json (allow-list only)", autocomplete={"tier": ac_boss_tier})
 async def summon_boss_cmd(ctx_or_inter, tier: str = "wilter"):
     user = ctx_or_inter.user if isinstance(ctx_or_inter, discord.Interaction) else ctx_or_inter.author
     if user.id not in ALLOW_SUMMON_IDS:
@@ -1704,7 +4486,7 @@ async def summon_boss_cmd(ctx_or_inter, tier: str = "wilter"):
     if isinstance(ctx_or_inter, discord.Interaction):
         await ctx_or_inter.response.send_message(f"Summoned **{BOSS_TIERS.get(tier,{}).get('name', tier)}**.", ephemeral=True)
 
-@dual("attack", "Attack the active boss with an instance (no cooldown)")
+@dual("attack", "Attack the active boss with an instance", autocomplete={"id": ac_owned})
 async def attack_cmd(ctx_or_inter, id: int = 0):
     guild = ctx_or_inter.guild if isinstance(ctx_or_inter, discord.Interaction) else ctx_or_inter.guild
     if not guild or not boss_active(guild.id):
@@ -1725,75 +4507,23 @@ async def attack_cmd(ctx_or_inter, id: int = 0):
     party_size = 1
     if boss_is_fleeb_raid(boss):
         raid = ACTIVE_RAID.get(guild.id)
-        if not raid or user.id not in raid["members"]:
+        p = party_of(guild.id, user.id)
+        if not raid or not p or p["leader"] != raid["leader"]:
             txt = "❌ Only the active raid party can attack this boss."
             if isinstance(ctx_or_inter, discord.Interaction): return await ctx_or_inter.response.send_message(txt, ephemeral=True)
             return await ctx_or_inter.send(txt)
-        party_size = len(raid["members"])
+        party_size = len(p["members"])
+        touch_party(guild.id, p["leader"])
 
-    dmg, special, stacks = player_damage(inst, boss, user.id, party_size=party_size)
-    boss["hp"] = max(0, boss["hp"] - dmg)
-    boss["contributors"][user.id] = boss["contributors"].get(user.id, 0) + dmg
-    boss["attacks"] += 1
-
-    await update_boss_message(guild)
-
-    if boss["hp"] <= 0:
-        tier = BOSS_TIERS.get(boss["tier"], {})
-        contrib = boss["contributors"]
-        total = max(1, sum(contrib.values()))
-
-        def roll_range(k):
-            rng = tier.get("rewards", {}).get(k)
-            if not rng: return 0
-            lo, hi = rng
-            return random.randint(int(lo), int(hi))
-        pot = {
-            "gold_shards": roll_range("gold_shards"),
-            "diamond_shards": roll_range("diamond_shards"),
-            "enchanted_shards": roll_range("enchanted_shards"),
-        }
-
-        for uid_int, dmg_done in contrib.items():
-            share = dmg_done / total
-            reward = {k: int(round(v * share)) for k, v in pot.items()}
-            reward_items: Dict[str, int] = {}
-            cos = tier.get("rewards", {}).get("cosmetic_drop")
-            if cos and isinstance(cos, dict):
-                item = str(cos.get("item", "")).strip()
-                chance = float(cos.get("chance", 0.0))
-                if item and random.random() < chance:
-                    reward_items[item] = reward_items.get(item, 0) + 1
-            gd = PENDING_REWARDS.setdefault(guild.id, {})
-            cur = gd.get(uid_int, {})
-            for kk, vv in reward.items():
-                cur[kk] = cur.get(kk, 0) + vv
-            if reward_items:
-                cur_items = cur.get("items", {})
-                for ik, iv in reward_items.items():
-                    cur_items[ik] = cur_items.get(ik, 0) + iv
-                cur["items"] = cur_items
-            gd[uid_int] = cur
-
-        save_user_db()
-
-        ch = ctx_or_inter.channel
-        tops = sorted(contrib.items(), key=lambda kv: kv[1], reverse=True)[:3]
-        lines = [f"<@{u}> — {d:,}" for u, d in tops] or ["(no contributors?)"]
-        await ch.send(
-            f"💥 **{boss['name']}** falls! Rewards via `/boss_claim` / `%boss_claim`.\n"
-            "Top damage:\n" + "\n".join(lines)
-        )
-        if boss_is_fleeb_raid(boss):
-            ACTIVE_RAID.pop(guild.id, None)
-        GUILD_BOSSES.pop(guild.id, None)
-    else:
-        txt = (f"🗡️ {user.mention} dealt **{dmg:,}** to **{boss['name']}**"
-               + (", Wiltburst! it healed a bit" if special else "")
-               + (f" (your Wilt stacks: **{stacks}**)" if boss_is_wilter(boss) else "")
-               + ".")
-        if isinstance(ctx_or_inter, discord.Interaction): await ctx_or_inter.response.send_message(txt)
-        else: await ctx_or_inter.send(txt)
+    # resolved by the guild's combat engine on its next tick; the channel gets one combined post
+    result = await combat_engine(guild).submit(user.id, inst, party_size, ctx_or_inter.channel)
+    if result is None or "error" in result:
+        txt = "❌ The boss already fell." if result is None else "⚠️ Your attack couldn't be resolved, try again."
+        if isinstance(ctx_or_inter, discord.Interaction): return await ctx_or_inter.response.send_message(txt, ephemeral=True)
+        return await ctx_or_inter.send(txt)
+    if isinstance(ctx_or_inter, discord.Interaction):
+        # the damage line itself goes out in the channel's combined post
+        await ctx_or_inter.response.send_message("⚔️ Attack sent.", ephemeral=True)
 
 @dual("boss_status", "See your status vs the boss")
 async def boss_status_cmd(ctx_or_inter):
@@ -1838,20 +4568,31 @@ async def purge_cmd(ctx_or_inter):
 async def boss_claim_cmd(ctx_or_inter):
     guild = ctx_or_inter.guild if isinstance(ctx_or_inter, discord.Interaction) else ctx_or_inter.guild
     user = ctx_or_inter.user if isinstance(ctx_or_inter, discord.Interaction) else ctx_or_inter.author
-    rewards = PENDING_REWARDS.get(guild.id, {}).pop(user.id, None) if guild else None
+    rewards = PENDING_REWARDS.get(guild.id, {}).get(user.id) if guild else None
     if not rewards:
         txt = "Nothing to claim."
         if isinstance(ctx_or_inter, discord.Interaction): return await ctx_or_inter.response.send_message(txt, ephemeral=True)
         return await ctx_or_inter.send(txt)
 
-    shards = {k: rewards.get(k, 0) for k in ("gold_shards","diamond_shards","enchanted_shards")}
-    add_currency(str(user.id), shards)
-
+    gd = PENDING_REWARDS[guild.id]
+    try:
+        async with STORE.transaction(USER_DB, [str(user.id)]):
+            # re-read under the store lock: a second claim racing this one finds nothing
+            rewards = gd.pop(user.id, None)
+            if rewards:
+                credit_reward(str(user.id), rewards)
+                persist_pending_rewards(guild.id)
+    except BaseException:
+        if rewards:
+            gd[user.id] = rewards   # the store rolled back; the claim is still pending
+        raise
+    if not rewards:
+        txt = "Nothing to claim."
+        if isinstance(ctx_or_inter, discord.Interaction): return await ctx_or_inter.response.send_message(txt, ephemeral=True)
+        return await ctx_or_inter.send(txt)
+    LEDGER.record("boss_claim", d={str(user.id): shard_delta({k: rewards.get(k, 0) for k in REWARD_KEYS})})
+    shards = {k: rewards.get(k, 0) for k in REWARD_KEYS}
     items = rewards.get("items", {})
-    for ik, iv in items.items():
-        add_item(str(user.id), ik, iv)
-
-    save_user_db()
 
     pretty_s = ", ".join([f"{v} {k}" for k, v in shards.items() if v])
     pretty_i = ", ".join([f"{v}× {k}" for k, v in items.items() if v])
@@ -1863,6 +4604,19 @@ async def boss_claim_cmd(ctx_or_inter):
     if isinstance(ctx_or_inter, discord.Interaction): await ctx_or_inter.response.send_message(out, ephemeral=True)
     else: await ctx_or_inter.send(out)
 
+@dual("boss_autoclaim", "Credit boss rewards automatically instead of via boss_claim")
+async def boss_autoclaim_cmd(ctx_or_inter, mode: str = ""):
+    user = ctx_or_inter.user if isinstance(ctx_or_inter, discord.Interaction) else ctx_or_inter.author
+    meta = ensure_user(str(user.id))["meta"]
+    mode = mode.lower()
+    if mode in ("on", "off"):
+        meta["auto_claim"] = mode == "on"
+        save_user_db()
+    state = "on" if meta.get("auto_claim") else "off"
+    out = f"Boss reward auto-claim is **{state}**." + ("" if mode in ("on", "off") else " Use `%boss_autoclaim on|off`.")
+    if isinstance(ctx_or_inter, discord.Interaction): await ctx_or_inter.response.send_message(out, ephemeral=True)
+    else: await ctx_or_inter.send(out)
+
 # ================= Parties (controller = leader) & Fleeb raid commands (unchanged)
 @dual("party_create", "Create a party (you are the leader)")
 async def party_create_cmd(ctx_or_inter):
@@ -1902,7 +4656,7 @@ async def party_join_cmd(ctx_or_inter, leader: discord.Member = None):
         txt = "Party is full."
         if isinstance(ctx_or_inter, discord.Interaction): return await ctx_or_inter.response.send_message(txt, ephemeral=True)
         return await ctx_or_inter.send(txt)
-    p["members"].append(user.id)
+    party_add_member(guild.id, p, user.id)
     msg = f"✅ {user.mention} joined {leader.mention}'s party."
     if isinstance(ctx_or_inter, discord.Interaction): await ctx_or_inter.response.send_message(msg)
     else: await ctx_or_inter.send(msg)
@@ -1915,24 +4669,16 @@ async def party_leave_cmd(ctx_or_inter):
         txt = "Parties only work in servers."
         if isinstance(ctx_or_inter, discord.Interaction): return await ctx_or_inter.response.send_message(txt, ephemeral=True)
         return await ctx_or_inter.send(txt)
-    g = PARTIES.get(guild.id, {})
-    found = None
-    for leader_id, p in list(g.items()):
-        if user.id in p["members"]:
-            found = (leader_id, p); break
-    if not found:
+    p = party_of(guild.id, user.id)
+    if not p:
         txt = "You're not in a party."
         if isinstance(ctx_or_inter, discord.Interaction): return await ctx_or_inter.response.send_message(txt, ephemeral=True)
         return await ctx_or_inter.send(txt)
-    leader_id, p = found
-    if user.id == leader_id:
-        g.pop(leader_id, None)
-        if ACTIVE_RAID.get(guild.id) and ACTIVE_RAID[guild.id]["leader"] == leader_id:
-            ACTIVE_RAID.pop(guild.id, None)
+    if user.id == p["leader"]:
+        disband_party(guild.id, user.id)
         msg = "🚫 You disbanded the party."
     else:
-        p["members"] = [m for m in p["members"] if m != user.id]
-        p["squads"].pop(user.id, None)
+        party_remove_member(guild.id, p, user.id)
         msg = "You left the party."
     if isinstance(ctx_or_inter, discord.Interaction): await ctx_or_inter.response.send_message(msg)
     else: await ctx_or_inter.send(msg)
@@ -1952,10 +4698,7 @@ async def party_members_cmd(ctx_or_inter, leader: Optional[discord.Member] = Non
             if isinstance(ctx_or_inter, discord.Interaction): return await ctx_or_inter.response.send_message(txt, ephemeral=True)
             return await ctx_or_inter.send(txt)
     else:
-        p = None
-        for lp, pp in PARTIES.get(guild.id, {}).items():
-            if user.id in pp["members"]:
-                p = pp; break
+        p = party_of(guild.id, user.id)
         if not p:
             txt = "You're not in a party."
             if isinstance(ctx_or_inter, discord.Interaction): return await ctx_or_inter.response.send_message(txt, ephemeral=True)
@@ -1965,7 +4708,7 @@ async def party_members_cmd(ctx_or_inter, leader: Optional[discord.Member] = Non
         f"**Party** (Controller: <@{p['leader']}>) — {members}"
     )
 
-@dual("party_set", "Choose up to 3 TAC instance IDs to use in raids")
+@dual("party_set", "Choose up to 3 TAC instance IDs to use in raids", autocomplete={"a": ac_owned, "b": ac_owned, "c": ac_owned})
 async def party_set_cmd(ctx_or_inter, a: int = 0, b: int = 0, c: int = 0):
     guild = ctx_or_inter.guild if isinstance(ctx_or_inter, discord.Interaction) else ctx_or_inter.guild
     user = ctx_or_inter.user if isinstance(ctx_or_inter, discord.Interaction) else ctx_or_inter.author
@@ -1973,10 +4716,7 @@ async def party_set_cmd(ctx_or_inter, a: int = 0, b: int = 0, c: int = 0):
         txt = "Parties only work in servers."
         if isinstance(ctx_or_inter, discord.Interaction): return await ctx_or_inter.response.send_message(txt, ephemeral=True)
         return await ctx_or_inter.send(txt)
-    found_p = None
-    for lp, pp in PARTIES.get(guild.id, {}).items():
-        if user.id in pp["members"]:
-            found_p = pp; break
+    found_p = party_of(guild.id, user.id)
     if not found_p:
         txt = "Join or create a party first."
         if isinstance(ctx_or_inter, discord.Interaction): return await ctx_or_inter.response.send_message(txt, ephemeral=True)
@@ -1993,10 +4733,11 @@ async def party_set_cmd(ctx_or_inter, a: int = 0, b: int = 0, c: int = 0):
             if isinstance(ctx_or_inter, discord.Interaction): return await ctx_or_inter.response.send_message(txt, ephemeral=True)
             return await ctx_or_inter.send(txt)
     found_p["squads"][user.id] = picks
+    touch_party(guild.id, found_p["leader"])
     names = []
     for iid in picks:
         inst = get_instance(uid, int(iid))
-        nm = TAC_DATA.get(inst["tac"], {}).get("name", inst["tac"]) if inst else f"#{iid}"
+        nm = tac_name(inst["tac"]) if inst else f"#{iid}"
         names.append(f"#{iid} {nm}")
     msg = "✅ Raid squad set: " + ", ".join(names)
     if isinstance(ctx_or_inter, discord.Interaction): await ctx_or_inter.response.send_message(msg)
@@ -2042,7 +4783,7 @@ async def raid_fleeb_cmd(ctx_or_inter, action: str = "status"):
             return await ctx_or_inter.send(txt)
 
         await spawn_boss(channel, tier_key="fleeb_raid")
-        ACTIVE_RAID[guild.id] = {"leader": user.id, "members": set(p["members"]), "tier": "fleeb_raid"}
+        ACTIVE_RAID[guild.id] = {"leader": user.id, "tier": "fleeb_raid"}
         if boss_active(guild.id):
             GUILD_BOSSES[guild.id]["raid"] = {"leader": user.id, "members": list(p["members"])}
         msg = f"🧪 Fleeb Raid started by {user.mention}! Only the party can attack. Use `%attack <id>`."
@@ -2054,25 +4795,81 @@ async def raid_fleeb_cmd(ctx_or_inter, action: str = "status"):
     return await ctx_or_inter.send(txt)
 
 # ================= Summon TAC / Reset =================
-@dual("summon", "Summon a TAC (allow-list only)")
+@dual("summon", "Summon a TAC (allow-list only)", autocomplete={"tac": ac_tac})
 async def summon_cmd(ctx_or_inter, tac: str = ""):
     if isinstance(ctx_or_inter, discord.Interaction):
         if ctx_or_inter.user.id not in ALLOW_SUMMON_IDS:
             return await ctx_or_inter.response.send_message("❌ You don't have permission.", ephemeral=True)
         key = tac.lower().strip()
         if key not in TAC_DATA: return await ctx_or_inter.response.send_message("❌ TAC not found.", ephemeral=True)
-        if ctx_or_inter.channel.id in SPAWNED_TAC: return await ctx_or_inter.response.send_message("⚠️ A TAC is already active here.", ephemeral=True)
+        if channel_key(ctx_or_inter.channel) in SPAWNED_TAC: return await ctx_or_inter.response.send_message("⚠️ A TAC is already active here.", ephemeral=True)
         await spawn_tac(ctx_or_inter.channel, key=key)
-        return await ctx_or_inter.response.send_message(f"✅ Summoned {TAC_DATA[key]['name']}.", ephemeral=True)
+        return await ctx_or_inter.response.send_message(f"✅ Summoned {CATALOG[key].name}.", ephemeral=True)
     else:
         author = ctx_or_inter.author
         if author.id not in ALLOW_SUMMON_IDS:
             return await ctx_or_inter.send("❌ You don't have permission.")
         key = tac.lower().strip()
         if key not in TAC_DATA: return await ctx_or_inter.send("❌ TAC not found.")
-        if ctx_or_inter.channel.id in SPAWNED_TAC: return await ctx_or_inter.send("⚠️ A TAC is already active here.")
+        if channel_key(ctx_or_inter.channel) in SPAWNED_TAC: return await ctx_or_inter.send("⚠️ A TAC is already active here.")
         await spawn_tac(ctx_or_inter.channel, key=key)
-        return await ctx_or_inter.send(f"✅ Summoned {TAC_DATA[key]['name']}.")
+        return await ctx_or_inter.send(f"✅ Summoned {CATALOG[key].name}.")
+
+@dual("spawn_pool", "Server spawn pool: show, regions <a, b|all>, weight <tac> <x>, reset")
+async def spawn_pool_cmd(ctx_or_inter, action: str = "show", *, args: str = ""):
+    is_slash = isinstance(ctx_or_inter, discord.Interaction)
+    user = ctx_or_inter.user if is_slash else ctx_or_inter.author
+    guild = ctx_or_inter.guild
+
+    async def reply(txt: str):
+        if is_slash: return await ctx_or_inter.response.send_message(txt, ephemeral=True)
+        return await ctx_or_inter.send(txt)
+
+    if not guild:
+        return await reply("Spawn pools are per server.")
+    action = action.lower()
+    pool = dict(SPAWN_POOLS.get(str(guild.id), {}))
+    if action != "show":
+        perms = getattr(user, "guild_permissions", None)
+        if user.id not in ALLOW_SUMMON_IDS and not (perms and perms.manage_guild):
+            return await reply("❌ You need Manage Server to change the spawn pool.")
+    if action == "regions":
+        known = {str(td.get("region", "")).lower(): td.get("region", "") for td in TAC_DATA.values()}
+        want = [r.strip() for r in args.split(",") if r.strip()]
+        if [r for r in want if r.lower() == "all"]:
+            pool.pop("regions", None)
+        else:
+            bad = [r for r in want if r.lower() not in known]
+            if not want or bad:
+                return await reply("Unknown region(s): " + ", ".join(bad or ["none given"]) + "\nRegions: " + ", ".join(sorted(known.values())))
+            pool["regions"] = [known[r.lower()] for r in want]
+        set_spawn_pool(guild.id, pool)
+    elif action == "weight":
+        parts = args.split()
+        try:
+            tk, x = parts[0].lower(), float(parts[1])
+        except (IndexError, ValueError):
+            return await reply("Usage: `%spawn_pool weight <tac> <multiplier>` (0 disables, 1 resets)")
+        if tk not in TAC_DATA or x < 0:
+            return await reply("❌ Unknown TAC or negative multiplier.")
+        weights = dict(pool.get("weights", {}))
+        if x == 1.0: weights.pop(tk, None)
+        else: weights[tk] = x
+        pool["weights"] = weights
+        set_spawn_pool(guild.id, pool)
+    elif action == "reset":
+        set_spawn_pool(guild.id, None)
+    elif action != "show":
+        return await reply("Actions: `show`, `regions <a, b|all>`, `weight <tac> <x>`, `reset`")
+
+    pool = SPAWN_POOLS.get(str(guild.id), {})
+    lines = [f"🌀 **Spawn pool for {guild.name}**" + ("" if pool else " (default)")]
+    if pool.get("regions"): lines.append("Regions: " + ", ".join(pool["regions"]))
+    if pool.get("weights"): lines.append("Multipliers: " + ", ".join(f"{k}×{v:g}" for k, v in pool["weights"].items()))
+    table = spawn_table("theta", guild.id)
+    if table:
+        lines.append("Theta/GIF odds: " + ", ".join(f"{CATALOG[k].name} {p * 100:.1f}%" for k, p in table.odds()[:12]))
+    await reply("\n".join(lines))
 
 @dual("resetme", "Reset your data (inventory, shards, items)")
 async def resetme_cmd(ctx_or_inter):
@@ -2092,58 +4889,41 @@ async def resetme_cmd(ctx_or_inter):
         "items": {}, "meta": {"last_daily": 0, "streak": 0},
         "clan": None
     }
+    inventory_rewritten(uid)
     save_user_db()
+    market_delist(uid, [iid for s_uid, iid in list(MARKET_INST) if s_uid == uid])
+    LEDGER.record("reset", u=[uid])
     msg = "Your TAC inventory, shards, items, and clan have been reset."
     if isinstance(ctx_or_inter, discord.Interaction): await ctx_or_inter.response.send_message(msg, ephemeral=True)
     else: await ctx_or_inter.send(msg)
 
 # ================= PvP (friendly duels) =================
-PVP_PENDING: Dict[int, Dict[str, Any]] = {}   # challenge_id -> data
+PVP_PENDING: Dict[int, Dict[str, Any]] = {}   # challenge_id -> data (instance kept as owner + id)
 NEXT_PVP_ID = 1
+PVP_TTL = 300   # seconds before an unanswered challenge lapses
 
-def pvp_simulate(a_inst: Dict[str,Any], b_inst: Dict[str,Any]) -> Tuple[str, List[str]]:
-    """Return (winner: 'A'|'B'|'DRAW', log_lines)"""
-    # Use IV health as HP; if 0, fallback to base
-    def hp_of(inst):
-        tk = inst["tac"]; base = TAC_DATA.get(tk, {}).get("stats", {})
-        iv = int(inst.get("ivs", {}).get("health", 0)) or int(base.get("health", 1))
-        return max(1, iv)
-
-    hpA = hp_of(a_inst)
-    hpB = hp_of(b_inst)
-    log = []
-    rounds = 0
-    attacker = "A"  # A starts
-    while hpA > 0 and hpB > 0 and rounds < 40:
-        rounds += 1
-        if attacker == "A":
-            dmg = base_damage(a_inst)
-            if random.random() < 0.10:
-                dmg *= 1.5
-                crit = " (crit!)"
-            else:
-                crit = ""
-            dmg = int(max(1, dmg))
-            hpB = max(0, hpB - dmg)
-            log.append(f"Round {rounds}: A deals **{dmg}**{crit} → B HP {hpB}")
-            attacker = "B"
-        else:
-            dmg = base_damage(b_inst)
-            if random.random() < 0.10:
-                dmg *= 1.5
-                crit = " (crit!)"
-            else:
-                crit = ""
-            dmg = int(max(1, dmg))
-            hpA = max(0, hpA - dmg)
-            log.append(f"Round {rounds}: B deals **{dmg}**{crit} → A HP {hpA}")
-            attacker = "A"
+def end_pvp(challenge_id: int) -> Optional[Dict[str, Any]]:
+    TIMERS.cancel(("pvp", challenge_id))
+    return PVP_PENDING.pop(challenge_id, None)
 
-    if hpA == hpB:
-        return "DRAW", log
-    return ("A" if hpA > hpB else "B"), log
+def expire_pvp(challenge_id: int):
+    ch = end_pvp(challenge_id)
+    channel = bot.get_channel(ch["channel_id"]) if ch else None
+    if channel:
+        queue_line(channel, f"⌛ PvP Challenge #{challenge_id} expired.")
+
+# ---- Fast duel core: per-instance constants once, then a tight dice loop (duel.py) ----
+def duel_profile(uid: str, inst: Dict[str, Any]) -> Tuple[float, int]:
+    """(damage coefficient, starting HP) — everything in a duel that doesn't depend on dice."""
+    return combat_profile(uid, inst)
+
+def pvp_simulate(a_uid: str, a_inst: Dict[str,Any], b_uid: str, b_inst: Dict[str,Any]) -> Tuple[str, List[str]]:
+    """Return (winner: 'A'|'B'|'DRAW', log_lines)"""
+    log: List[str] = []
+    winner = pvp_duel(duel_profile(a_uid, a_inst), duel_profile(b_uid, b_inst), random, log)
+    return winner, log
 
-@dual("pvp", "Challenge a user to a friendly duel")
+@dual("pvp", "Challenge a user to a friendly duel", autocomplete={"my_id": ac_owned})
 async def pvp_cmd(ctx_or_inter, user: discord.Member = None, my_id: int = 0):
     global NEXT_PVP_ID
     if isinstance(ctx_or_inter, discord.Interaction):
@@ -2168,22 +4948,25 @@ async def pvp_cmd(ctx_or_inter, user: discord.Member = None, my_id: int = 0):
         "channel_id": channel.id,
         "author_id": author.id,
         "target_id": user.id,
-        "a_inst": a_inst,
-        "message_id": None
+        "a_inst_id": a_inst["id"],
+        "message_id": None,
+        "expires_at": time.time() + PVP_TTL,
     }
+    TIMERS.schedule(("pvp", cid), PVP_TTL, lambda: expire_pvp(cid))
 
-    a_name = TAC_DATA.get(a_inst["tac"], {}).get("name", a_inst["tac"])
+    a_name = tac_name(a_inst["tac"])
     embed = discord.Embed(title=f"PvP Challenge #{cid}", color=discord.Color.purple())
     embed.add_field(name="Challenger", value=author.mention, inline=True)
     embed.add_field(name="Target", value=user.mention, inline=True)
     embed.add_field(name="Challenger TAC", value=f"#{a_inst['id']} {a_name} (Lv {a_inst['level']}, IV {a_inst.get('iv_avg',100.0):.1f}%)", inline=False)
-    embed.set_footer(text=f"{user.display_name}, accept with `%pvp_accept {cid} <your_instance_id>` or decline with `%pvp_decline {cid}`.")
+    embed.set_footer(text=f"{user.display_name}, accept with `%pvp_accept {cid} <your_instance_id>` or decline with `%pvp_decline {cid}`. "
+                          f"Expires in {PVP_TTL // 60} min.")
     msg = await channel.send(content=user.mention, embed=embed)
     PVP_PENDING[cid]["message_id"] = msg.id
     if isinstance(ctx_or_inter, discord.Interaction):
         await ctx_or_inter.response.send_message("Challenge sent.", ephemeral=True)
 
-@dual("pvp_accept", "Accept a PvP challenge")
+@dual("pvp_accept", "Accept a PvP challenge", autocomplete={"my_id": ac_owned})
 async def pvp_accept_cmd(ctx_or_inter, challenge_id: int = 0, my_id: int = 0):
     if challenge_id not in PVP_PENDING:
         txt = "❌ Challenge not found."
@@ -2203,12 +4986,17 @@ async def pvp_accept_cmd(ctx_or_inter, challenge_id: int = 0, my_id: int = 0):
         if isinstance(ctx_or_inter, discord.Interaction): return await ctx_or_inter.response.send_message(txt, ephemeral=True)
         return await ctx_or_inter.send(txt)
 
-    a_inst = ch["a_inst"]
     a_owner = ch["author_id"]
-    a_name = TAC_DATA.get(a_inst["tac"], {}).get("name", a_inst["tac"])
-    b_name = TAC_DATA.get(b_inst["tac"], {}).get("name", b_inst["tac"])
+    a_inst = get_instance(str(a_owner), ch["a_inst_id"])
+    if not a_inst:
+        end_pvp(challenge_id)
+        txt = "❌ The challenger no longer has that TAC; challenge cancelled."
+        if isinstance(ctx_or_inter, discord.Interaction): return await ctx_or_inter.response.send_message(txt, ephemeral=True)
+        return await ctx_or_inter.send(txt)
+    a_name = tac_name(a_inst["tac"])
+    b_name = tac_name(b_inst["tac"])
 
-    winner, log = pvp_simulate(a_inst, b_inst)
+    winner, log = pvp_simulate(str(a_owner), a_inst, b_uid, b_inst)
 
     lines = []
     lines.append(f"**Duel:** <@{a_owner}> ({a_name} #{a_inst['id']}) vs <@{target.id}> ({b_name} #{b_inst['id']})")
@@ -2223,8 +5011,8 @@ async def pvp_accept_cmd(ctx_or_inter, challenge_id: int = 0, my_id: int = 0):
         lines.append(f"**Winner:** <@{target.id}> 🏆")
 
     channel = ctx_or_inter.channel
-    await channel.send("\n".join(lines))
-    PVP_PENDING.pop(challenge_id, None)
+    await send_priority(channel, "\n".join(lines))
+    end_pvp(challenge_id)
 
     if isinstance(ctx_or_inter, discord.Interaction):
         await ctx_or_inter.response.send_message("Fight resolved!", ephemeral=True)
@@ -2241,14 +5029,583 @@ async def pvp_decline_cmd(ctx_or_inter, challenge_id: int = 0):
         txt = "Only the target or the challenger can decline."
         if isinstance(ctx_or_inter, discord.Interaction): return await ctx_or_inter.response.send_message(txt, ephemeral=True)
         return await ctx_or_inter.send(txt)
-    PVP_PENDING.pop(challenge_id, None)
+    end_pvp(challenge_id)
     msg = f"❌ PvP Challenge #{challenge_id} has been declined."
     if isinstance(ctx_or_inter, discord.Interaction): await ctx_or_inter.response.send_message(msg)
     else: await ctx_or_inter.send(msg)
 
+# ================= PvP Tournaments =================
+# Entries are snapshotted to duel profiles at start; every match gets its own
+# Random(seed, match index) so a tournament replays exactly from its seed, no
+# matter how the matches were split across worker processes.
+TOURNAMENTS = ShardedDict("tournaments", shard_of_guild)   # guild_id -> tournament
+TOURNAMENT_MAX_ENTRIES = 256
+TOURNAMENT_MAX_PER_USER = 3
+TOURNAMENT_POOL_MIN = 64       # matches in a batch before we hand it to the process pool
+TOURNAMENT_WORKERS = max(1, min(4, (os.cpu_count() or 2) - 1))
+TOURNAMENT_POOL: Optional[ProcessPoolExecutor] = None
+
+def _tournament_pool() -> ProcessPoolExecutor:
+    global TOURNAMENT_POOL
+    if TOURNAMENT_POOL is None:
+        # spawn, not fork: the bot process has a live event loop and threads
+        TOURNAMENT_POOL = ProcessPoolExecutor(max_workers=TOURNAMENT_WORKERS,
+                                              mp_context=multiprocessing.get_context("spawn"))
+    return TOURNAMENT_POOL
+
+async def run_matches(profiles: List[Tuple[float, int]], matches: List[Tuple[int, int, int]],
+                      seed: int, decisive: bool = False) -> List[str]:
+    """Small batches inline; big ones split into chunks across the process pool."""
+    if len(matches) < TOURNAMENT_POOL_MIN:
+        return play_matches(profiles, matches, seed, decisive)
+    pool = _tournament_pool()
+    loop = asyncio.get_running_loop()
+    n = TOURNAMENT_WORKERS * 4
+    size = -(-len(matches) // n)
+    # a spawned worker re-imports main.py, which opens nothing until startup()
+    futs = [loop.run_in_executor(pool, play_matches, profiles, matches[i:i + size], seed, decisive)
+            for i in range(0, len(matches), size)]
+    out: List[str] = []
+    for part in await asyncio.gather(*futs):
+        out += part
+    return out
+
+async def run_round_robin(profiles: List[Tuple[float, int]], seed: int) -> List[Dict[str, int]]:
+    """Everyone plays everyone once. Win 3, draw 1."""
+    n = len(profiles)
+    matches = [(k, a, b) for k, (a, b) in enumerate((a, b) for a in range(n) for b in range(a + 1, n))]
+    rows = [{"w": 0, "d": 0, "l": 0, "pts": 0} for _ in range(n)]
+    for (_, a, b), res in zip(matches, await run_matches(profiles, matches, seed)):
+        if res == "DRAW":
+            for x in (a, b):
+                rows[x]["d"] += 1; rows[x]["pts"] += 1
+        else:
+            win, lose = (a, b) if res == "A" else (b, a)
+            rows[win]["w"] += 1; rows[win]["pts"] += 3
+            rows[lose]["l"] += 1
+    return rows
+
+async def run_bracket(profiles: List[Tuple[float, int]], seed: int) -> List[Dict[str, int]]:
+    """Single elimination over a seed-shuffled draw; byes fill up to a power of two."""
+    n = len(profiles)
+    order = list(range(n))
+    random.Random(seed).shuffle(order)
+    size = 1
+    while size < n:
+        size *= 2
+    slots: List[Optional[int]] = order + [None] * (size - n)
+    # spread byes so no two byes meet: pair slot i with slot size-1-i
+    alive = [x for i in range(size // 2) for x in (slots[i], slots[size - 1 - i])]
+    rows = [{"w": 0, "d": 0, "l": 0, "pts": 0} for _ in range(n)]   # pts = round reached
+    idx = 0
+    rnd = 1
+    while len(alive) > 1:
+        pairs = []
+        for i in range(0, len(alive), 2):
+            a, b = alive[i], alive[i + 1]
+            if a is not None and b is not None:
+                pairs.append((idx, a, b)); idx += 1
+        results = iter(await run_matches(profiles, pairs, seed, decisive=True))
+        nxt = []
+        for i in range(0, len(alive), 2):
+            a, b = alive[i], alive[i + 1]
+            if a is None or b is None:   # bye
+                nxt.append(b if a is None else a)
+                continue
+            win, lose = (a, b) if next(results) == "A" else (b, a)
+            rows[win]["w"] += 1; rows[lose]["l"] += 1
+            rows[lose]["pts"] = rnd
+            nxt.append(win)
+        alive = nxt
+        rnd += 1
+    if alive and alive[0] is not None:
+        rows[alive[0]]["pts"] = rnd
+    return rows
+
+def standings_text(t: Dict[str, Any], rows: List[Dict[str, int]]) -> str:
+    entries = t["entries"]
+    bracket = t["mode"] == "bracket"
+    order = sorted(range(len(rows)), key=lambda i: (-rows[i]["pts"], -rows[i]["w"], rows[i]["l"], i))
+    head = f"{'#':>3} {'TAC':<22} {'Owner':<16} {'W':>3} {'D':>3} {'L':>3} {'Rnd' if bracket else 'Pts':>4}"
+    lines = [head, "-" * len(head)]
+    for rank, i in enumerate(order, 1):
+        e, r = entries[i], rows[i]
+        tac = f"{e['name']} #{e['inst_id']}"[:22]
+        lines.append(f"{rank:>3} {tac:<22} {e['owner'][:16]:<16} {r['w']:>3} {r['d']:>3} {r['l']:>3} {r['pts']:>4}")
+    return "\n".join(lines)
+
+@dual("tournament", "PvP tournament: open, join <id>, leave <id>, start [round_robin|bracket], status, cancel")
+async def tournament_cmd(ctx_or_inter, action: str = "status", arg: str = "", seed: int = 0):
+    is_slash = isinstance(ctx_or_inter, discord.Interaction)
+    user = ctx_or_inter.user if is_slash else ctx_or_inter.author
+    guild = ctx_or_inter.guild
+    channel = ctx_or_inter.channel
+
+    async def reply(txt: str, ephemeral: bool = True):
+        if is_slash: return await ctx_or_inter.response.send_message(txt, ephemeral=ephemeral)
+        return await ctx_or_inter.send(txt)
+
+    if not guild:
+        return await reply("Tournaments run in servers only.")
+    action = action.lower()
+    t = TOURNAMENTS.get(guild.id)
+
+    if action == "open":
+        if t:
+            return await reply("A tournament is already open here. `%tournament status`")
+        TOURNAMENTS[guild.id] = {"host_id": user.id, "channel_id": channel.id, "entries": [], "mode": "round_robin"}
+        return await reply(f"🏟️ {user.mention} opened a PvP tournament! Enter with `%tournament join <instance_id>`.", ephemeral=False)
+
+    if not t:
+        return await reply("No tournament open. Start one with `%tournament open`.")
+
+    if action == "join":
+        if not arg.isdigit():
+            return await reply("Usage: `%tournament join <instance_id>`")
+        inst = get_instance(str(user.id), int(arg))
+        if not inst:
+            return await reply("❌ You don't own that instance.")
+        mine = [e for e in t["entries"] if e["uid"] == str(user.id)]
+        if any(e["inst_id"] == inst["id"] for e in mine):
+            return await reply("That instance is already entered.")
+        if len(mine) >= TOURNAMENT_MAX_PER_USER:
+            return await reply(f"Max {TOURNAMENT_MAX_PER_USER} entries per player.")
+        if len(t["entries"]) >= TOURNAMENT_MAX_ENTRIES:
+            return await reply("Tournament is full.")
+        name = tac_name(inst["tac"])
+        t["entries"].append({"uid": str(user.id), "owner": getattr(user, "display_name", user.name),
+                             "inst_id": inst["id"], "name": name})
+        return await reply(f"✅ Entered {name} #{inst['id']} ({len(t['entries'])} entries).", ephemeral=False)
+
+    if action == "leave":
+        before = len(t["entries"])
+        t["entries"] = [e for e in t["entries"]
+                        if not (e["uid"] == str(user.id) and (not arg.isdigit() or e["inst_id"] == int(arg)))]
+        return await reply(f"Removed {before - len(t['entries'])} entr{'y' if before - len(t['entries']) == 1 else 'ies'}.")
+
+    if action == "status":
+        by_owner: Dict[str, int] = {}
+        for e in t["entries"]:
+            by_owner[e["owner"]] = by_owner.get(e["owner"], 0) + 1
+        who = ", ".join(f"{o} ×{n}" if n > 1 else o for o, n in by_owner.items()) or "nobody yet"
+        state = "running…" if t.get("running") else "open"
+        return await reply(f"🏟️ Tournament ({state}) hosted by <@{t['host_id']}> — {len(t['entries'])} entries: {who}")
+
+    if action in ("start", "cancel"):
+        if user.id != t["host_id"] and user.id not in ALLOW_SUMMON_IDS:
+            return await reply("❌ Only the host can do that.")
+        if t.get("running"):
+            return await reply("Already running.")
+        if action == "cancel":
+            TOURNAMENTS.pop(guild.id, None)
+            return await reply("Tournament cancelled.", ephemeral=False)
+        mode = (arg or "round_robin").lower()
+        if mode not in ("round_robin", "bracket"):
+            return await reply("Mode must be `round_robin` or `bracket`.")
+        # snapshot: drop entries whose instance has since been sold/traded
+        entries, profiles = [], []
+        for e in t["entries"]:
+            inst = get_instance(e["uid"], e["inst_id"])
+            if inst:
+                entries.append(e); profiles.append(duel_profile(e["uid"], inst))
+        if len(entries) < 2:
+            return await reply("Need at least 2 entries.")
+        seed = int(seed) or random.randrange(1, 2**31)
+        t.update(entries=entries, mode=mode, seed=seed, running=True)
+        if is_slash:
+            await ctx_or_inter.response.send_message(f"Running {mode.replace('_', ' ')} with {len(entries)} entries…")
+        t0 = time.perf_counter()
+        try:
+            rows = await (run_bracket(profiles, seed) if mode == "bracket" else run_round_robin(profiles, seed))
+        finally:
+            TOURNAMENTS.pop(guild.id, None)
+        n = len(entries)
+        played = n * (n - 1) // 2 if mode == "round_robin" else n - 1
+        title = (f"🏆 **Tournament results** — {mode.replace('_', ' ')}, {n} entries, {played:,} matches, "
+                 f"seed `{seed}` ({time.perf_counter() - t0:.2f}s)")
+        for i, c in enumerate(_chunk_text(standings_text(t, rows), limit=1800)):
+            await send_priority(channel, (title + "\n" if i == 0 else "") + f"```\n{c}\n```")
+        return
+
+    await reply("Usage: `%tournament open|join <id>|leave [id]|start [round_robin|bracket] [seed]|status|cancel`")
+
+# ================= Warm restart snapshot =================
+# Runtime state that isn't in the user store (bosses + wilt stacks, parties, raids,
+# spawns, open trades, PvP challenges, tournament sign-ups) is written to a compact
+# JSON snapshot every SNAPSHOT_INTERVAL and on shutdown. Discord objects are kept
+# as ids; on_ready re-attaches buttons to spawn/trade messages that haven't expired.
+# Pending boss rewards already live in the store (see persist_pending_rewards).
+SNAPSHOT_INTERVAL = 30
+SNAPSHOT_TASK: Optional[asyncio.Task] = None
+SNAPSHOT_LAST = ""
+RESTORE_PENDING: Dict[str, list] = {"spawns": [], "trades": []}
+
+def _ikeys(d: Dict[str, Any]) -> Dict[int, Any]:
+    return {int(k): v for k, v in d.items()}
+
+def runtime_snapshot() -> Dict[str, Any]:
+    return {
+        "v": 1,
+        "saved_at": time.time(),
+        "bosses": {gid: dict(b) for gid, b in GUILD_BOSSES.items() if b.get("hp", 0) > 0},
+        "parties": {gid: [dict(p, members=list(p["members"])) for p in g.values()] for gid, g in PARTIES.items() if g},
+        "raids": {gid: r for gid, r in ACTIVE_RAID.items()},
+        "spawns": {cid: dict({k: v for k, v in sp.items() if k != "view"}, guild_id=gid)
+                   for (gid, cid), sp in SPAWNED_TAC.items() if sp.get("message_id")},
+        "trades": [{k: v for k, v in t.items() if k not in TRADE_LIVE_KEYS}
+                   for t in PENDING_TRADES.values() if t.get("message_id")],
+        "pvp": {"next_id": NEXT_PVP_ID, "pending": PVP_PENDING},
+        "tournaments": {gid: t for gid, t in TOURNAMENTS.items() if not t.get("running")},
+    }
+
+def save_runtime_snapshot(force: bool = False) -> bool:
+    """Write the snapshot if anything changed since the last write."""
+    global SNAPSHOT_LAST
+    snap = runtime_snapshot()
+    body = json.dumps({k: v for k, v in snap.items() if k != "saved_at"}, separators=(",", ":"), default=list)
+    if body == SNAPSHOT_LAST and not force:
+        return False
+    tmp = SNAPSHOT_FILE + ".tmp"
+    with open(tmp, "w", encoding="utf-8") as f:
+        json.dump(snap, f, separators=(",", ":"), default=list)
+    os.replace(tmp, SNAPSHOT_FILE)
+    SNAPSHOT_LAST = body
+    return True
+
+def load_runtime_snapshot() -> int:
+    """Refill the runtime containers from the last snapshot. Views are re-attached in on_ready."""
+    global NEXT_PVP_ID
+    snap = safe_read_json(SNAPSHOT_FILE, {})
+    if snap.get("v") != 1:
+        return 0
+    now = time.time()
+    for gid, b in snap.get("bosses", {}).items():
+        if b.get("tier") not in BOSS_TIERS and not b.get("tier_data"):
+            continue
+        b["contributors"] = _ikeys(b.get("contributors", {}))
+        b["wilt"] = _ikeys(b.get("wilt", {}))
+        GUILD_BOSSES[int(gid)] = b
+        if b.get("despawn_at"):
+            TIMERS.schedule(("boss", int(gid)), b["despawn_at"] - now,
+                            lambda g=int(gid), boss=b: despawn_boss(g, boss))
+    for gid, parties in snap.get("parties", {}).items():
+        for p in parties:
+            party = ensure_party(int(gid), p["leader"], p.get("max", 5))
+            party["squads"] = _ikeys(p.get("squads", {}))
+            for m in p["members"]:
+                party_add_member(int(gid), party, m)
+    for gid, r in snap.get("raids", {}).items():
+        ACTIVE_RAID[int(gid)] = {"leader": r["leader"], "tier": r.get("tier", "fleeb_raid")}
+    for cid, sp in snap.get("spawns", {}).items():
+        if sp.get("key") in TAC_DATA:
+            ck = (int(sp.pop("guild_id", 0)), int(cid))
+            RESTORE_PENDING["spawns"].append((ck, sp))
+            if sp.get("expires_at", 0) > now + 1:
+                SPAWNED_TAC[ck] = sp
+                TIMERS.schedule(("spawn", ck), sp["expires_at"] - now,
+                                lambda c=ck, k=sp["key"]: expire_spawn(c, k))
+    for t in snap.get("trades", []):
+        t["trade_id"] = int(t["trade_id"]); t["message"] = t["view"] = None
+        RESTORE_PENDING["trades"].append(t)
+        if t.get("expires_at", 0) > now + 1:
+            PENDING_TRADES[t["trade_id"]] = t
+            TIMERS.schedule(("trade", t["trade_id"]), t["expires_at"] - now,
+                            lambda tid=t["trade_id"]: expire_trade(tid))
+    pvp = snap.get("pvp", {})
+    NEXT_PVP_ID = max(NEXT_PVP_ID, int(pvp.get("next_id", 1)))
+    for cid, c in pvp.get("pending", {}).items():
+        left = c.get("expires_at", now + PVP_TTL) - now
+        if "a_inst_id" in c and left > 0:
+            PVP_PENDING[int(cid)] = c
+            TIMERS.schedule(("pvp", int(cid)), left, lambda i=int(cid): expire_pvp(i))
+    for gid, t in snap.get("tournaments", {}).items():
+        TOURNAMENTS[int(gid)] = t
+    n = len(GUILD_BOSSES) + len(PARTIES) + len(SPAWNED_TAC) + len(PENDING_TRADES) + len(PVP_PENDING) + len(TOURNAMENTS)
+    print(f"[snapshot] Restored {n} entr{'y' if n == 1 else 'ies'} from a snapshot "
+          f"{now - float(snap.get('saved_at', now)):.0f}s old.")
+    return n
+
+async def reattach_restored():
+    """Give restored spawns/trades live buttons again (or close them out if they expired while down)."""
+    spawns, trades = RESTORE_PENDING["spawns"], RESTORE_PENDING["trades"]
+    RESTORE_PENDING["spawns"], RESTORE_PENDING["trades"] = [], []
+    for ck, sp in spawns:
+        ch = bot.get_channel(ck[1])
+        if not ch:
+            SPAWNED_TAC.pop(ck, None)
+            continue
+        msg = ch.get_partial_message(sp["message_id"])
+        try:
+            if SPAWNED_TAC.get(ck) is sp:
+                view = CatchView(ck, sp["key"])
+                view.message = msg
+                sp["view"] = view
+                await msg.edit(view=view)
+            else:
+                await msg.edit(view=None)
+        except Exception:
+            end_spawn(ck)
+    for t in trades:
+        tid = t["trade_id"]
+        ch = bot.get_channel(t.get("channel_id", 0))
+        msg = ch.get_partial_message(t["message_id"]) if ch else None
+        try:
+            if msg and PENDING_TRADES.get(tid) is t:
+                t["message"], t["view"] = msg, TradeView(tid)
+                await msg.edit(view=t["view"])
+                continue
+            end_trade(tid)
+            if msg:
+                await msg.edit(content="⏳ Trade timed out.", view=None)
+        except Exception:
+            end_trade(tid)
+
+async def snapshot_loop():
+    while True:
+        await asyncio.sleep(SNAPSHOT_INTERVAL)
+        try:
+            save_runtime_snapshot()
+        except Exception as e:
+            print("[snapshot] Save failed:", e)
+
+# ================= Catalog hot reload =================
+# TAC.json / boss.json are polled (mtime, then content hash) and can be reloaded
+# with %reload_catalog. New content is parsed, validated and compiled before the
+# swap; on any error the running catalog stays as it is. The swap itself is two
+# global rebinds plus catalog_changed(), with no await in between, so handlers
+# never see a half-updated catalog. Active bosses keep their tier_data snapshot.
+CATALOG_POLL_SEC = 5
+CATALOG_TASK: Optional[asyncio.Task] = None
+CATALOG_STAMPS: Dict[str, Tuple[int, str]] = {}   # path -> (mtime_ns, sha1)
+CATALOG_RELOADS = {"ok": 0, "rejected": 0, "last": ""}
+
+def _catalog_stamp(path: str, raw: Optional[bytes] = None) -> Tuple[int, str]:
+    try:
+        mtime = os.stat(path).st_mtime_ns
+        if raw is None:
+            with open(path, "rb") as f:
+                raw = f.read()
+    except OSError:
+        return (0, "")
+    return (mtime, hashlib.sha1(raw).hexdigest())
+
+for _p in (TAC_FILE, BOSS_FILE):
+    CATALOG_STAMPS[_p] = _catalog_stamp(_p)
+
+def _is_num(v: Any) -> bool:
+    return isinstance(v, (int, float)) and not isinstance(v, bool)
+
+def validate_tac_data(d: Any) -> List[str]:
+    if not isinstance(d, dict) or not d:
+        return [f"{TAC_FILE}: expected a non-empty object of species"]
+    errs = []
+    for k, td in d.items():
+        if k != k.lower() or not isinstance(td, dict):
+            errs.append(f"{k}: keys must be lowercase and map to objects"); continue
+        if not isinstance(td.get("name"), str):
+            errs.append(f"{k}: missing name")
+        stats = td.get("stats")
+        if not isinstance(stats, dict) or not all(_is_num(stats.get(s)) and stats[s] >= 0 for s in STAT_KEYS):
+            errs.append(f"{k}: stats needs non-negative {', '.join(STAT_KEYS)}")
+        if not isinstance(td.get("egg_groups", []), list):
+            errs.append(f"{k}: egg_groups must be a list")
+        if td.get("evolves_to") and td["evolves_to"] not in d:
+            errs.append(f"{k}: evolves_to {td['evolves_to']!r} is not a species")
+        for f in ("value", "catch_reward", "evolve_cost"):
+            if f in td and not (isinstance(td[f], dict) and all(_is_num(v) for v in td[f].values())):
+                errs.append(f"{k}: {f} must map shard kinds to numbers")
+        if "spawn_weight" in td and not (_is_num(td["spawn_weight"]) and td["spawn_weight"] >= 0):
+            errs.append(f"{k}: spawn_weight must be a non-negative number")
+    # species people own (or are about to) can't disappear
+    in_use = {i["tac"] for u in USER_DB.values() for i in u.get("inventory", [])}
+    in_use |= {b["tac"] for u in USER_DB.values() for b in u.get("astral_offspring_pending", [])}
+    in_use |= {l["tac"] for l in MARKET.values()} | {a["tac"] for a in AUCTIONS.values()}
+    in_use |= {sp["key"] for sp in SPAWNED_TAC.values()}
+    gone = sorted(in_use - set(d))
+    if gone:
+        errs.append("still owned, can't remove: " + ", ".join(gone))
+    return errs
+
+def validate_boss_tiers(d: Any) -> List[str]:
+    if not isinstance(d, dict):
+        return [f"{BOSS_FILE}: expected an object of tiers"]
+    errs = []
+    for k, t in d.items():
+        if not isinstance(t, dict):
+            errs.append(f"{k}: must be an object"); continue
+        if not (isinstance(t.get("hp", 50000), int) and t.get("hp", 50000) > 0):
+            errs.append(f"{k}: hp must be a positive integer")
+        for rk, rng in t.get("rewards", {}).items():
+            if rk in REWARD_KEYS and not (isinstance(rng, list) and len(rng) == 2 and all(_is_num(x) for x in rng)):
+                errs.append(f"{k}: rewards.{rk} must be [min, max]")
+    return errs
+
+def reload_catalog(force: bool = False) -> Tuple[bool, str]:
+    """Re-read TAC.json and boss.json; swap them in if they changed and validate. Returns (swapped, summary)."""
+    global TAC_DATA, BOSS_TIERS
+    raws, stamps = {}, {}
+    for path in (TAC_FILE, BOSS_FILE):
+        try:
+            with open(path, "rb") as f:
+                raws[path] = f.read()
+        except OSError as e:
+            return False, f"can't read {path}: {e}"
+        stamps[path] = _catalog_stamp(path, raws[path])
+    if not force and all(stamps[p][1] == CATALOG_STAMPS.get(p, (0, ""))[1] for p in stamps):
+        CATALOG_STAMPS.update(stamps)
+        return False, "unchanged"
+    try:
+        new_tac, new_boss = json.loads(raws[TAC_FILE]), json.loads(raws[BOSS_FILE])
+    except ValueError as e:
+        errs = [f"invalid JSON: {e}"]
+    else:
+        errs = validate_tac_data(new_tac) + validate_boss_tiers(new_boss)
+        if not errs:
+            try:
+                compile_catalog(new_tac)   # dry run: must not fail halfway through the hooks
+            except Exception as e:
+                errs = [f"compile failed: {e}"]
+    CATALOG_STAMPS.update(stamps)   # don't re-report the same bad file every poll
+    if errs:
+        CATALOG_RELOADS["rejected"] += 1
+        CATALOG_RELOADS["last"] = "rejected: " + "; ".join(errs[:5]) + (f" (+{len(errs) - 5} more)" if len(errs) > 5 else "")
+        print(f"[catalog] Reload {CATALOG_RELOADS['last']}")
+        return False, CATALOG_RELOADS["last"]
+    added = sorted(set(new_tac) - set(TAC_DATA)); removed = sorted(set(TAC_DATA) - set(new_tac))
+    changed = sum(1 for k in set(new_tac) & set(TAC_DATA) if new_tac[k] != TAC_DATA[k])
+    tiers_changed = sum(1 for k in set(new_boss) | set(BOSS_TIERS) if new_boss.get(k) != BOSS_TIERS.get(k))
+    TAC_DATA, BOSS_TIERS = new_tac, new_boss
+    catalog_changed()
+    CATALOG_RELOADS["ok"] += 1
+    CATALOG_RELOADS["last"] = (f"v{CATALOG_VERSION}: {len(TAC_DATA)} species (+{len(added)} -{len(removed)} ~{changed}), "
+                               f"{len(BOSS_TIERS)} boss tiers (~{tiers_changed})")
+    print(f"[catalog] Reloaded {CATALOG_RELOADS['last']}")
+    return True, CATALOG_RELOADS["last"]
+
+def _stat_mtime(path: str) -> int:
+    try:
+        return os.stat(path).st_mtime_ns
+    except OSError:
+        return 0
+
+async def catalog_watch_loop():
+    while True:
+        await asyncio.sleep(CATALOG_POLL_SEC)
+        try:
+            if any(_stat_mtime(p) != CATALOG_STAMPS.get(p, (0, ""))[0] for p in (TAC_FILE, BOSS_FILE)):
+                reload_catalog()
+        except Exception as e:
+            print(f"[catalog] watch: {e}")
+
+@dual("reload_catalog", "Reload TAC.json and boss.json now (allow-list only)")
+async def reload_catalog_cmd(ctx_or_inter):
+    user = ctx_or_inter.user if isinstance(ctx_or_inter, discord.Interaction) else ctx_or_inter.author
+    if user.id not in ALLOW_SUMMON_IDS:
+        txt = "❌ You don't have permission."
+    else:
+        swapped, summary = reload_catalog(force=True)
+        txt = ("✅ Reloaded " if swapped else "⚠️ Not reloaded, ") + summary
+    if isinstance(ctx_or_inter, discord.Interaction): await ctx_or_inter.response.send_message(txt[:1900], ephemeral=True)
+    else: await ctx_or_inter.send(txt[:1900])
+
+# ================= Admin: Metrics =================
+def rate_metrics_lines() -> List[str]:
+    if not RATE_THROTTLED:
+        return [f"**Rate limits** — nothing throttled • buckets {len(RATE_BUCKETS):,}"]
+    parts = [f"{cmd}/{scope} {n:,}" for (cmd, scope), n in sorted(RATE_THROTTLED.items())]
+    return ["**Rate limits** — throttled: " + ", ".join(parts) + f" • buckets {len(RATE_BUCKETS):,}"]
+
+def metrics_lines() -> List[str]:
+    st = SEND_STATS
+    ready = f"{READY_AFTER:.1f}s" if READY_AFTER is not None else "—"
+    return [
+        f"**Process** — ready after {ready} • RSS {rss_mb():.0f} MB • "
+        f"{'lean' if LEAN_MEMBERS else 'full'} member cache • LRU {len(MEMBER_LRU):,} "
+        f"(hits {MEMBER_STATS['hits']:,}, fetches {MEMBER_STATS['fetches']:,})",
+    ] + shard_metrics_lines() + rate_metrics_lines() + [
+        "**Timers** — pending " + (", ".join(f"{k} {n:,}" for k, n in sorted(TIMERS.counts().items())) or "none")
+        + f" • heap {len(TIMERS.heap):,} • fired {TIMERS.fired:,}",
+        f"**Combat profiles** — cached {len(COMBAT_PROFILES):,} • hits {COMBAT_PROFILE_STATS['hits']:,} • "
+        f"misses {COMBAT_PROFILE_STATS['misses']:,}",
+        f"**Embed templates** — cached {len(EMBED_TEMPLATES):,} • hits {EMBED_STATS['hits']:,} • builds {EMBED_STATS['builds']:,}",
+        f"**Autocomplete** — {len(INST_INDEXES):,} instance indexes (max {INST_INDEX_MAX_USERS})",
+        f"**Store** — {type(STORE).__name__} • merged writes {STORE_STATS['merged']:,} • "
+        f"renumbered {STORE_STATS['renumbered']:,} • lock busy {STORE_STATS['busy']:,} • deferred saves {STORE_STATS['retries']:,}",
+        f"**Catalog** — v{CATALOG_VERSION} • reloads {CATALOG_RELOADS['ok']} • rejected {CATALOG_RELOADS['rejected']}"
+        + (f" • last {CATALOG_RELOADS['last']}" if CATALOG_RELOADS["last"] else ""),
+        f"**Ledger** — {LEDGER.events:,} events • segment {LEDGER.seg} • "
+        f"indexed users {len(LEDGER.by_user):,} • instances {len(LEDGER.by_inst):,}",
+        f"**Send queue** — queued {st['queued']:,} • messages {st['messages']:,} • "
+        f"merged {st['merged']:,} • delayed {st['delayed']:,} • priority {st['priority']:,} • "
+        f"active channels {len(DISPATCHERS)}",
+    ]
+
+@dual("metrics", "Runtime metrics (allow-list only)")
+async def metrics_cmd(ctx_or_inter):
+    user = ctx_or_inter.user if isinstance(ctx_or_inter, discord.Interaction) else ctx_or_inter.author
+    if user.id not in ALLOW_SUMMON_IDS:
+        txt = "❌ You don't have permission."
+        if isinstance(ctx_or_inter, discord.Interaction): return await ctx_or_inter.response.send_message(txt, ephemeral=True)
+        return await ctx_or_inter.send(txt)
+    chunks = _chunk_text("\n".join(metrics_lines()))
+    if isinstance(ctx_or_inter, discord.Interaction):
+        await ctx_or_inter.response.send_message(chunks[0], ephemeral=True)
+        for c in chunks[1:]:
+            await ctx_or_inter.followup.send(c, ephemeral=True)
+    else:
+        for c in chunks:
+            await ctx_or_inter.send(c)
+
+# ================= Startup =================
+def startup():
+    """
+    Open the store and ledger and load everything persisted in them. Importing main
+    does none of this, so tournament workers (which re-import the __main__ module)
+    and tools can import it without touching live files; call this first.
+    """
+    global STORE, LEDGER
+    if STORE is not None:
+        return
+    STORE = open_store(STORE_URL)
+    USER_DB.update(STORE.load_all())
+    LEDGER = Ledger(LEDGER_DIR)
+    SPAWN_POOLS.update(STORE.kv_all("spawn_pool"))
+    for gid, gd in STORE.kv_all("pending_rewards").items():
+        PENDING_REWARDS[int(gid)] = {int(u): unpack_reward(r) for u, r in gd.items()}
+    for listing in STORE.kv_all("market").values():
+        market_add(listing, persist=False)
+    for a in STORE.kv_all("auctions").values():
+        auction_add(a, persist=False)
+    AUCTION_REFUNDS.update(STORE.kv_all("auction_refunds").get("pending", {}))
+    if AUCTION_REFUNDS:
+        TIMERS.schedule(("auction_refunds",), AUCTION_REFUND_BATCH_SEC, flush_refunds)
+
 # ================= Run =================
 if __name__ == "__main__":
-    if not TOKEN:
+    import argparse
+    parser = argparse.ArgumentParser(description="Theta Arc bot")
+    parser.add_argument("--build-assets", action="store_true", help="build optimized image variants and exit")
+    parser.add_argument("--force-sync", action="store_true", help="sync slash commands even if the tree is unchanged")
+    parser.add_argument("--dev-guild", type=int, default=DEV_GUILD_ID, help="sync slash commands to this guild only")
+    args = parser.parse_args()
+    FORCE_SYNC = args.force_sync
+    DEV_GUILD_ID = args.dev_guild
+
+    n = build_all_asset_variants()
+    if args.build_assets:
+        print(f"[assets] {n} image(s) ready in {ASSET_CACHE_DIR}/" + ("" if Image else " (Pillow missing: originals only)"))
+    elif not TOKEN:
         print("Error: DISCORD_TOKEN not found in .env file.")
+    elif SHARDED and SHARD_CONFIG_ERROR:
+        print(f"Error: {SHARD_CONFIG_ERROR}")
     else:
-        bot.run(TOKEN)
+        signal.signal(signal.SIGTERM, signal.default_int_handler)   # deploys stop us like Ctrl+C
+        startup()
+        load_runtime_snapshot()
+        try:
+            bot.run(TOKEN)
+        finally:
+            save_runtime_snapshot(force=True)
+            LEDGER.close()
+            STORE.close()
+            print(f"[snapshot] Saved runtime state to {SNAPSHOT_FILE}.")